@@ -3,16 +3,99 @@ from tkinter import ttk, messagebox, scrolledtext, filedialog
 import threading
 import os
 import subprocess
-import requests
 import logging
 import random
 import re
-from translate_core import trans, COMMON_LANGUAGES, LibreTranslator
+import time
+from collections import deque
+from translate_core import trans, DEFAULT_BASE_URL, BACKENDS, CancellationToken, ServerHealthMonitor
+from fanout import trans_fanout
+from job_service import JobClient
+from report_writer import write_report
 import tkinter.font as tkFont
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# 日志框最多保留的行数，更早的内容只保留在日志缓冲区中
+MAX_LOG_LINES = 2000
+# 日志缓冲区最多保留的字符数，导出日志时写出这些内容
+MAX_LOG_CHARS = 2_000_000
+
+
+class UIUpdateQueue:
+    """工作线程提交的界面更新，由Tk主线程按固定帧率统一执行
+
+    set() 按键合并，每帧只执行同一控件的最新状态；log() 的文本每帧拼接后一次写入；
+    call() 的一次性操作（弹窗等）按提交顺序在本帧的状态更新之后执行。
+    """
+
+    def __init__(self, root, log_sink, fps=30):
+        self.root = root
+        self.log_sink = log_sink
+        self.interval = max(int(1000 / fps), 1)
+        self._states = {}
+        self._logs = []
+        self._calls = []
+        self._lock = threading.Lock()
+        self.root.after(self.interval, self._flush)
+
+    def set(self, key, func, *args):
+        with self._lock:
+            # 先删除再插入，执行顺序与最后一次提交的顺序一致
+            self._states.pop(key, None)
+            self._states[key] = (func, args)
+
+    def log(self, text):
+        with self._lock:
+            self._logs.append(text)
+
+    def call(self, func, *args):
+        with self._lock:
+            self._calls.append((func, args))
+
+    def _flush(self):
+        with self._lock:
+            states, self._states = self._states, {}
+            logs, self._logs = self._logs, []
+            calls, self._calls = self._calls, []
+        try:
+            for func, args in states.values():
+                func(*args)
+            if logs:
+                self.log_sink("".join(logs))
+            for func, args in calls:
+                func(*args)
+        finally:
+            self.root.after(self.interval, self._flush)
+
+
+class LogBuffer:
+    """有上限的日志缓冲区，超出 max_chars 时丢弃最早的内容"""
+
+    def __init__(self, max_chars=MAX_LOG_CHARS):
+        self.max_chars = max_chars
+        self._chunks = deque()
+        self._size = 0
+        self.dropped_chars = 0
+
+    def append(self, text):
+        self._chunks.append(text)
+        self._size += len(text)
+        while self._size > self.max_chars and len(self._chunks) > 1:
+            chunk = self._chunks.popleft()
+            self._size -= len(chunk)
+            self.dropped_chars += len(chunk)
+
+    def clear(self):
+        self._chunks.clear()
+        self._size = 0
+        self.dropped_chars = 0
+
+    def text(self):
+        return "".join(self._chunks)
+
+
 class TranslationApp:
     def __init__(self, root):
         self.root = root
@@ -29,15 +112,27 @@ class TranslationApp:
         except:
             pass
         
-        self.status_var = tk.StringVar(value="就绪")
+        self.status_var = tk.StringVar(value="正在连接翻译服务...")
         self.progress_var = tk.StringVar(value="0/0")
         self.current_action_var = tk.StringVar(value="等待开始...")
         self.translation_steps = []
+        self.candidates = []
         self.generate_report_var = tk.BooleanVar(value=False)
         self.auto_open_report_var = tk.BooleanVar(value=True)
+        self.use_cache_var = tk.BooleanVar(value=True)
+        self.chunk_var = tk.BooleanVar(value=False)
+        self.early_stop_var = tk.BooleanVar(value=False)
+        self.cancel_token = None
+        self.translation_running = False
+        self.log_buffer = LogBuffer()
 
         self.create_widgets()
-        self.check_server_connection()
+        self.ui_updates = UIUpdateQueue(self.root, self.update_output_text)
+        # 服务检查在后台线程进行，窗口立即显示；结果通过界面更新队列推送到状态栏和语言下拉框
+        self.server_monitor = ServerHealthMonitor(
+            DEFAULT_BASE_URL,
+            on_change=lambda status: self.ui_updates.set("server", self.apply_server_status, status)
+        ).start()
 
     def create_widgets(self):
         # 创建主框架
@@ -55,8 +150,13 @@ class TranslationApp:
         ttk.Label(lang_frame, text="目标语言:").pack(side=tk.LEFT, padx=5)
         self.target_lang_var = tk.StringVar(value="zh-Hans")
         self.target_lang_combo = ttk.Combobox(lang_frame, textvariable=self.target_lang_var, 
-                                            values=COMMON_LANGUAGES, width=15, state="readonly")
+                                            values=[], width=15, state="readonly")
         self.target_lang_combo.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(lang_frame, text="翻译引擎:").pack(side=tk.LEFT, padx=5)
+        self.backend_var = tk.StringVar(value="libretranslate")
+        ttk.Combobox(lang_frame, textvariable=self.backend_var,
+                     values=BACKENDS, width=15, state="readonly").pack(side=tk.LEFT, padx=5)
         
         # 输入文本框
         self.input_text = scrolledtext.ScrolledText(input_frame, height=10, wrap=tk.WORD)
@@ -73,6 +173,15 @@ class TranslationApp:
         ttk.Label(control_row1, text="循环次数:").pack(side=tk.LEFT, padx=5)
         self.loops_var = tk.IntVar(value=5)
         ttk.Spinbox(control_row1, textvariable=self.loops_var, from_=1, to=50, width=5).pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(control_row1, text="候选链数:").pack(side=tk.LEFT, padx=5)
+        self.chains_var = tk.IntVar(value=1)
+        ttk.Spinbox(control_row1, textvariable=self.chains_var, from_=1, to=10, width=5).pack(side=tk.LEFT, padx=5)
+
+        # 填写任务服务地址时由服务执行翻译，多个用户共用服务的工作线程和连接
+        ttk.Label(control_row1, text="任务服务:").pack(side=tk.LEFT, padx=5)
+        self.service_url_var = tk.StringVar(value="")
+        ttk.Entry(control_row1, textvariable=self.service_url_var, width=28).pack(side=tk.LEFT, padx=5)
         
         # 第二行控制选项
         control_row2 = ttk.Frame(control_frame)
@@ -86,7 +195,18 @@ class TranslationApp:
                                                variable=self.auto_open_report_var,
                                                state=tk.DISABLED)
         self.auto_open_check.pack(side=tk.LEFT, padx=5)
+
+        ttk.Checkbutton(control_row2, text="使用翻译缓存",
+                        variable=self.use_cache_var).pack(side=tk.LEFT, padx=5)
+
+        ttk.Checkbutton(control_row2, text="长文本分句并行",
+                        variable=self.chunk_var).pack(side=tk.LEFT, padx=5)
+
+        ttk.Checkbutton(control_row2, text="结果收敛时提前结束",
+                        variable=self.early_stop_var).pack(side=tk.LEFT, padx=5)
         
+        self.stop_button = ttk.Button(control_row2, text="停止", command=self.stop_translation, state=tk.DISABLED)
+        self.stop_button.pack(side=tk.RIGHT, padx=5)
         ttk.Button(control_row2, text="开始翻译", command=self.start_translation).pack(side=tk.RIGHT, padx=5)
 
         # 进度显示区域
@@ -126,6 +246,13 @@ class TranslationApp:
         ttk.Label(lang_info_frame, text="语言路径:", font=("", 9, "bold")).pack(side=tk.LEFT)
         self.lang_path_var = tk.StringVar(value="无")
         ttk.Label(lang_info_frame, textvariable=self.lang_path_var, font=("", 9)).pack(side=tk.LEFT, padx=5)
+
+        # 延迟信息
+        latency_info_frame = ttk.Frame(inner_frame)
+        latency_info_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(latency_info_frame, text="耗时:", font=("", 9, "bold")).pack(side=tk.LEFT)
+        self.latency_var = tk.StringVar(value="无")
+        ttk.Label(latency_info_frame, textvariable=self.latency_var, font=("", 9)).pack(side=tk.LEFT, padx=5)
         
         # 当前翻译结果
         result_frame = ttk.Frame(inner_frame)
@@ -150,6 +277,7 @@ class TranslationApp:
         ttk.Button(btn_frame, text="清空结果", command=self.clear_results).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="手动保存报告", command=self.save_report_manual).pack(side=tk.RIGHT, padx=5)
         ttk.Button(btn_frame, text="导出结果", command=self.export_result).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="导出日志", command=self.export_log).pack(side=tk.RIGHT, padx=5)
 
         # 状态栏
         status_frame = ttk.Frame(self.root)
@@ -165,42 +293,44 @@ class TranslationApp:
             self.auto_open_check.config(state=tk.DISABLED)
             self.auto_open_report_var.set(False)
 
+    def apply_server_status(self, status):
+        """在主线程中应用后台检查得到的服务状态"""
+        if status["languages"]:
+            # 更新下拉框选项
+            self.target_lang_combo['values'] = status["languages"]
+
+        # 翻译进行中时状态栏显示进度，不被服务状态覆盖
+        if self.translation_running:
+            return
+        if not status["healthy"]:
+            self.status_var.set("错误: 本地翻译服务未启动！")
+        elif status["languages"]:
+            self.status_var.set(f"服务运行中 ({len(status['languages'])}种语言支持)")
+        else:
+            self.status_var.set("本地翻译服务运行中")
+
     def check_server_connection(self):
-        try:
-            # 尝试多个端点以提高检测可靠性
-            endpoints = ["/languages", "/translate", ""]
-            base_url = "http://127.0.0.1:5000"
-            
-            for endpoint in endpoints:
-                try:
-                    response = requests.get(f"{base_url}{endpoint}", timeout=3)
-                    if response.status_code == 200:
-                        # 获取服务支持的语言
-                        lang_response = requests.get(f"{base_url}/languages", timeout=3)
-                        if lang_response.status_code == 200:
-                            supported_languages = [lang['code'] for lang in lang_response.json()]
-                            
-                            # 更新下拉框选项
-                            self.target_lang_combo['values'] = supported_languages
-                            
-                            self.status_var.set(f"服务运行中 ({len(supported_languages)}种语言支持)")
-                        else:
-                            self.status_var.set("本地翻译服务运行中")
-                        return True
-                except:
-                    continue  # 尝试下一个端点
-            
-            # 所有端点都失败
-            raise ConnectionError("无法连接到LibreTranslate服务")
-        
-        except Exception as e:
+        """根据后台监视器最近一次的结果判断服务是否可用，不在主线程中请求服务"""
+        healthy = self.server_monitor.status()["healthy"]
+        if healthy:
+            return True
+        # 让监视器立即重新检查，服务刚启动时下次点击即可开始
+        self.server_monitor.check_now()
+        if healthy is None:
+            messagebox.showinfo("请稍候", "正在连接翻译服务，请稍后再试")
+        else:
             self.status_var.set("错误: 本地翻译服务未启动！")
             messagebox.showerror("服务异常",
                                 "请启动LibreTranslate服务：\nlibretranslate")
-            return False
+        return False
 
     def start_translation(self):
-        if not self.check_server_connection():
+        backend = self.backend_var.get()
+        service_url = self.service_url_var.get().strip() or None
+        chains = max(self.chains_var.get(), 1)
+        # 任务服务由翻译线程检查，不在界面线程中等待网络请求；多条候选链总在本机运行。
+        # 进程内后端不需要LibreTranslate服务
+        if (not service_url or chains > 1) and backend == "libretranslate" and not self.check_server_connection():
             return
 
         input_text = self.input_text.get("1.0", tk.END).strip()
@@ -218,8 +348,9 @@ class TranslationApp:
         # 启用输出文本框
         self.output_text.config(state=tk.NORMAL)
         self.output_text.delete(1.0, tk.END)
-        self.output_text.insert(tk.END, "开始翻译...\n")
         self.output_text.config(state=tk.DISABLED)
+        self.log_buffer.clear()
+        self.update_output_text("开始翻译...\n")
         
         # 清空当前结果
         self.current_result_text.config(state=tk.NORMAL)
@@ -227,84 +358,193 @@ class TranslationApp:
         self.current_result_text.config(state=tk.DISABLED)
         self.round_var.set("0/0")
         self.lang_path_var.set("无")
+        self.latency_var.set("无")
 
         self.status_var.set("翻译中...")
         self.progress_var.set(f"0/{loops}")
         self.current_action_var.set("初始化翻译任务...")
         self.progress["value"] = 0
 
+        self.cancel_token = CancellationToken()
+        self.translation_running = True
+        self.stop_button.config(state=tk.NORMAL)
+
         # 启动翻译线程
         threading.Thread(
             target=self.run_translation,
-            args=(input_text, loops, target_lang),
+            args=(input_text, loops, target_lang, self.use_cache_var.get(),
+                  "sentence" if self.chunk_var.get() else None, backend, chains,
+                  service_url, 0.98 if self.early_stop_var.get() else None,
+                  self.default_report_path() if self.generate_report_var.get() else None),
             daemon=True
         ).start()
 
-    def run_translation(self, text, loops, target_lang):
+    def stop_translation(self):
+        """请求停止当前翻译，正在进行的请求和重试等待会尽快结束"""
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+            self.status_var.set("正在停止...")
+            self.stop_button.config(state=tk.DISABLED)
+
+    def run_translation(self, text, loops, target_lang, use_cache=True, chunk_mode=None,
+                        backend="libretranslate", chains=1, service_url=None, early_stop=None,
+                        report_path=None):
+        cancel_token = self.cancel_token
         try:
-            # 创建翻译器实例
-            translator = LibreTranslator()
-            
-            # 检测源语言
-            source_lang = translator.detect_language(text)
-            if source_lang is None:
-                # 如果检测失败，使用默认语言（英语）
-                source_lang = "en"
-                logging.warning("语言检测失败，使用默认语言: en")
-            
+            # 各轮耗时的累计值，用于显示平均延迟
+            latency_totals = {"rounds": 0, "round_ms": 0.0, "detect_ms": 0.0, "detect_calls": 0,
+                              "translate_ms": 0.0, "translate_calls": 0, "cache_rounds": 0}
+
+            ui = self.ui_updates
+            streamed = False
+
             # 在run_translation方法中修改回调函数
-            def progress_callback(current, total, result, path):
-                self.root.after(0, lambda: self.progress_var.set(f"{current}/{total}"))
-                self.root.after(0, lambda: self.progress.config(value=(current / total) * 100))
+            def progress_callback(current, total, result, path, metrics=None):
+                # 各控件只保留最新状态，由主线程按帧率刷新
+                ui.set("progress", self.progress_var.set, f"{current}/{total}")
+                ui.set("progress_bar", self.progress.config, {"value": (current / total) * 100})
                 
                 # 显示完整语言路径
                 path_str = " → ".join(path)
-                self.root.after(0, lambda: self.current_action_var.set(f"进度: {current}/{total}轮 当前语言: {path[-1]}"))
-                self.root.after(0, lambda: self.status_var.set(f"翻译中: {current}/{total}轮完成"))
+                ui.set("action", self.current_action_var.set, f"进度: {current}/{total}轮 当前语言: {path[-1]}")
+                ui.set("status", self.status_var.set, f"翻译中: {current}/{total}轮完成")
                 
                 # 更新轮次信息
-                self.root.after(0, lambda: self.round_var.set(f"{current}/{total}"))
-                self.root.after(0, lambda: self.lang_path_var.set(path_str))
+                ui.set("round", self.round_var.set, f"{current}/{total}")
+                ui.set("lang_path", self.lang_path_var.set, path_str)
                 
+                # 更新延迟统计
+                if metrics:
+                    latency_totals["rounds"] += 1
+                    for key in ("round_ms", "detect_ms", "detect_calls", "translate_ms", "translate_calls"):
+                        latency_totals[key] += metrics[key]
+                    latency_totals["cache_rounds"] += metrics["cache_hit"]
+                    ui.set("latency", self.latency_var.set, self.format_latency_summary(metrics, latency_totals))
+
                 # 更新当前结果
-                self.root.after(0, self.update_current_result, f"{result}")
+                ui.set("result", self.update_current_result, result)
 
                 # 更新输出文本
-                self.root.after(0, self.update_output_text, f"\n第{current}轮完成 (路径: {path_str}):\n{result}\n{'-'*50}\n")
-
-            # 执行翻译
-            final_result, all_steps = trans(
-                text, 
-                loops, 
-                progress_callback, 
-                source_lang,  # 使用检测到的源语言
-                target_lang
-            )
+                ui.log(f"\n第{current}轮完成 (路径: {path_str}):\n{result}\n{'-'*50}\n")
+
+            if chains > 1:
+                if service_url:
+                    ui.log("任务服务不支持多条候选链，改为在本机运行\n")
+                # 多条链并发运行，进度区域显示第一条链
+                def fanout_callback(index, current, total, result, path, metrics=None):
+                    if index == 0:
+                        progress_callback(current, total, result, path, metrics)
+
+                self.candidates = trans_fanout(text, loops, chains, fanout_callback, 'auto', target_lang,
+                                               use_cache=use_cache, backend=backend, cancel_token=cancel_token)
+                _, final_result, all_steps = self.candidates[0]
+
+                ranking = "".join(f"{rank}. [{score:.3f}] {candidate}\n"
+                                  for rank, (score, candidate, _) in enumerate(self.candidates, 1))
+                ui.log(f"\n🏆 候选结果排名（按差异度）:\n{ranking}")
+            elif service_url:
+                self.candidates = []
+                # 由任务服务访问翻译服务，这里只检查任务服务本身
+                try:
+                    JobClient(service_url, timeout=3).health()
+                except Exception as e:
+                    ui.set("status", self.status_var.set, "错误: 任务服务不可用！")
+                    ui.set("action", self.current_action_var.set, "翻译出错")
+                    ui.call(messagebox.showerror, "服务异常", f"无法连接任务服务 {service_url}:\n{str(e)}")
+                    return
+                # 提交到任务服务，通过server-sent events接收每轮进度
+                final_result, all_steps = JobClient(service_url).trans(
+                    text,
+                    loops,
+                    progress_callback,
+                    'auto',
+                    target_lang,
+                    use_cache=use_cache,
+                    chunk_mode=chunk_mode,
+                    backend=backend,
+                    cancel_token=cancel_token,
+                    early_stop=early_stop
+                )
+            else:
+                self.candidates = []
+                # 执行翻译，开启自动报告时每完成一轮追加到报告文件
+                streamed = report_path is not None
+                final_result, all_steps = trans(
+                    text,
+                    loops,
+                    progress_callback,
+                    'auto',  # 由trans检测源语言，避免重复调用 /detect
+                    target_lang,
+                    use_cache=use_cache,
+                    chunk_mode=chunk_mode,
+                    backend=backend,
+                    cancel_token=cancel_token,
+                    early_stop=early_stop,
+                    report_writer=report_path
+                )
             
             self.translation_steps = all_steps
 
-            self.root.after(0, self.update_output_text, "\n✨ 最终结果:\n")
-            self.root.after(0, self.update_output_text, f"{final_result}\n")
+            ui.log("\n✨ 最终结果:\n")
+            ui.log(f"{final_result}\n")
+
+            counts = getattr(all_steps, "call_counts", None)
+            if counts:
+                ui.log(f"\nHTTP调用: 检测{counts['detect']}次, 翻译{counts['translate']}次, "
+                       f"缓存命中{counts['cache_hits']}次, 合并重复请求{counts.get('coalesced', 0)}次\n")
+
+            failed_rounds = [m["round"] for m in getattr(all_steps, "metrics", []) if m["failed"]]
+            if failed_rounds:
+                ui.log(f"⚠ 第{', '.join(map(str, failed_rounds))}轮翻译失败，文本保持上一轮的结果\n")
             
-            self.root.after(0, lambda: self.status_var.set(f"完成! 共{loops}轮翻译"))
-            self.root.after(0, lambda: self.current_action_var.set("翻译完成"))
+            stop_reason = getattr(all_steps, "stop_reason", None)
+            rounds_done = len(getattr(all_steps, "metrics", [])) or loops
+            if stop_reason == "cancelled":
+                ui.log(f"\n⏹ 已停止，完成了{rounds_done}/{loops}轮\n")
+                ui.set("status", self.status_var.set, f"已停止: 完成{rounds_done}/{loops}轮")
+            elif stop_reason == "converged":
+                ui.log(f"\n结果已收敛，第{rounds_done}轮后提前结束\n")
+                ui.set("status", self.status_var.set, f"完成! 第{rounds_done}轮收敛")
+            else:
+                ui.set("status", self.status_var.set, f"完成! 共{loops}轮翻译")
+            ui.set("action", self.current_action_var.set, "翻译完成")
             
-            # 自动保存报告到默认路径
-            if self.generate_report_var.get():
-                self.save_report_auto(final_result)
+            # 自动保存报告到默认路径（在主线程中执行，可能弹出对话框）
+            if report_path is not None:
+                ui.call(self.save_report_auto, report_path, final_result, streamed)
             
-            self.root.after(0, lambda: messagebox.showinfo("完成", "翻译已完成！"))
+            ui.call(messagebox.showinfo, "完成", "翻译已完成！")
             
         except Exception as e:
             logging.error(f"翻译错误: {str(e)}")
-            self.root.after(0, lambda: self.status_var.set(f"错误: {str(e)}"))
-            self.root.after(0, lambda: self.current_action_var.set("翻译出错"))
-            self.root.after(0, lambda: messagebox.showerror("翻译错误", f"发生错误: {str(e)}"))
+            ui.set("status", self.status_var.set, f"错误: {str(e)}")
+            ui.set("action", self.current_action_var.set, "翻译出错")
+            ui.call(messagebox.showerror, "翻译错误", f"发生错误: {str(e)}")
+        finally:
+            ui.call(self.finish_translation)
+
+    def finish_translation(self):
+        self.translation_running = False
+        self.stop_button.config(state=tk.DISABLED)
+
+    @staticmethod
+    def format_latency_summary(metrics, totals):
+        """本轮耗时和各轮平均耗时的摘要"""
+        average_detect = totals["detect_ms"] / totals["detect_calls"] if totals["detect_calls"] else 0.0
+        average_translate = totals["translate_ms"] / totals["translate_calls"] if totals["translate_calls"] else 0.0
+        return (f"本轮 {metrics['round_ms']:.0f}ms | 平均每轮 {totals['round_ms'] / totals['rounds']:.0f}ms | "
+                f"检测 {average_detect:.0f}ms/次 | 翻译 {average_translate:.0f}ms/次 | "
+                f"缓存命中 {totals['cache_rounds']}/{totals['rounds']}轮")
 
     def update_output_text(self, text):
-        """线程安全的输出文本更新方法"""
+        """追加日志（在主线程中调用，工作线程通过 self.ui_updates.log() 提交）"""
+        self.log_buffer.append(text)
         self.output_text.config(state=tk.NORMAL)
         self.output_text.insert(tk.END, text)
+        # 日志框只保留最后 MAX_LOG_LINES 行，完整内容可通过“导出日志”保存
+        excess = int(self.output_text.index("end-1c").split(".")[0]) - MAX_LOG_LINES
+        if excess > 0:
+            self.output_text.delete("1.0", f"{excess + 1}.0")
         self.output_text.see(tk.END)
         self.output_text.config(state=tk.DISABLED)
 
@@ -316,48 +556,32 @@ class TranslationApp:
         self.current_result_text.see(tk.END)
         self.current_result_text.config(state=tk.DISABLED)
 
-    def generate_markdown(self, final_result):
-        if not self.translation_steps:
-            return ""
-
-        md_content = "# 多轮翻译报告\n\n"
-        md_content += f"**原始文本**:\n```\n{self.translation_steps[0][1]}\n```\n\n"
-        md_content += "## 翻译过程\n| 步骤 | 操作 | 结果 |\n|------|------|------|\n"
-
-        for step, (action, text) in enumerate(self.translation_steps):
-            display_text = text
-            display_text = display_text.replace("\n", "\\n")  # 处理换行符
-            md_content += f"| {step} | {action} | {display_text} |\n"
-
-        md_content += f"\n**最终文本**:\n```\n{final_result}\n```"
-        return md_content
-
-    def save_report_auto(self, final_result):
-        """自动保存到默认路径"""
-        if not self.translation_steps:
-            return
-
+    @staticmethod
+    def default_report_path():
+        """自动保存报告的默认路径"""
         # 创建输出目录
         output_dir = os.path.join(os.getcwd(), "output")
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
         # 生成唯一文件名
-        import time
         timestamp = time.strftime("%Y%m%d_%H%M%S")
-        default_path = os.path.join(output_dir, f"translation_report_{timestamp}.md")
+        return os.path.join(output_dir, f"translation_report_{timestamp}.md")
+
+    def save_report_auto(self, report_path, final_result, streamed=False):
+        """自动保存到默认路径；streamed 为True时报告已在翻译过程中逐轮写入"""
+        if not self.translation_steps:
+            return
 
-        # 生成并保存Markdown
-        md_content = self.generate_markdown(final_result)
         try:
-            with open(default_path, "w", encoding="utf-8") as f:
-                f.write(md_content)
+            if not streamed:
+                write_report(report_path, self.translation_steps, final_result, self.candidates)
 
             # 根据选项决定是否自动打开文件
             if self.auto_open_report_var.get():
-                self.open_file(default_path)
+                self.open_file(report_path)
             else:
-                messagebox.showinfo("自动保存", f"报告已保存至:\n{default_path}")
+                messagebox.showinfo("自动保存", f"报告已保存至:\n{report_path}")
         except Exception as e:
             messagebox.showerror("保存错误", f"保存报告时出错: {str(e)}")
 
@@ -372,16 +596,16 @@ class TranslationApp:
 
         file_path = filedialog.asksaveasfilename(
             defaultextension=".md",
-            filetypes=[("Markdown文件", "*.md"), ("文本文件", "*.txt"), ("所有文件", "*.*")],
+            filetypes=[("Markdown文件", "*.md"), ("JSON行", "*.jsonl"), ("CSV表格", "*.csv"),
+                       ("文本文件", "*.txt"), ("所有文件", "*.*")],
             initialfile="translation_report.md"
         )
         if not file_path:
             return
 
-        md_content = self.generate_markdown(final_result)
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(md_content)
+            # 按扩展名选择报告格式
+            write_report(file_path, self.translation_steps, final_result, self.candidates)
 
             # 根据选项决定是否自动打开文件
             if self.auto_open_report_var.get():
@@ -414,6 +638,25 @@ class TranslationApp:
         except Exception as e:
             messagebox.showerror("导出错误", f"导出文件时出错: {str(e)}")
 
+    def export_log(self):
+        """导出日志缓冲区中的内容"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".log",
+            filetypes=[("日志文件", "*.log"), ("文本文件", "*.txt"), ("所有文件", "*.*")],
+            initialfile="translation.log"
+        )
+        if not file_path:
+            return
+
+        try:
+            with open(file_path, "w", encoding="utf-8") as f:
+                if self.log_buffer.dropped_chars:
+                    f.write(f"（更早的{self.log_buffer.dropped_chars}个字符已超出日志缓冲区上限，未保留）\n")
+                f.write(self.log_buffer.text())
+            messagebox.showinfo("导出成功", f"日志已导出至:\n{file_path}")
+        except Exception as e:
+            messagebox.showerror("导出错误", f"导出文件时出错: {str(e)}")
+
     def open_file(self, file_path):
         """打开文件"""
         try:
@@ -433,6 +676,7 @@ class TranslationApp:
         self.output_text.config(state=tk.NORMAL)
         self.output_text.delete(1.0, tk.END)
         self.output_text.config(state=tk.DISABLED)
+        self.log_buffer.clear()
         
         self.current_result_text.config(state=tk.NORMAL)
         self.current_result_text.delete(1.0, tk.END)
@@ -443,8 +687,10 @@ class TranslationApp:
         self.progress["value"] = 0
         self.status_var.set("已重置")
         self.translation_steps = []
+        self.candidates = []
         self.round_var.set("0/0")
         self.lang_path_var.set("无")
+        self.latency_var.set("无")
 
 def main():
     root = tk.Tk()
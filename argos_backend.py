@@ -0,0 +1,118 @@
+import logging
+import threading
+
+import argostranslate.translate
+
+from translate_core import TranslationBackend, TranslationError, guess_script
+
+# LibreTranslate 的语言代码与 argostranslate 不完全一致
+_TO_ARGOS_CODES = {"zh-Hans": "zh", "zh-Hant": "zt"}
+_FROM_ARGOS_CODES = {argos: libre for libre, argos in _TO_ARGOS_CODES.items()}
+
+# argostranslate 没有语言检测，只能根据文字系统猜测能唯一确定的语言
+_SCRIPT_LANGUAGES = {
+    "han": "zh-Hans",
+    "kana": "ja",
+    "hangul": "ko",
+    "greek": "el",
+    "hebrew": "he",
+    "thai": "th",
+    "armenian": "hy",
+    "georgian": "ka",
+}
+
+
+class ArgosBackend(TranslationBackend):
+    """进程内调用已安装的argostranslate模型，不经过HTTP服务"""
+
+    name = "argos"
+
+    def __init__(self):
+        # 已加载的翻译模型常驻内存，供后续轮次复用
+        self._translations = {}
+        self._languages = None
+        self._catalog = None
+        self._lock = threading.Lock()
+
+    def _installed_languages(self):
+        with self._lock:
+            if self._languages is None:
+                self._languages = {
+                    lang.code: lang for lang in argostranslate.translate.get_installed_languages()
+                }
+            return self._languages
+
+    def _get_translation(self, source_lang, target_lang):
+        source_code = _TO_ARGOS_CODES.get(source_lang, source_lang)
+        target_code = _TO_ARGOS_CODES.get(target_lang, target_lang)
+        key = (source_code, target_code)
+
+        translation = self._translations.get(key)
+        if translation is not None:
+            return translation
+
+        installed = self._installed_languages()
+        if source_code not in installed or target_code not in installed:
+            return None
+        with self._lock:
+            translation = self._translations.get(key)
+            if translation is None:
+                translation = installed[source_code].get_translation(installed[target_code])
+                if translation is not None:
+                    self._translations[key] = translation
+        return translation
+
+    def preload(self, pairs):
+        """预先加载一组语言对的模型"""
+        for source_lang, target_lang in pairs:
+            if self._get_translation(source_lang, target_lang) is None:
+                logging.warning(f"未安装的语言对: {source_lang}→{target_lang}")
+
+    def languages(self):
+        if self._catalog is not None:
+            return self._catalog
+
+        installed = self._installed_languages()
+        languages = []
+        for code, lang in installed.items():
+            targets = [
+                _FROM_ARGOS_CODES.get(other_code, other_code)
+                for other_code, other in installed.items()
+                if other_code != code and lang.get_translation(other) is not None
+            ]
+            languages.append({
+                "code": _FROM_ARGOS_CODES.get(code, code),
+                "name": lang.name,
+                "targets": targets,
+            })
+        self._catalog = languages
+        return languages
+
+    def detect(self, text):
+        language = _SCRIPT_LANGUAGES.get(guess_script(text[:2000]))
+        installed = self._installed_languages()
+        if language is not None and _TO_ARGOS_CODES.get(language, language) in installed:
+            return language
+        return None
+
+    def translate(self, text, source_lang, target_lang):
+        translation = self._get_translation(source_lang, target_lang)
+        if translation is None:
+            raise TranslationError(f"未安装的语言对: {source_lang}→{target_lang}")
+        try:
+            return translation.translate(text)
+        except Exception as e:
+            raise TranslationError(f"翻译失败: {str(e)}") from e
+
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+
+def get_argos_backend():
+    """获取进程内共享的argostranslate后端"""
+    global _default_backend
+    with _default_backend_lock:
+        if _default_backend is None:
+            _default_backend = ArgosBackend()
+        return _default_backend
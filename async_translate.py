@@ -0,0 +1,539 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+import aiohttp
+
+from report_writer import report_extension
+from resilience import (Endpoint, RequestAttempts, RetryPolicy, TranslationCancelled, TranslationError,
+                        get_adaptive_limiter, get_circuit_breaker, get_default_endpoint_pool)
+from translate_core import (
+    CHUNK_MODES,
+    DEFAULT_BASE_URL,
+    DETECT_POLICIES,
+    TranslationHistory,
+    batch_limit_from_error,
+    compatible_progress_callback,
+    get_language_graph,
+    new_round_metrics,
+    pack_batches,
+    split_text_segments,
+    translation_rounds,
+)
+from translation_cache import get_default_cache
+
+# 同一事件循环中正在进行的相同请求，键为 (事件循环, 服务, 请求类型, 参数...)
+_async_flights = {}
+
+
+def create_async_session(pool_size=100):
+    """创建带连接池的aiohttp会话，可在多个翻译链之间共享"""
+    connector = aiohttp.TCPConnector(limit=pool_size)
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers={"Content-Type": "application/json", "Accept": "application/json"}
+    )
+
+
+class AsyncLibreTranslator:
+    """LibreTranslator 的 asyncio 版本，基于共享的 aiohttp 连接池
+
+    与同步翻译器一样按 RetryPolicy 重试、使用每个服务地址共享的断路器和自适应并发限制器，
+    使用默认服务地址且配置了实例池（LIBRETRANSLATE_URLS）时在池中的实例之间分派请求；
+    同一事件循环中相同的并发请求只发送一次。
+    """
+
+    # 语言列表在进程内按服务地址缓存
+    _languages_cache = {}
+    languages_ttl = 600
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, cache=None, session=None, pool_size=100, endpoints=None,
+                 retry=None, cancel_token=None, max_batch_size=32, max_batch_chars=5000):
+        self.base_url = base_url
+        if endpoints is None and base_url == DEFAULT_BASE_URL:
+            endpoints = get_default_endpoint_pool()
+        self.endpoints = endpoints
+        self.breaker = get_circuit_breaker(base_url)
+        self._endpoint = Endpoint(base_url, self.breaker, get_adaptive_limiter(base_url))
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.cancel_token = cancel_token
+        self.cache = cache
+        self.pool_size = pool_size
+        # 批量翻译时单个请求的最大片段数和最大字符数；服务拒绝q数组时改为逐条翻译
+        self.max_batch_size = max_batch_size
+        self.max_batch_chars = max_batch_chars
+        self.supports_batch = True
+        self.batch_limit = None
+        self.call_counts = {"detect": 0, "translate": 0, "cache_hits": 0, "coalesced": 0}
+        # 当前轮次的指标，begin_round() 之后开始收集
+        self._round_metrics = None
+        # 传入共享会话时不负责关闭它
+        self.session = session
+        self._owns_session = session is None
+
+    async def _get_session(self):
+        if self.session is None:
+            self.session = create_async_session(self.pool_size)
+        return self.session
+
+    async def close(self):
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _count(self, name):
+        self.call_counts[name] += 1
+        if name in ("cache_hits", "coalesced") and self._round_metrics is not None:
+            self._round_metrics[name] += 1
+
+    def begin_round(self):
+        """开始收集一轮的指标"""
+        self._round_metrics = new_round_metrics()
+
+    def end_round(self):
+        """结束收集并返回本轮指标"""
+        metrics, self._round_metrics = self._round_metrics, None
+        return metrics if metrics is not None else new_round_metrics()
+
+    async def _wait(self, seconds):
+        # 等待期间被取消时立即抛出 TranslationCancelled
+        if self.cancel_token is None:
+            await asyncio.sleep(seconds)
+            return
+        await self._until_cancelled(asyncio.sleep(seconds))
+
+    async def _until_cancelled(self, awaitable):
+        """等待 awaitable 完成；期间 cancel_token 被取消时不再等待，抛出 TranslationCancelled"""
+        self.cancel_token.raise_if_cancelled()
+        loop = asyncio.get_running_loop()
+        future = asyncio.ensure_future(awaitable)
+        cancelled = loop.create_future()
+        remove_callback = self.cancel_token.add_callback(
+            lambda: loop.call_soon_threadsafe(lambda: cancelled.done() or cancelled.set_result(None)))
+        try:
+            await asyncio.wait({future, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            remove_callback()
+            cancelled.cancel()
+            finished = future.done()
+            if not finished:
+                future.cancel()
+        if not finished:
+            raise TranslationCancelled("翻译已取消")
+        return future.result()
+
+    def _record_http(self, status, request_bytes, response_bytes, retry):
+        # 记录状态码和字节数，供本轮指标统计；网络异常以异常类名作为状态
+        metrics = self._round_metrics
+        if metrics is not None:
+            metrics["status_codes"].append(status)
+            metrics["request_bytes"] += request_bytes
+            metrics["response_bytes"] += response_bytes
+            if retry:
+                metrics["retries"] += 1
+
+    async def _post(self, path, payload, timeout):
+        """发送请求，对429/5xx和超时、连接错误按重试策略重试，返回 (状态码, 响应JSON或错误文本)
+
+        重试用尽时抛出 TranslationError，断路器打开时抛出 CircuitOpenError。
+        """
+        session = await self._get_session()
+        body = json.dumps(payload).encode("utf-8")
+        attempts = RequestAttempts(path, self.retry, self._endpoint, self.endpoints, self._record_http)
+        while True:
+            # 限制器由同一服务的同步和异步翻译共用，异步调用方在事件循环中排队等待名额
+            endpoint = await attempts.start_async(self.cancel_token)
+            try:
+                async with session.post(f"{endpoint.url}{path}", data=body,
+                                        timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    status = response.status
+                    content = await response.read()
+                    retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                attempts.network_error(e, timeout=isinstance(e, asyncio.TimeoutError),
+                                       connection=isinstance(e, aiohttp.ClientConnectionError))
+            except BaseException:
+                attempts.abandon()
+                raise
+            else:
+                if attempts.response(status, len(body), content, retry_after):
+                    text = content.decode("utf-8", errors="replace")
+                    return status, json.loads(text) if status == 200 else text
+
+            await self._wait(attempts.next_delay())
+
+    async def _execute(self, kind, func, *args):
+        self._count(kind)
+        started = time.perf_counter()
+        try:
+            return await func(*args)
+        finally:
+            metrics = self._round_metrics
+            if metrics is not None:
+                metrics[f"{kind}_calls"] += 1
+                metrics[f"{kind}_ms"] += (time.perf_counter() - started) * 1000
+
+    async def _call_shared(self, kind, func, *args):
+        """执行请求，与同一事件循环中正在进行的相同请求（同一服务、同样的参数）合并为一次"""
+        service = self.endpoints if self.endpoints is not None else self.base_url
+        key = (id(asyncio.get_running_loop()), service, kind) + tuple(
+            tuple(arg) if isinstance(arg, list) else arg for arg in args)
+        while True:
+            task = _async_flights.get(key)
+            shared = task is not None and not task.done()
+            if not shared:
+                task = asyncio.ensure_future(self._execute(kind, func, *args))
+                _async_flights[key] = task
+                task.add_done_callback(
+                    lambda done: _async_flights.pop(key) if _async_flights.get(key) is done else None)
+            try:
+                if shared and self.cancel_token is not None:
+                    # 等待其他翻译的请求时，本翻译被取消立即停止等待
+                    result = await self._until_cancelled(asyncio.shield(task))
+                else:
+                    # 等待方被取消时不取消共用的请求
+                    result = await asyncio.shield(task)
+            except TranslationCancelled:
+                if not shared or (self.cancel_token is not None and self.cancel_token.cancelled):
+                    raise
+                # 被取消的是发出请求的另一个翻译，本翻译自己重新发起
+                continue
+            if shared:
+                self._count("coalesced")
+            return result
+
+    def _catalog_url(self):
+        return self.endpoints.catalog_url() if self.endpoints is not None else self.base_url
+
+    async def get_languages(self):
+        """获取语言列表，每项为 {"code", "name", "targets"}"""
+        url = self._catalog_url()
+        cached = self._languages_cache.get(url)
+        if cached is not None and time.monotonic() - cached[0] < self.languages_ttl:
+            return cached[1]
+
+        session = await self._get_session()
+        try:
+            async with session.get(f"{url}/languages",
+                                   timeout=aiohttp.ClientTimeout(total=5)) as response:
+                if response.status != 200:
+                    logging.error(f"获取语言列表失败: {response.status}")
+                    return cached[1] if cached else []
+                languages = [
+                    {
+                        "code": lang["code"],
+                        "name": lang.get("name", lang["code"]),
+                        "targets": list(lang.get("targets", [])),
+                    }
+                    for lang in await response.json()
+                ]
+        except Exception as e:
+            logging.error(f"连接LibreTranslate服务失败: {str(e)}")
+            return cached[1] if cached else []
+
+        self._languages_cache[url] = (time.monotonic(), languages)
+        return languages
+
+    async def get_supported_languages(self):
+        """返回支持的语言代码列表"""
+        return [lang["code"] for lang in await self.get_languages()]
+
+    async def _detect(self, text):
+        status, result = await self._post("/detect", {"q": text}, timeout=10)
+        if status != 200:
+            logging.error(f"语言检测请求失败: {status} - {result}")
+            return None
+        if result and len(result) > 0:
+            # 返回置信度最高的语言
+            return result[0]['language']
+        return None
+
+    async def detect_language(self, text):
+        """检测文本语言"""
+        if not text.strip():
+            return None
+
+        try:
+            return await self._call_shared("detect", self._detect, text)
+        except TranslationCancelled:
+            raise
+        except Exception as e:
+            logging.error(f"语言检测失败: {str(e)}")
+            return None
+
+    async def _translate(self, text, source_lang, target_lang):
+        payload = {
+            "q": text,
+            "source": source_lang,
+            "target": target_lang,
+            "format": "text"
+        }
+        try:
+            status, data = await self._post("/translate", payload, timeout=30)
+            if status != 200:
+                raise TranslationError(f"翻译请求失败: {status} - {data}")
+            result = data.get("translatedText")
+        except TranslationError:
+            raise
+        except Exception as e:
+            raise TranslationError(f"翻译失败: {str(e)}") from e
+        if not isinstance(result, str):
+            raise TranslationError("翻译结果格式错误")
+        return result
+
+    async def translate(self, text, source_lang, target_lang):
+        """翻译文本，请求失败时抛出 TranslationError"""
+        # 起点和终点相同跳过翻译
+        if source_lang == target_lang or not text.strip():
+            return text
+
+        cleaned_text = text.replace("\x00", "").strip()
+        if not cleaned_text:
+            return text
+
+        # 缓存查询是本地操作，直接在事件循环中执行
+        if self.cache is not None:
+            cached = self.cache.get(cleaned_text, source_lang, target_lang)
+            if cached is not None:
+                self._count("cache_hits")
+                return cached
+
+        result = await self._call_shared("translate", self._translate, cleaned_text, source_lang, target_lang)
+        if self.cache is not None:
+            self.cache.put(cleaned_text, source_lang, target_lang, result)
+        return result
+
+    async def _translate_array(self, texts, source_lang, target_lang):
+        # 发送q为数组的请求，服务拒绝时返回None；规则与 HTTPBackend.translate_array 相同
+        if self.batch_limit is not None and len(texts) > self.batch_limit:
+            return await self._translate_split(texts, self.batch_limit, source_lang, target_lang)
+        payload = {
+            "q": texts,
+            "source": source_lang,
+            "target": target_lang,
+            "format": "text"
+        }
+        try:
+            status, data = await self._post("/translate", payload, timeout=30)
+            if status != 200:
+                limit = batch_limit_from_error(status, data, len(texts))
+                if limit is not None:
+                    logging.warning(f"批量请求超过服务的上限，改为每批{limit}个片段: {data}")
+                    self.batch_limit = limit
+                    return await self._translate_split(texts, limit, source_lang, target_lang)
+                logging.warning(f"批量翻译请求被拒绝，改为逐条翻译: {status} - {data}")
+                return None
+            translated = data.get("translatedText")
+            if not isinstance(translated, list) or len(translated) != len(texts):
+                logging.warning("批量翻译返回的结果数量不一致，改为逐条翻译")
+                self.supports_batch = False
+                return None
+            return translated
+        except TranslationError:
+            # 重试用尽或断路器打开时逐条翻译也不会成功
+            raise
+        except Exception as e:
+            logging.error(f"批量翻译失败: {str(e)}")
+            return None
+
+    async def _translate_split(self, texts, limit, source_lang, target_lang):
+        results = []
+        for start in range(0, len(texts), limit):
+            part = texts[start:start + limit]
+            translated = (await self._translate_array(part, source_lang, target_lang) if len(part) > 1
+                          else [await self._translate(part[0], source_lang, target_lang)])
+            if translated is None:
+                return None
+            results.extend(translated)
+        return results
+
+    async def translate_batch(self, texts, source_lang, target_lang):
+        """批量翻译：把多个片段放进一个请求的q数组，结果按输入顺序返回"""
+        results = list(texts)
+        if source_lang == target_lang:
+            return results
+
+        # 清理文本、查询缓存，并合并重复片段
+        pending = {}
+        for index, text in enumerate(results):
+            cleaned_text = text.replace("\x00", "").strip()
+            if not cleaned_text:
+                continue
+            if self.cache is not None:
+                cached = self.cache.get(cleaned_text, source_lang, target_lang)
+                if cached is not None:
+                    self._count("cache_hits")
+                    results[index] = cached
+                    continue
+            pending.setdefault(cleaned_text, []).append(index)
+
+        for batch in pack_batches(list(pending), self.max_batch_size, self.max_batch_chars):
+            translated = None
+            if len(batch) > 1 and self.supports_batch:
+                translated = await self._call_shared("translate", self._translate_array,
+                                                     batch, source_lang, target_lang)
+                if translated is not None and self.cache is not None:
+                    for text, result in zip(batch, translated):
+                        self.cache.put(text, source_lang, target_lang, result)
+            if translated is None:
+                # 单个片段或服务拒绝批量请求时逐条翻译
+                rejected = len(batch) > 1 and self.supports_batch
+                translated = [await self.translate(text, source_lang, target_lang) for text in batch]
+                if rejected:
+                    # 逐条翻译都成功，被拒绝的只是q数组本身，之后不再发送批量请求
+                    logging.warning("服务不接受批量请求，之后改为逐条翻译")
+                    self.supports_batch = False
+            for cleaned_text, result in zip(batch, translated):
+                for index in pending[cleaned_text]:
+                    results[index] = result
+
+        return results
+
+    async def translate_chunked(self, text, source_lang, target_lang, mode="sentence", workers=4):
+        """按句子或段落切分文本，同一语言对的各组片段并发批量翻译后按原样拼接"""
+        pieces, segment_indexes = split_text_segments(text, mode)
+        if len(segment_indexes) <= 1:
+            return await self.translate(text, source_lang, target_lang)
+
+        segments = [pieces[i] for i in segment_indexes]
+        # 与 translate_chunked() 相同：平均分成 workers 个连续的组，每组一次批量请求
+        group_size = -(-len(segments) // workers)
+        translated_groups = await asyncio.gather(*(
+            self.translate_batch(segments[i:i + group_size], source_lang, target_lang)
+            for i in range(0, len(segments), group_size)
+        ))
+
+        translated = [result for group in translated_groups for result in group]
+        for index, result in zip(segment_indexes, translated):
+            pieces[index] = result
+        return "".join(pieces)
+
+
+async def trans_async(original_text, loops=40, source_lang='auto', target_lang='zh-Hans',
+                      use_cache=True, detect_policy='heuristic', session=None, all_steps=None,
+                      languages=None, seed=None, base_url=DEFAULT_BASE_URL, chunk_mode=None, chunk_threshold=1000,
+                      chunk_workers=4, metrics_sink=None, checkpoint=None, cancel_token=None, early_stop=None,
+                      early_stop_rounds=2, report_writer=None):
+    """异步多轮翻译，每完成一轮产出 (当前轮次, 总轮次, 当前文本, 语言路径, 指标)
+
+    轮次逻辑与 trans() 共用 translation_rounds()：失败的一轮、逐轮指标、检查点、取消、提前结束和报告
+    的行为与参数含义都与 trans() 相同（检查点和报告在事件循环中同步写入）。
+    传入 all_steps（TranslationHistory）时，翻译步骤、指标和调用计数会记录在其中；
+    传入 languages（/languages 的返回格式）时不再请求 /languages。
+    """
+    if detect_policy not in DETECT_POLICIES:
+        raise ValueError(f"未知的语言检测策略: {detect_policy}")
+    if chunk_mode is not None and chunk_mode not in CHUNK_MODES:
+        raise ValueError(f"未知的分块模式: {chunk_mode}")
+    if all_steps is None:
+        all_steps = TranslationHistory()
+
+    translator = AsyncLibreTranslator(base_url, cache=get_default_cache() if use_cache else None, session=session,
+                                      cancel_token=cancel_token)
+    try:
+        if languages is None:
+            languages = await translator.get_languages()
+        graph = get_language_graph(languages)
+        if not graph.codes:
+            logging.error("无法获取支持的语言列表")
+            all_steps[:] = [("错误", "无法获取支持的语言列表")]
+            return
+
+        rounds = translation_rounds(translator, graph, original_text, loops, source_lang, target_lang,
+                                    detect_policy, chunk_mode, chunk_threshold, chunk_workers, random.Random(seed),
+                                    metrics_sink, checkpoint, cancel_token, early_stop, early_stop_rounds,
+                                    report_writer, all_steps=all_steps)
+        try:
+            request = next(rounds)
+            while True:
+                if request[0] == "round":
+                    yield request[1:]
+                    request = rounds.send(None)
+                    continue
+                try:
+                    if request[0] == "detect":
+                        result = await translator.detect_language(request[1])
+                    elif request[0] == "translate_chunked":
+                        result = await translator.translate_chunked(*request[1:])
+                    else:
+                        result = await translator.translate(*request[1:])
+                except TranslationError as e:
+                    request = rounds.throw(e)
+                else:
+                    request = rounds.send(result)
+        except StopIteration:
+            pass
+    finally:
+        await translator.close()
+
+
+async def trans_async_result(original_text, loops=40, progress_callback=None, source_lang='auto',
+                             target_lang='zh-Hans', **options):
+    """运行 trans_async 直到结束，返回值与 trans() 相同：(最终文本, all_steps)
+
+    progress_callback(current, total, result, path, metrics) 与 trans() 相同，其余参数见 trans_async()。
+    """
+    all_steps = TranslationHistory()
+    progress_callback = compatible_progress_callback(progress_callback)
+    async for current, total, current_text, lang_path, metrics in trans_async(
+            original_text, loops, source_lang, target_lang, all_steps=all_steps, **options):
+        if progress_callback:
+            progress_callback(current, total, current_text, lang_path, metrics)
+    if all_steps[0][0] == "错误":
+        return original_text, all_steps
+    # 取最后一步的文本：从检查点恢复的已结束的链不会再产出轮次
+    return all_steps[-1][1], all_steps
+
+
+async def trans_many_async(texts, loops=40, progress_callback=None, source_lang='auto', target_lang='zh-Hans',
+                           use_cache=True, detect_policy='heuristic', concurrency=100, seed=None,
+                           base_url=DEFAULT_BASE_URL, metrics_sink=None, checkpoint_dir=None, cancel_token=None,
+                           early_stop=None, report_dir=None, report_format="markdown"):
+    """在一个事件循环中并发执行多条翻译链，结果按输入顺序返回
+
+    progress_callback(index, current, total, result, path, metrics) 报告每条链的进度，
+    单条链出错不影响其他条目。checkpoint_dir、cancel_token、early_stop 和 report_dir 与 trans_many() 相同。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    progress_callback = compatible_progress_callback(progress_callback, 5)
+
+    async def run_chain(index, text, session, languages):
+        callback = None
+        if progress_callback:
+            def callback(current, total, result, path, metrics):
+                progress_callback(index, current, total, result, path, metrics)
+        async with semaphore:
+            try:
+                return await trans_async_result(
+                    text, loops, callback, source_lang, target_lang,
+                    use_cache=use_cache, detect_policy=detect_policy, session=session, languages=languages,
+                    seed=None if seed is None else seed + index, base_url=base_url, metrics_sink=metrics_sink,
+                    checkpoint=None if checkpoint_dir is None else os.path.join(checkpoint_dir,
+                                                                               f"chain-{index}.jsonl"),
+                    cancel_token=cancel_token, early_stop=early_stop,
+                    report_writer=None if report_dir is None else os.path.join(
+                        report_dir, f"chain-{index}{report_extension(report_format)}"))
+            except Exception as e:
+                logging.error(f"第{index}条文本翻译失败: {str(e)}")
+                return text, TranslationHistory([("错误", str(e))])
+
+    async with create_async_session(concurrency) as session:
+        # 所有链共用一份语言列表，避免并发请求 /languages
+        async with AsyncLibreTranslator(base_url, session=session) as translator:
+            languages = await translator.get_languages()
+        return await asyncio.gather(*(run_chain(index, text, session, languages)
+                                      for index, text in enumerate(texts)))
+
+
+def run_trans_many_async(texts, loops=40, **kwargs):
+    """trans_many_async 的同步包装"""
+    return asyncio.run(trans_many_async(texts, loops, **kwargs))
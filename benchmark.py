@@ -0,0 +1,225 @@
+"""离线性能基准：启动本地模拟服务，测量单链、批量、长文本三类负载
+
+    python benchmark.py --latency 0.005 --loops 10
+    python benchmark.py --json baseline.json
+    python benchmark.py --compare baseline.json --tolerance 0.2
+    python benchmark.py --servers 4 --latency 0.05      # 多个服务实例之间负载均衡
+
+报告每秒请求数、每轮延迟的 p50/p95/p99、每条链的HTTP调用数和峰值内存。
+使用 --compare 时，若吞吐量下降或 p95 延迟上升超过容差则以状态码1退出。
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+
+from mock_server import MockLibreTranslateServer
+from resilience import ENDPOINT_STRATEGIES, EndpointPool
+from translate_core import HTTPBackend, create_session, trans, trans_many
+
+SAMPLE_TEXT = "The quick brown fox jumps over the lazy dog. It was a bright cold day in April."
+WORKLOADS = ("single", "batch", "long")
+
+
+def percentile(values, q):
+    """线性插值的百分位数，values 为空时返回0"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class RoundTimer:
+    """通过进度回调记录每条链各轮之间的耗时"""
+
+    def __init__(self):
+        self.latencies = []
+        self._last = {}
+
+    def start(self, key=0):
+        self._last[key] = time.perf_counter()
+
+    def callback(self, key=0):
+        def on_progress(*args):
+            now = time.perf_counter()
+            self.latencies.append(now - self._last.get(key, now))
+            self._last[key] = now
+        return on_progress
+
+    def batch_callback(self, start_time):
+        def on_progress(index, *args):
+            now = time.perf_counter()
+            self.latencies.append(now - self._last.get(index, start_time))
+            self._last[index] = now
+        return on_progress
+
+
+def create_benchmark_backend(servers, args, pool_size):
+    """连接模拟服务的后端；多个服务实例时通过实例池分派"""
+    session = create_session(pool_size)
+    if len(servers) == 1:
+        return HTTPBackend(servers[0].url, session)
+    endpoints = EndpointPool([server.url for server in servers], args.strategy, health_interval=None)
+    return HTTPBackend(servers[0].url, session, endpoints=endpoints)
+
+
+def run_single(servers, args):
+    timer = RoundTimer()
+    backend = create_benchmark_backend(servers, args, 1)
+    for chain in range(args.chains):
+        timer.start()
+        trans(SAMPLE_TEXT, args.loops, timer.callback(), 'auto', args.target,
+              use_cache=args.cache, backend=backend, seed=args.seed + chain)
+    return args.chains, timer.latencies
+
+
+def run_batch(servers, args):
+    timer = RoundTimer()
+    backend = create_benchmark_backend(servers, args, args.workers)
+    texts = [f"{SAMPLE_TEXT} Sample number {i}." for i in range(args.chains)]
+    trans_many(texts, args.loops, timer.batch_callback(time.perf_counter()), 'auto', args.target,
+               use_cache=args.cache, max_workers=args.workers, backend=backend, seed=args.seed)
+    return len(texts), timer.latencies
+
+
+def long_text(repeat):
+    """长文本负载：示例文本重复 repeat 次，每句带上编号，避免相同的句子被去重后只剩几个请求"""
+    return " ".join(f"The quick brown fox number {i} jumps over the lazy dog. "
+                    f"It was a bright cold day in April, day {i}." for i in range(repeat))
+
+
+def run_long(servers, args):
+    timer = RoundTimer()
+    backend = create_benchmark_backend(servers, args, args.workers)
+    text = long_text(args.long_repeat)
+    timer.start()
+    trans(text, args.loops, timer.callback(), 'auto', args.target, use_cache=args.cache,
+          chunk_mode="sentence", chunk_threshold=1000, chunk_workers=args.workers,
+          backend=backend, seed=args.seed)
+    return 1, timer.latencies
+
+
+_RUNNERS = {"single": run_single, "batch": run_batch, "long": run_long}
+
+
+def run_workload(name, servers, args):
+    """运行一类负载，返回指标字典"""
+    for server in servers:
+        server.reset_counts()
+    tracemalloc.start()
+    started = time.perf_counter()
+    chains, latencies = _RUNNERS[name](servers, args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    requests_total = sum(server.total_requests() for server in servers)
+    return {
+        "workload": name,
+        "chains": chains,
+        "seconds": elapsed,
+        "requests": requests_total,
+        "requests_per_second": requests_total / elapsed if elapsed else 0.0,
+        "round_p50_ms": percentile(latencies, 0.50) * 1000,
+        "round_p95_ms": percentile(latencies, 0.95) * 1000,
+        "round_p99_ms": percentile(latencies, 0.99) * 1000,
+        "http_calls_per_chain": requests_total / chains if chains else 0.0,
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def print_report(results, stream=sys.stdout):
+    header = f"{'负载':<8}{'链数':>6}{'耗时s':>9}{'请求/秒':>10}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'调用/链':>9}{'峰值KB':>10}"
+    stream.write(header + "\n")
+    for r in results:
+        stream.write(
+            f"{r['workload']:<8}{r['chains']:>6}{r['seconds']:>9.2f}{r['requests_per_second']:>10.1f}"
+            f"{r['round_p50_ms']:>9.1f}{r['round_p95_ms']:>9.1f}{r['round_p99_ms']:>9.1f}"
+            f"{r['http_calls_per_chain']:>9.1f}{r['peak_memory_kb']:>10.0f}\n"
+        )
+
+
+def compare_results(results, baseline, tolerance):
+    """与基线比较，返回退化说明列表"""
+    baseline = {r["workload"]: r for r in baseline}
+    regressions = []
+    for r in results:
+        base = baseline.get(r["workload"])
+        if base is None:
+            continue
+        if r["requests_per_second"] < base["requests_per_second"] * (1 - tolerance):
+            regressions.append(f"{r['workload']}: 吞吐量 {base['requests_per_second']:.1f} → "
+                               f"{r['requests_per_second']:.1f} 请求/秒")
+        if r["round_p95_ms"] > base["round_p95_ms"] * (1 + tolerance):
+            regressions.append(f"{r['workload']}: p95延迟 {base['round_p95_ms']:.1f} → "
+                               f"{r['round_p95_ms']:.1f} ms")
+        if r["http_calls_per_chain"] > base["http_calls_per_chain"] * (1 + tolerance):
+            regressions.append(f"{r['workload']}: 每链调用 {base['http_calls_per_chain']:.1f} → "
+                               f"{r['http_calls_per_chain']:.1f}")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="多轮翻译离线性能基准")
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument("--loops", type=int, default=10, help="每条链的循环次数")
+    parser.add_argument("--chains", type=int, default=20, help="单链和批量负载的链数")
+    parser.add_argument("--workers", type=int, default=8, help="批量负载的并发数和长文本的分块并发数")
+    parser.add_argument("--long-repeat", type=int, default=200, help="长文本由多少段带编号的示例文本构成")
+    parser.add_argument("--target", default="zh-Hans", help="目标语言")
+    parser.add_argument("--seed", type=int, default=0, help="路线随机种子")
+    parser.add_argument("--cache", action="store_true", help="启用翻译缓存（默认关闭以测量原始开销）")
+    parser.add_argument("--latency", type=float, default=0.005, help="模拟服务每个请求的延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.002, help="模拟服务的延迟抖动（秒）")
+    parser.add_argument("--char-latency", type=float, default=0.0, help="模拟服务每个字符的延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务的错误率")
+    parser.add_argument("--servers", type=int, default=1, help="模拟服务实例数")
+    parser.add_argument("--server-concurrency", type=int, default=None, help="每个模拟服务实例同时处理的请求数上限")
+    parser.add_argument("--strategy", choices=ENDPOINT_STRATEGIES, default="least-outstanding",
+                        help="多个实例时的分派策略")
+    parser.add_argument("--json", help="把结果写入JSON文件，可作为之后比较的基线")
+    parser.add_argument("--compare", help="与之前保存的JSON基线比较")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对退化幅度")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # 模拟错误会产生大量日志，基准运行时只保留错误级别以上
+    logging.getLogger().setLevel(logging.ERROR)
+
+    results = []
+    servers = [
+        MockLibreTranslateServer(latency=args.latency, jitter=args.jitter, char_latency=args.char_latency,
+                                 error_rate=args.error_rate, seed=args.seed + i,
+                                 max_concurrency=args.server_concurrency).start()
+        for i in range(args.servers)
+    ]
+    try:
+        for name in args.workloads:
+            results.append(run_workload(name, servers, args))
+    finally:
+        for server in servers:
+            server.stop()
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"性能退化: {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import base64
+import json
+import logging
+import os
+import struct
+
+CHECKPOINT_VERSION = 1
+
+
+def pack_random_state(state):
+    """把 random.Random.getstate() 的结果压缩成可写入JSON的形式（约3KB，直接写成数字列表约7KB）"""
+    version, internal, gauss_next = state
+    return [version, base64.b64encode(struct.pack(f"<{len(internal)}I", *internal)).decode("ascii"), gauss_next]
+
+
+def unpack_random_state(packed):
+    """pack_random_state 的逆操作，结果可直接传给 random.Random.setstate()"""
+    version, data, gauss_next = packed
+    raw = base64.b64decode(data)
+    return version, struct.unpack(f"<{len(raw) // 4}I", raw), gauss_next
+
+
+class CheckpointState:
+    """从检查点日志恢复出的翻译链状态"""
+
+    def __init__(self, header):
+        self.source_lang = header["source"]
+        self.source_detected = header["detected"]
+        self.route = [tuple(hop) for hop in header["route"]]
+        self.rng_state = header["rng"]
+        # [(操作, 文本, 本轮结束后的语言, 指标), ...]
+        self.steps = []
+        self.done = False
+        # 链提前结束的原因（见 TranslationHistory.stop_reason），跑完全部轮次时为None
+        self.stop_reason = None
+
+    @property
+    def rounds_done(self):
+        return len(self.steps)
+
+    def random_state(self):
+        """转换为 random.Random.setstate() 接受的元组"""
+        return unpack_random_state(self.rng_state)
+
+
+class CheckpointJournal:
+    """翻译链的检查点日志（JSON行）
+
+    第一行是头部：原文、参数、规划好的路线和随机数生成器状态；之后每完成一轮追加一行
+    (操作, 文本)，路线被重新规划的那一轮还会带上新的路线和随机数状态；全部完成后追加 done。
+    每次写入后调用fsync，进程崩溃或断电时最多丢失正在进行的那一轮。
+    """
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self._file = None
+        # 最后一条完整记录之后的位置，恢复时截掉写了一半的行
+        self._valid_size = 0
+
+    def load(self, original_text, loops, target_lang):
+        """读取与本次参数一致的检查点，不存在或不一致时返回None"""
+        if not os.path.exists(self.path):
+            return None
+
+        state = None
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时写了一半的行，之后的内容都不可信
+                    break
+                if not line.endswith(b"\n"):
+                    break
+
+                if state is None:
+                    if (record.get("type") != "header" or record.get("version") != CHECKPOINT_VERSION
+                            or record.get("text") != original_text or record.get("loops") != loops
+                            or record.get("target") != target_lang):
+                        logging.warning(f"检查点 {self.path} 与本次翻译参数不一致，重新开始")
+                        return None
+                    state = CheckpointState(record)
+                elif record.get("type") == "step":
+                    if "route" in record:
+                        state.route[record["round"] - 1:] = [tuple(hop) for hop in record["route"]]
+                        state.rng_state = record["rng"]
+                    state.steps.append((record["action"], record["text"], record["lang"], record.get("metrics")))
+                elif record.get("type") == "done":
+                    state.done = True
+                    state.stop_reason = record.get("stop_reason")
+                offset += len(line)
+
+        self._valid_size = offset
+        if state is not None:
+            logging.info(f"从检查点恢复: 已完成{state.rounds_done}/{loops}轮")
+        return state
+
+    def _open(self, mode):
+        self._file = open(self.path, mode, encoding="utf-8")
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def start(self, original_text, loops, source_lang, target_lang, source_detected, route, rng_state):
+        """新建日志并写入头部"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._open("w")
+        self._write({
+            "type": "header",
+            "version": CHECKPOINT_VERSION,
+            "text": original_text,
+            "loops": loops,
+            "source": source_lang,
+            "target": target_lang,
+            "detected": source_detected,
+            "route": route,
+            "rng": pack_random_state(rng_state),
+        })
+
+    def resume(self):
+        """在已加载的日志末尾继续追加"""
+        with open(self.path, "r+b") as f:
+            f.truncate(self._valid_size)
+        self._open("a")
+
+    def append_step(self, round_number, action, text, lang, metrics=None, route=None, rng_state=None):
+        """记录完成的一轮；route 为本轮起重新规划的剩余路线"""
+        record = {"type": "step", "round": round_number, "action": action, "text": text, "lang": lang}
+        if metrics is not None:
+            record["metrics"] = metrics
+        if route is not None:
+            record["route"] = route
+            record["rng"] = pack_random_state(rng_state)
+        self._write(record)
+
+    def finish(self, stop_reason=None):
+        """记录整条链已结束；提前结束（如结果收敛）时一并记录原因"""
+        record = {"type": "done"}
+        if stop_reason is not None:
+            record["stop_reason"] = stop_reason
+        self._write(record)
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,215 @@
+"""命令行批量翻译：从JSONL读取请求，每完成一条翻译链就输出一行JSONL结果
+
+请求格式（每行一个JSON对象）::
+
+    {"id": "a1", "text": "Hello", "loops": 10, "target": "zh-Hans", "seed": 42}
+
+只有 text 是必需的，其余字段缺省时使用命令行参数；没有 id 时使用行号。
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import create_metrics_sink
+from report_writer import REPORT_FORMATS, report_extension
+from translate_core import BACKENDS, CHUNK_MODES, DETECT_POLICIES, create_session, trans
+
+
+def read_requests(stream):
+    """逐行读取请求，产出 (行号, 请求对象或错误信息)"""
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict) or not isinstance(request.get("text"), str):
+                raise ValueError("缺少text字段")
+        except ValueError as e:
+            yield line_no, f"第{line_no}行格式错误: {str(e)}"
+            continue
+        yield line_no, request
+
+
+def load_completed_ids(path):
+    """读取已有输出文件中成功完成的请求id，用于断点续跑"""
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 上次中断时可能留下半行
+                continue
+            if "error" not in record and "id" in record:
+                completed.add(str(record["id"]))
+    return completed
+
+
+def safe_filename(request_id):
+    """id中不适合作为文件名的字符替换为下划线"""
+    return re.sub(r"[^\w.-]", "_", str(request_id))
+
+
+def checkpoint_path(checkpoint_dir, request_id):
+    """请求对应的检查点文件"""
+    return os.path.join(checkpoint_dir, safe_filename(request_id) + ".jsonl")
+
+
+def report_path(report_dir, request_id, report_format):
+    """请求对应的报告文件"""
+    return os.path.join(report_dir, safe_filename(request_id) + report_extension(report_format))
+
+
+def history_error(all_steps):
+    """翻译链整体失败时返回错误信息：历史中有错误步骤，或每一轮都失败"""
+    for action, text in all_steps:
+        if action == "错误":
+            return text
+    if all_steps.metrics and all(metrics["failed"] for metrics in all_steps.metrics):
+        return f"全部{len(all_steps.metrics)}轮翻译失败: {all_steps.metrics[-1]['error']}"
+    return None
+
+
+def run_request(request_id, request, args, session, metrics_sink=None):
+    """执行一条请求，返回结果记录；翻译链失败时抛出 RuntimeError，由调用方输出错误记录"""
+    final_text, all_steps = trans(
+        request["text"],
+        int(request.get("loops", args.loops)),
+        None,
+        request.get("source", "auto"),
+        request.get("target", args.target),
+        use_cache=not args.no_cache,
+        detect_policy=args.detect_policy,
+        session=session,
+        chunk_mode=args.chunk,
+        backend=args.backend,
+        seed=request.get("seed"),
+        metrics_sink=metrics_sink,
+        checkpoint=checkpoint_path(args.checkpoint_dir, request_id) if args.checkpoint_dir else None,
+        early_stop=args.early_stop,
+        report_writer=report_path(args.report_dir, request_id, args.report_format) if args.report_dir else None,
+    )
+    # 失败的链不能写成成功记录，否则 --resume 会把它当作已完成而永远跳过
+    error = history_error(all_steps)
+    if error is not None:
+        raise RuntimeError(error)
+    record = {
+        "id": request_id,
+        "result": final_text,
+        "route": [f"{source}→{target}" for source, target in all_steps.route],
+        "call_counts": all_steps.call_counts,
+        "failed_rounds": [metrics["round"] for metrics in all_steps.metrics if metrics["failed"]],
+    }
+    if all_steps.stop_reason is not None:
+        record["stop_reason"] = all_steps.stop_reason
+    if args.steps:
+        record["steps"] = [list(step) for step in all_steps]
+        record["metrics"] = all_steps.metrics
+    return record
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="多轮随机翻译（无界面批处理）")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL请求文件，默认从标准输入读取")
+    parser.add_argument("-o", "--output", default="-", help="JSONL结果文件，默认写到标准输出")
+    parser.add_argument("--resume", action="store_true", help="跳过输出文件中已成功完成的id，并追加写入")
+    parser.add_argument("-j", "--concurrency", type=int, default=4, help="同时运行的翻译链数")
+    parser.add_argument("--loops", type=int, default=10, help="默认循环次数")
+    parser.add_argument("--target", default="zh-Hans", help="默认目标语言")
+    parser.add_argument("--backend", choices=BACKENDS, default="libretranslate", help="翻译后端")
+    parser.add_argument("--detect-policy", choices=DETECT_POLICIES, default="heuristic", help="语言检测策略")
+    parser.add_argument("--chunk", choices=CHUNK_MODES, default=None, help="长文本分块模式")
+    parser.add_argument("--early-stop", type=float, default=None,
+                        help="相邻两轮结果的相似度连续不低于该值（0~1）时提前结束")
+    parser.add_argument("--no-cache", action="store_true", help="不使用翻译缓存")
+    parser.add_argument("--steps", action="store_true", help="在结果中包含每一轮的文本和指标")
+    parser.add_argument("--checkpoint-dir", help="每条请求的检查点目录，中断后重新运行时从最后完成的一轮继续")
+    parser.add_argument("--report-dir", help="每条请求的报告目录，每完成一轮追加写入")
+    parser.add_argument("--report-format", choices=REPORT_FORMATS, default="markdown", help="报告格式")
+    parser.add_argument("--metrics", help="每轮指标的输出文件：.prom 为Prometheus文本格式，其他为JSON行")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.resume and args.output == "-":
+        logging.error("--resume 需要指定输出文件")
+        return 2
+
+    completed = load_completed_ids(args.output) if args.resume else set()
+    if completed:
+        logging.info(f"跳过已完成的{len(completed)}条请求")
+
+    input_stream = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    if args.output == "-":
+        output_stream = sys.stdout
+    else:
+        output_stream = open(args.output, "a" if args.resume else "w", encoding="utf-8")
+
+    def emit(record):
+        output_stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output_stream.flush()
+
+    failures = 0
+    # 同时在途的请求数有上限，输入按需读取，内存占用与输入大小无关
+    max_pending = args.concurrency * 2
+    # 连接池大小与同时在途的请求数一致，分块翻译时每条链还会并行发送多个请求
+    session = create_session(args.concurrency * (4 if args.chunk else 1))
+    metrics_sink = create_metrics_sink(args.metrics) if args.metrics else None
+    pending = {}
+
+    def drain(return_when, timeout=None):
+        nonlocal failures
+        done, _ = wait(pending, timeout=timeout, return_when=return_when)
+        for future in done:
+            request_id = pending.pop(future)
+            try:
+                emit(future.result())
+            except Exception as e:
+                failures += 1
+                logging.error(f"请求{request_id}失败: {str(e)}")
+                emit({"id": request_id, "error": str(e)})
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for line_no, request in read_requests(input_stream):
+                if isinstance(request, str):
+                    failures += 1
+                    logging.error(request)
+                    emit({"id": line_no, "error": request})
+                    continue
+
+                request_id = request.get("id", line_no)
+                if str(request_id) in completed:
+                    continue
+
+                pending[executor.submit(run_request, request_id, request, args, session, metrics_sink)] = request_id
+                if len(pending) >= max_pending:
+                    drain(FIRST_COMPLETED)
+                else:
+                    # 不阻塞地输出已经完成的结果
+                    drain(FIRST_COMPLETED, timeout=0)
+
+            if pending:
+                drain(ALL_COMPLETED)
+    finally:
+        session.close()
+        if metrics_sink is not None:
+            metrics_sink.close()
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
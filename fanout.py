@@ -0,0 +1,160 @@
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from translate_core import (LibreTranslator, TranslationCancelled, TranslationError, TranslationHistory,
+                            compatible_progress_callback, create_session, plan_route)
+from translation_cache import get_default_cache
+
+
+def divergence_scores(reference, candidates, n=2):
+    """计算各候选文本相对参考文本的差异度（越大越"离谱"），返回numpy数组
+
+    使用字符n-gram计数向量的余弦距离，并按长度比例打折，
+    避免几乎被翻译成空白的结果排在前面。
+    """
+    docs = [" ".join(reference.lower().split())] + [" ".join(c.lower().split()) for c in candidates]
+    vocab = {}
+    rows = []
+    cols = []
+    for row, doc in enumerate(docs):
+        for i in range(max(len(doc) - n + 1, 0)):
+            rows.append(row)
+            cols.append(vocab.setdefault(doc[i:i + n], len(vocab)))
+
+    counts = np.zeros((len(docs), max(len(vocab), 1)))
+    np.add.at(counts, (np.array(rows, dtype=int), np.array(cols, dtype=int)), 1)
+
+    norms = np.linalg.norm(counts, axis=1)
+    similarity = counts[1:] @ counts[0] / np.maximum(norms[1:] * norms[0], 1e-12)
+    divergence = 1.0 - similarity
+
+    lengths = np.array([len(doc) for doc in docs[1:]], dtype=float)
+    length_ratio = np.minimum(lengths / max(len(docs[0]), 1), 1.0)
+    return divergence * length_ratio
+
+
+def trans_fanout(original_text, loops=40, chains=5, progress_callback=None, source_lang='auto',
+                 target_lang='zh-Hans', use_cache=True, backend=None, seed=None, max_workers=8, cancel_token=None):
+    """对同一输入并发运行多条独立的随机翻译链，按差异度从高到低返回候选
+
+    返回 [(得分, 最终文本, all_steps), ...]。各链按轮次同步推进，同一轮中
+    相同的 (文本, 源语言, 目标语言) 只翻译一次（例如共同的第一跳和最后几跳）。
+    得分以原文直接翻译到目标语言的结果为参考计算，因此原文与目标语言不同也能比较。
+    progress_callback(index, current, total, result, path, metrics) 报告每条链的进度（不接受 metrics 的回调照旧调用）。
+    每条链的 call_counts 和逐轮 metrics 只统计该链自己的请求，与其他链合并的一跳记为 coalesced。
+    cancel_token 被取消时在本轮结束后停止，用已完成的轮次计算得分。
+    """
+    progress_callback = compatible_progress_callback(progress_callback, 5)
+    session = create_session(max_workers)
+    cache = get_default_cache() if use_cache else None
+    # 语言检测和参考译文由所有链共用；每条链另有自己的翻译器，分别统计调用次数和每轮指标
+    translator = LibreTranslator(cache=cache, session=session, backend=backend, cancel_token=cancel_token)
+    chain_translators = [LibreTranslator(cache=cache, session=session, backend=backend, cancel_token=cancel_token)
+                         for _ in range(chains)]
+    try:
+        graph = translator.language_graph()
+        if not graph.codes:
+            logging.error("无法获取支持的语言列表")
+            return [(0.0, original_text, TranslationHistory([("错误", "无法获取支持的语言列表")]))]
+
+        # 所有链共用一次源语言检测
+        if source_lang == 'auto':
+            detected_lang = translator.detect_language(original_text)
+            if detected_lang is None:
+                detected_lang = 'en'
+                logging.warning(f"语言检测失败，使用默认语言: {detected_lang}")
+            source_lang = detected_lang
+
+        rngs = [random.Random(None if seed is None else seed + index) for index in range(chains)]
+        routes = [plan_route(source_lang, loops, target_lang, graph, rng) for rng in rngs]
+        histories = []
+        for route in routes:
+            history = TranslationHistory([("原始文本", original_text)])
+            history.route = route
+            histories.append(history)
+        texts = [original_text] * chains
+        lang_paths = [[] for _ in range(chains)]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # 参考译文与第一轮一起提交
+            reference_future = executor.submit(translator.translate, original_text, source_lang, target_lang)
+
+            for round_idx in range(loops):
+                if cancel_token is not None and cancel_token.cancelled:
+                    for history in histories:
+                        history.stop_reason = "cancelled"
+                    break
+                round_started = time.perf_counter()
+                futures = {}
+                for index in range(chains):
+                    chain_translators[index].begin_round()
+                    key = (texts[index],) + routes[index][round_idx]
+                    if key not in futures:
+                        # 请求记在第一条需要它的链上
+                        futures[key] = executor.submit(chain_translators[index].translate, *key)
+                    else:
+                        chain_translators[index]._count("coalesced")
+                for index in range(chains):
+                    from_lang, to_lang = routes[index][round_idx]
+                    lang_paths[index].append(from_lang)
+                    error = None
+                    try:
+                        texts[index] = futures[(texts[index], from_lang, to_lang)].result()
+                    except TranslationCancelled:
+                        histories[index].stop_reason = "cancelled"
+                        chain_translators[index].end_round()
+                        continue
+                    except TranslationError as e:
+                        error = str(e)
+                    if error is None:
+                        action = f"{from_lang}→{to_lang}"
+                    else:
+                        # 失败的一跳保持文本不变，该链剩余路线从当前语言重新规划
+                        logging.warning(f"第{index}条链第{round_idx + 1}轮翻译失败: {error}")
+                        action = f"{from_lang}→{to_lang} (失败)"
+                        routes[index][round_idx + 1:] = plan_route(from_lang, loops, target_lang, graph,
+                                                                   rngs[index], start_round=round_idx + 1)
+                    histories[index].append((action, texts[index]))
+                    metrics = chain_translators[index].end_round()
+                    metrics.update({
+                        "round": round_idx + 1,
+                        "source": from_lang,
+                        "target": to_lang,
+                        # 各链同步推进，本轮耗时为等到该链结果为止的时间
+                        "round_ms": (time.perf_counter() - round_started) * 1000,
+                        "cache_hit": metrics["cache_hits"] > 0 and metrics["translate_calls"] == 0,
+                        "failed": error is not None,
+                        "error": error,
+                    })
+                    histories[index].metrics.append(metrics)
+                    if progress_callback:
+                        progress_callback(index, round_idx + 1, loops, texts[index], lang_paths[index] + [to_lang],
+                                          metrics)
+
+            try:
+                reference = reference_future.result()
+            except TranslationCancelled:
+                reference = original_text
+            except TranslationError as e:
+                logging.warning(f"参考译文翻译失败，改用原文计算差异度: {str(e)}")
+                reference = original_text
+
+        for history, chain_translator in zip(histories, chain_translators):
+            history.call_counts = dict(chain_translator.call_counts)
+        translate_calls = translator.call_counts['translate'] + sum(
+            history.call_counts['translate'] for history in histories)
+        cache_hits = translator.call_counts['cache_hits'] + sum(
+            history.call_counts['cache_hits'] for history in histories)
+        logging.info(f"{chains}条链共调用: 检测{translator.call_counts['detect']}次, "
+                     f"翻译{translate_calls}次, 缓存命中{cache_hits}次, "
+                     f"链间合并{sum(history.call_counts['coalesced'] for history in histories)}次")
+    finally:
+        session.close()
+
+    scores = divergence_scores(reference, texts)
+    order = np.argsort(-scores, kind="stable")
+    return [(float(scores[i]), texts[i], histories[i]) for i in order]
@@ -0,0 +1,469 @@
+"""本地翻译任务服务：多个用户共用一个工作线程池和一组HTTP连接
+
+    python job_service.py --port 5100 --workers 4 --queue-size 100
+
+接口::
+
+    POST   /jobs              提交任务 {"text", "loops", "source", "target", "priority", "seed"}，返回 {"id"}
+                              可选 detect_policy、chunk_mode、early_stop、use_cache、backend，含义同 trans()
+    GET    /jobs/<id>         任务状态，完成后包含结果
+    DELETE /jobs/<id>         取消任务（排队中的立即取消，运行中的在本轮或重试等待结束后停止）
+    GET    /jobs/<id>/events  以server-sent events推送每轮进度，最后推送 done 事件
+    GET    /health            队列长度和工作线程数
+
+priority 越小越先执行，相同优先级按提交顺序执行；队列满时返回503。
+"""
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+import requests
+
+from json_http import JSONServer, send_json
+from translate_core import (BACKENDS, CHUNK_MODES, DETECT_POLICIES, CancellationToken, TranslationHistory,
+                            compatible_progress_callback, create_session, trans)
+
+DEFAULT_SERVICE_URL = "http://127.0.0.1:5100"
+JOB_STATES = ("queued", "running", "cancelling", "done", "failed", "cancelled")
+
+
+class Job:
+    """一个翻译任务及其进度事件"""
+
+    def __init__(self, job_id, text, loops, source_lang, target_lang, priority, seed, options):
+        self.id = job_id
+        self.text = text
+        self.loops = loops
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.priority = priority
+        self.seed = seed
+        self.options = options
+        self.status = "queued"
+        self.error = None
+        self.result = None
+        self.all_steps = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_token = CancellationToken()
+        # 进度事件 (事件名, 数据)，SSE连接按序号读取
+        self.events = []
+        self.changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def add_event(self, name, data):
+        with self.changed:
+            self.events.append((name, data))
+            self.changed.notify_all()
+
+    def to_dict(self):
+        info = {
+            "id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "loops": self.loops,
+            "rounds_done": sum(1 for name, _ in self.events if name == "progress"),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.error is not None:
+            info["error"] = self.error
+        if self.all_steps is not None:
+            info["result"] = self.result
+            info["steps"] = [list(step) for step in self.all_steps]
+            info["route"] = [list(hop) for hop in self.all_steps.route]
+            info["call_counts"] = self.all_steps.call_counts
+            info["metrics"] = self.all_steps.metrics
+            info["stop_reason"] = self.all_steps.stop_reason
+        return info
+
+
+class JobService:
+    """有界优先队列加固定数量的工作线程，所有任务共用一个HTTP会话"""
+
+    def __init__(self, workers=4, max_queue=100, max_finished=1000, **trans_options):
+        self.workers = workers
+        self.max_finished = max_finished
+        self.trans_options = trans_options
+        self.session = create_session(workers * (4 if trans_options.get("chunk_mode") else 1))
+        self._queue = queue.PriorityQueue(maxsize=max_queue)
+        self._sequence = itertools.count()
+        self._jobs = {}
+        self._finished = []
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, text, loops=10, source_lang='auto', target_lang='zh-Hans', priority=0, seed=None, **options):
+        """提交任务，队列已满时抛出 queue.Full"""
+        job = Job(uuid.uuid4().hex, text, loops, source_lang, target_lang, priority, seed, options)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait((priority, next(self._sequence), job))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """取消任务，返回任务；任务不存在时返回None"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with job.changed:
+            if job.status == "queued":
+                # 移出队列腾出名额；已被工作线程取出的任务由工作线程跳过
+                self._dequeue(job)
+                self._finish(job, "cancelled")
+            elif job.status == "running":
+                job.status = "cancelling"
+                job.cancel_token.cancel()
+        return job
+
+    def queue_size(self):
+        return self._queue.qsize()
+
+    def _dequeue(self, job):
+        """从队列中删除排队中的任务，返回是否找到"""
+        with self._queue.mutex:
+            entries = self._queue.queue
+            for index, entry in enumerate(entries):
+                if entry[2] is job:
+                    entries[index] = entries[-1]
+                    entries.pop()
+                    heapq.heapify(entries)
+                    self._queue.unfinished_tasks -= 1
+                    self._queue.not_full.notify()
+                    return True
+        return False
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job.add_event("done", job.to_dict())
+        with self._lock:
+            self._finished.append(job.id)
+            # 只保留最近完成的任务
+            while len(self._finished) > self.max_finished:
+                self._jobs.pop(self._finished.pop(0), None)
+
+    def _worker(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                break
+            with job.changed:
+                if job.status != "queued":
+                    continue
+                job.status = "running"
+                job.started_at = time.time()
+
+            def progress_callback(current, total, result, path, metrics):
+                job.add_event("progress", {"round": current, "total": total, "text": result,
+                                           "path": path, "metrics": metrics})
+
+            options = dict(self.trans_options, **job.options)
+            try:
+                job.result, job.all_steps = trans(job.text, job.loops, progress_callback, job.source_lang,
+                                                  job.target_lang, session=self.session, seed=job.seed,
+                                                  cancel_token=job.cancel_token, **options)
+            except Exception as e:
+                logging.error(f"任务{job.id}失败: {str(e)}")
+                self._finish(job, "failed", str(e))
+            else:
+                # 被取消的任务保留已完成轮次的结果
+                self._finish(job, "cancelled" if job.all_steps.stop_reason == "cancelled" else "done")
+
+    def close(self):
+        for _ in self._threads:
+            self._queue.put((float("inf"), next(self._sequence), None))
+        for thread in self._threads:
+            thread.join()
+        self.session.close()
+
+
+def _parse_options(payload):
+    """从请求中取出传给 trans() 的可选参数（与 trans() 的参数同名）并校验"""
+    options = {}
+    if "detect_policy" in payload:
+        if payload["detect_policy"] not in DETECT_POLICIES:
+            raise ValueError(f"未知的语言检测策略: {payload['detect_policy']}")
+        options["detect_policy"] = payload["detect_policy"]
+    if payload.get("chunk_mode") is not None:
+        if payload["chunk_mode"] not in CHUNK_MODES:
+            raise ValueError(f"未知的分块模式: {payload['chunk_mode']}")
+        options["chunk_mode"] = payload["chunk_mode"]
+    if payload.get("early_stop") is not None:
+        options["early_stop"] = float(payload["early_stop"])
+    if "use_cache" in payload:
+        options["use_cache"] = bool(payload["use_cache"])
+    if payload.get("backend") is not None:
+        if payload["backend"] not in BACKENDS:
+            raise ValueError(f"未知的翻译后端: {payload['backend']}")
+        options["backend"] = payload["backend"]
+    return options
+
+
+class JobServer:
+    """JobService 的HTTP接口"""
+
+    def __init__(self, service, host="127.0.0.1", port=5100, keepalive_interval=15.0):
+        self.service = service
+        # SSE连接空闲时定期发送注释行，及时发现已断开的客户端
+        self.keepalive_interval = keepalive_interval
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self, "GET")
+
+            def do_POST(self):
+                server._handle(self, "POST")
+
+            def do_DELETE(self):
+                server._handle(self, "DELETE")
+
+        self.httpd = JSONServer((host, port), Handler)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handle(self, handler, method):
+        parts = [part for part in urlparse(handler.path).path.split("/") if part]
+
+        if method == "GET" and parts == ["health"]:
+            return send_json(handler, 200, {"status": "ok", "workers": self.service.workers,
+                                             "queued": self.service.queue_size()})
+
+        if method == "POST" and parts == ["jobs"]:
+            length = int(handler.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(handler.rfile.read(length) or b"{}")
+                if not isinstance(payload, dict) or not isinstance(payload.get("text"), str):
+                    raise ValueError("缺少text字段")
+                options = _parse_options(payload)
+                job = self.service.submit(
+                    payload["text"], int(payload.get("loops", 10)), payload.get("source", "auto"),
+                    payload.get("target", "zh-Hans"), int(payload.get("priority", 0)), payload.get("seed"),
+                    **options,
+                )
+            except queue.Full:
+                return send_json(handler, 503, {"error": "任务队列已满"}, {"Retry-After": "5"})
+            except (ValueError, TypeError) as e:
+                return send_json(handler, 400, {"error": str(e)})
+            return send_json(handler, 202, {"id": job.id, "status": job.status})
+
+        if len(parts) >= 2 and parts[0] == "jobs":
+            job = self.service.get(parts[1])
+            if job is None:
+                return send_json(handler, 404, {"error": "任务不存在"})
+            if method == "GET" and len(parts) == 2:
+                return send_json(handler, 200, job.to_dict())
+            if method == "DELETE" and len(parts) == 2:
+                return send_json(handler, 200, self.service.cancel(job.id).to_dict())
+            if method == "GET" and parts[2:] == ["events"]:
+                return self._stream_events(handler, job)
+
+        return send_json(handler, 404, {"error": "Not Found"})
+
+    def _stream_events(self, handler, job):
+        # 支持断线重连：从 Last-Event-ID 之后的事件继续推送
+        try:
+            position = int(handler.headers.get("Last-Event-ID", -1)) + 1
+        except ValueError:
+            position = 0
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        handler.close_connection = True
+
+        try:
+            while True:
+                with job.changed:
+                    if position >= len(job.events):
+                        job.changed.wait(self.keepalive_interval)
+                    events = job.events[position:]
+                if not events:
+                    handler.wfile.write(b": keepalive\n\n")
+                    handler.wfile.flush()
+                    continue
+                for name, data in events:
+                    message = f"id: {position}\nevent: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                    handler.wfile.write(message.encode("utf-8"))
+                    position += 1
+                    if name == "done":
+                        handler.wfile.flush()
+                        return
+                handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已断开
+            return
+
+
+class JobClient:
+    """任务服务的客户端"""
+
+    def __init__(self, base_url=DEFAULT_SERVICE_URL, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def health(self):
+        response = self.session.get(f"{self.base_url}/health", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def submit(self, text, loops=10, source_lang='auto', target_lang='zh-Hans', priority=0, seed=None, **options):
+        """提交任务，返回任务id"""
+        payload = dict(options, text=text, loops=loops, source=source_lang, target=target_lang,
+                       priority=priority, seed=seed)
+        response = self.session.post(f"{self.base_url}/jobs", json=payload, timeout=self.timeout)
+        if response.status_code != 202:
+            raise RuntimeError(f"提交任务失败: {response.status_code} - {response.text}")
+        return response.json()["id"]
+
+    def status(self, job_id):
+        response = self.session.get(f"{self.base_url}/jobs/{job_id}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def cancel(self, job_id):
+        response = self.session.delete(f"{self.base_url}/jobs/{job_id}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def events(self, job_id):
+        """逐个产出任务的 (事件名, 数据)，直到 done 事件"""
+        with self.session.get(f"{self.base_url}/jobs/{job_id}/events", stream=True,
+                              timeout=(self.timeout, None)) as response:
+            response.raise_for_status()
+            # SSE规定使用UTF-8
+            response.encoding = "utf-8"
+            name, data = None, []
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    name = line[6:].strip()
+                elif line.startswith("data:"):
+                    data.append(line[5:].strip())
+                elif not line and name is not None:
+                    yield name, json.loads("\n".join(data))
+                    if name == "done":
+                        return
+                    name, data = None, []
+
+    def trans(self, original_text, loops=10, progress_callback=None, source_lang='auto', target_lang='zh-Hans',
+              priority=0, seed=None, cancel_token=None, **options):
+        """与 translate_core.trans() 相同的调用方式，在服务端执行
+
+        cancel_token 被取消后立即通知服务端取消任务（排队中的任务直接取消，运行中的任务尽快停止），
+        不必等到下一个进度事件。
+        """
+        job_id = self.submit(original_text, loops, source_lang, target_lang, priority, seed, **options)
+        progress_callback = compatible_progress_callback(progress_callback)
+        finished = threading.Event()
+        if cancel_token is not None:
+            threading.Thread(target=self._watch_cancel, args=(job_id, cancel_token, finished), daemon=True).start()
+        try:
+            for name, data in self.events(job_id):
+                if name == "progress" and progress_callback:
+                    progress_callback(data["round"], data["total"], data["text"], data["path"], data["metrics"])
+                elif name == "done":
+                    return self._result(data, original_text)
+            return self._result(self.status(job_id), original_text)
+        finally:
+            finished.set()
+
+    def _watch_cancel(self, job_id, cancel_token, finished):
+        # 事件流可能长时间没有数据（任务排队或某一轮很慢），单独的线程等待取消
+        while not finished.is_set():
+            if cancel_token.wait(0.1):
+                try:
+                    # 不与读取事件流的线程共用会话
+                    requests.delete(f"{self.base_url}/jobs/{job_id}", timeout=self.timeout).raise_for_status()
+                except requests.RequestException as e:
+                    logging.error(f"取消任务{job_id}失败: {str(e)}")
+                return
+
+    @staticmethod
+    def _result(info, original_text):
+        if info["status"] == "failed":
+            raise RuntimeError(info.get("error") or "任务失败")
+        if "steps" not in info:
+            # 任务被取消，没有完整结果
+            all_steps = TranslationHistory([("原始文本", original_text), ("错误", "任务已取消")])
+            all_steps.stop_reason = "cancelled"
+            return original_text, all_steps
+        all_steps = TranslationHistory(tuple(step) for step in info["steps"])
+        all_steps.route = [tuple(hop) for hop in info["route"]]
+        all_steps.call_counts = info["call_counts"]
+        all_steps.metrics = info["metrics"]
+        all_steps.stop_reason = info.get("stop_reason")
+        return info["result"], all_steps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地翻译任务服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--workers", type=int, default=4, help="同时运行的翻译链数")
+    parser.add_argument("--queue-size", type=int, default=100, help="排队任务数上限")
+    parser.add_argument("--backend", choices=BACKENDS, default="libretranslate", help="默认翻译后端")
+    parser.add_argument("--detect-policy", choices=DETECT_POLICIES, default="heuristic", help="默认语言检测策略")
+    args = parser.parse_args(argv)
+
+    service = JobService(args.workers, args.queue_size, backend=args.backend, detect_policy=args.detect_policy)
+    server = JobServer(service, args.host, args.port)
+    logging.info(f"翻译任务服务运行于 {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+"""模拟服务和任务服务共用的HTTP服务器与JSON响应"""
+import json
+from http.server import ThreadingHTTPServer
+
+
+class JSONServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 默认的listen队列只有5，并发连接多时会因SYN重传多出约1秒延迟
+    request_queue_size = 128
+
+
+def send_json(handler, status, body, headers=None):
+    """以JSON写出响应，headers 为附加的响应头"""
+    data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    handler.send_response(status)
+    handler.send_header("Content-Type", "application/json")
+    handler.send_header("Content-Length", str(len(data)))
+    for name, value in (headers or {}).items():
+        handler.send_header(name, value)
+    handler.end_headers()
+    handler.wfile.write(data)
@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+import time
+
+# 每轮耗时直方图的分桶上限（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class JSONLogSink:
+    """每轮指标写成一行JSON，追加到文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record(self, metrics):
+        line = json.dumps(dict(metrics, time=time.time()), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class PrometheusTextfileSink:
+    """累计各轮指标，定期以Prometheus文本格式整体重写文件（供node_exporter的textfile收集器读取）"""
+
+    def __init__(self, path, write_interval=5.0, buckets=DEFAULT_BUCKETS):
+        self.path = path
+        self.write_interval = write_interval
+        self.buckets = tuple(buckets)
+        self._counters = {
+            "rounds": 0,
+            "failed_rounds": 0,
+            "detect_calls": 0,
+            "retries": 0,
+            "translate_calls": 0,
+            "cache_hits": 0,
+            "coalesced": 0,
+            "request_bytes": 0,
+            "response_bytes": 0,
+        }
+        self._seconds = {"detect": 0.0, "translate": 0.0, "round": 0.0}
+        self._bucket_counts = [0] * len(self.buckets)
+        self._statuses = {}
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, metrics):
+        with self._lock:
+            self._counters["rounds"] += 1
+            self._counters["failed_rounds"] += bool(metrics.get("failed"))
+            for name in ("detect_calls", "translate_calls", "retries", "cache_hits", "coalesced", "request_bytes",
+                         "response_bytes"):
+                self._counters[name] += metrics.get(name, 0)
+            self._seconds["detect"] += metrics.get("detect_ms", 0.0) / 1000
+            self._seconds["translate"] += metrics.get("translate_ms", 0.0) / 1000
+            round_seconds = metrics.get("round_ms", 0.0) / 1000
+            self._seconds["round"] += round_seconds
+            for i, bound in enumerate(self.buckets):
+                if round_seconds <= bound:
+                    self._bucket_counts[i] += 1
+            for status in metrics.get("status_codes", ()):
+                self._statuses[str(status)] = self._statuses.get(str(status), 0) + 1
+
+            if time.monotonic() - self._last_write >= self.write_interval:
+                self._write()
+
+    def _render(self):
+        lines = []
+        for name, value in self._counters.items():
+            lines.append(f"# TYPE translator_{name}_total counter")
+            lines.append(f"translator_{name}_total {value}")
+        for name in ("detect", "translate"):
+            lines.append(f"# TYPE translator_{name}_seconds_total counter")
+            lines.append(f"translator_{name}_seconds_total {self._seconds[name]:.6f}")
+
+        lines.append("# TYPE translator_round_seconds histogram")
+        for bound, count in zip(self.buckets, self._bucket_counts):
+            lines.append(f'translator_round_seconds_bucket{{le="{bound}"}} {count}')
+        lines.append(f'translator_round_seconds_bucket{{le="+Inf"}} {self._counters["rounds"]}')
+        lines.append(f"translator_round_seconds_sum {self._seconds['round']:.6f}")
+        lines.append(f"translator_round_seconds_count {self._counters['rounds']}")
+
+        lines.append("# TYPE translator_http_responses_total counter")
+        for status, count in sorted(self._statuses.items()):
+            lines.append(f'translator_http_responses_total{{status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def _write(self):
+        # 先写临时文件再替换，读取方不会看到写了一半的文件
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self._render())
+        os.replace(tmp_path, self.path)
+        self._last_write = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._write()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def create_metrics_sink(path):
+    """按文件扩展名创建指标输出：.prom 为Prometheus文本格式，其他为JSON行"""
+    if path.endswith(".prom"):
+        return PrometheusTextfileSink(path)
+    return JSONLogSink(path)
@@ -0,0 +1,222 @@
+"""本地模拟LibreTranslate服务，用于离线测试和性能基准
+
+实现 /languages、/detect、/translate 三个接口，支持配置延迟、抖动、错误率，
+翻译结果是确定性的伪译文（相同输入总是得到相同输出，且使用目标语言的文字系统）。
+
+    python mock_server.py --port 5000 --latency 0.05 --jitter 0.02 --error-rate 0.01
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from json_http import JSONServer, send_json
+from translate_core import guess_script
+
+DEFAULT_LANGUAGES = [
+    ("en", "English"), ("zh-Hans", "Chinese"), ("zh-Hant", "Chinese (traditional)"),
+    ("ja", "Japanese"), ("ko", "Korean"), ("fr", "French"), ("de", "German"),
+    ("es", "Spanish"), ("it", "Italian"), ("pt", "Portuguese"), ("ru", "Russian"),
+    ("uk", "Ukrainian"), ("ar", "Arabic"), ("el", "Greek"), ("he", "Hebrew"),
+    ("hi", "Hindi"), ("th", "Thai"), ("tr", "Turkish"), ("nl", "Dutch"), ("pl", "Polish"),
+]
+
+# 伪译文使用的字符区段，保证模拟的 /detect 能按文字系统识别语言
+_SCRIPT_ALPHABETS = {
+    "zh-Hans": (0x4E00, 0x4FFF), "zh-Hant": (0x5000, 0x51FF), "ja": (0x3041, 0x3093),
+    "ko": (0xAC00, 0xAD00), "ru": (0x0430, 0x044F), "uk": (0x0430, 0x044F),
+    "ar": (0x0627, 0x064A), "el": (0x03B1, 0x03C9), "he": (0x05D0, 0x05EA),
+    "hi": (0x0905, 0x0939), "th": (0x0E01, 0x0E2E),
+}
+
+_SCRIPT_LANGUAGES = {
+    "han": "zh-Hans", "kana": "ja", "hangul": "ko", "cyrillic": "ru", "arabic": "ar",
+    "greek": "el", "hebrew": "he", "devanagari": "hi", "thai": "th", "latin": "en",
+}
+
+
+def fake_translate(text, target_lang):
+    """确定性的伪翻译：逐词替换为目标语言文字系统中的伪词，保留空白和标点"""
+    start, end = _SCRIPT_ALPHABETS.get(target_lang, (ord("a"), ord("z")))
+    span = end - start + 1
+    out = []
+    word = []
+
+    def flush():
+        if word:
+            digest = hashlib.md5(f"{target_lang}:{''.join(word)}".encode("utf-8")).digest()
+            length = max(1, min(len(word), 12))
+            out.append("".join(chr(start + digest[i % len(digest)] % span) for i in range(length)))
+            word.clear()
+
+    for ch in text:
+        if ch.isalnum():
+            word.append(ch)
+        else:
+            flush()
+            out.append(ch)
+    flush()
+    return "".join(out)
+
+
+class MockLibreTranslateServer:
+    """在后台线程中运行的模拟服务"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, char_latency=0.0,
+                 error_rate=0.0, error_status=500, batch_limit=None, languages=DEFAULT_LANGUAGES, seed=None,
+                 retry_after=None, max_concurrency=None):
+        self.latency = latency
+        self.jitter = jitter
+        # 按字符数增加的处理时间，用于模拟长文本
+        self.char_latency = char_latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        # 模拟错误响应携带的 Retry-After 秒数
+        self.retry_after = retry_after
+        self.batch_limit = batch_limit
+        # 同时处理的请求数上限，模拟单个服务实例有限的工作线程
+        self._slots = threading.Semaphore(max_concurrency) if max_concurrency else None
+        self.languages = [
+            {"code": code, "name": name, "targets": [other for other, _ in languages if other != code]}
+            for code, name in languages
+        ]
+        self.counts = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 响应头和响应体分两次写出，关闭Nagle算法避免与延迟确认叠加出约40ms的等待
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self, "GET")
+
+            def do_POST(self):
+                server._handle(self, "POST")
+
+        self.httpd = JSONServer((host, port), Handler)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def reset_counts(self):
+        with self._lock:
+            self.counts = {}
+
+    def total_requests(self, paths=("/detect", "/translate", "/languages")):
+        with self._lock:
+            return sum(self.counts.get(path, 0) for path in paths)
+
+    def _delay(self, chars):
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+            failed = self.error_rate > 0 and self._rng.random() < self.error_rate
+        delay = max(self.latency + jitter, 0.0) + self.char_latency * chars
+        if delay:
+            time.sleep(delay)
+        return failed
+
+    def _handle(self, handler, method):
+        path = handler.path.split("?")[0]
+        with self._lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+
+        payload = {}
+        if method == "POST":
+            length = int(handler.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(handler.rfile.read(length) or b"{}")
+            except ValueError:
+                return send_json(handler, 400, {"error": "Invalid JSON"})
+
+        if method == "GET" and path == "/languages":
+            return send_json(handler, 200, self.languages)
+        if method == "GET" and path in ("", "/"):
+            return send_json(handler, 200, {"status": "ok"})
+        if method != "POST" or path not in ("/detect", "/translate"):
+            return send_json(handler, 404, {"error": "Not Found"})
+
+        q = payload.get("q")
+        texts = q if isinstance(q, list) else [q]
+        if any(not isinstance(text, str) for text in texts):
+            return send_json(handler, 400, {"error": "Invalid request: missing q parameter"})
+        if isinstance(q, list) and self.batch_limit is not None and len(q) > self.batch_limit:
+            return send_json(handler, 400, {
+                "error": f"Invalid request: request ({len(q)}) exceeds batch limit ({self.batch_limit})"})
+
+        if self._slots is not None:
+            with self._slots:
+                failed = self._delay(sum(len(text) for text in texts))
+        else:
+            failed = self._delay(sum(len(text) for text in texts))
+        if failed:
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+            return send_json(handler, self.error_status, {"error": "Simulated server error"}, headers)
+
+        if path == "/detect":
+            language = _SCRIPT_LANGUAGES.get(guess_script(texts[0][:2000]), "en")
+            return send_json(handler, 200, [{"language": language, "confidence": 90.0}])
+
+        target = payload.get("target")
+        if target not in {lang["code"] for lang in self.languages}:
+            return send_json(handler, 400, {"error": f"{target} is not supported"})
+        translated = [fake_translate(text, target) for text in texts]
+        return send_json(handler, 200, {"translatedText": translated if isinstance(q, list) else translated[0]})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模拟LibreTranslate服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟的随机抖动幅度（秒）")
+    parser.add_argument("--char-latency", type=float, default=0.0, help="每个字符增加的延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回错误的概率")
+    parser.add_argument("--error-status", type=int, default=500, help="模拟错误的状态码")
+    parser.add_argument("--retry-after", type=float, default=None, help="模拟错误响应的Retry-After秒数")
+    parser.add_argument("--batch-limit", type=int, default=None, help="q数组的最大长度")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="同时处理的请求数上限")
+    parser.add_argument("--seed", type=int, default=None, help="延迟和错误的随机种子")
+    args = parser.parse_args(argv)
+
+    server = MockLibreTranslateServer(args.host, args.port, args.latency, args.jitter, args.char_latency,
+                                      args.error_rate, args.error_status, args.batch_limit, seed=args.seed,
+                                      retry_after=args.retry_after, max_concurrency=args.max_concurrency)
+    print(f"模拟LibreTranslate服务运行于 {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import logging
+import os
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from translate_core import LibreTranslator, TranslationHistory, create_backend, create_session, plan_route, trans
+
+# 工作进程内常驻的翻译后端（模型加载一次后一直保留）
+_worker_backend = None
+
+
+def _init_worker(backend, preload):
+    global _worker_backend
+    _worker_backend = create_backend(backend)
+    if preload and hasattr(_worker_backend, "preload"):
+        _worker_backend.preload(preload)
+
+
+def _run_chain(text, loops, source_lang, target_lang, route, rng, options):
+    # 先加载整条路线用到的模型，翻译过程中不再中途加载
+    if hasattr(_worker_backend, "preload"):
+        _worker_backend.preload(sorted(set(route)))
+    final_text, all_steps = trans(text, loops, None, source_lang, target_lang,
+                                  backend=_worker_backend, rng=rng, route=route, **options)
+    return final_text, all_steps
+
+
+class ChainProcessPool:
+    """在多个常驻工作进程中执行翻译链，按链需要的语言对分派任务
+
+    提交时在主进程中检测源语言并规划整条路线，路线经过的每一跳就是该链需要加载的模型。
+    每个工作进程只有一个执行槽：已加载了该链最多语言对的进程在不太忙时优先接收它，
+    只有它明显比最空闲的进程忙时，才把任务交给其他进程。工作进程在执行前预加载路线上的全部语言对。
+    """
+
+    def __init__(self, workers=None, backend="argos", preload=(), affinity_slack=2, **trans_options):
+        self.workers = workers or os.cpu_count() or 1
+        self.affinity_slack = affinity_slack
+        self.trans_options = trans_options
+        self._executors = [
+            ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(backend, list(preload)))
+            for _ in range(self.workers)
+        ]
+        self._outstanding = [0] * self.workers
+        # 各工作进程已加载（或已分派过会加载）的语言对
+        self._loaded = [set(preload) for _ in range(self.workers)]
+        self._lock = threading.Lock()
+        # 主进程中的后端只用于获取语言对图和检测源语言；使用单独的会话，
+        # 以免fork出的工作进程继承默认会话中已打开的连接，与主进程共用同一个socket
+        self._session = create_session(1)
+        self._planner = LibreTranslator(backend=backend, session=self._session)
+        self._graph = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        for executor in self._executors:
+            executor.shutdown(wait=True)
+        self._session.close()
+
+    def plan(self, text, loops=40, source_lang='auto', target_lang='zh-Hans', seed=None):
+        """检测源语言并规划路线，返回 (路线, 规划后的rng)；rng 交给工作进程用于中途重新规划"""
+        if self._graph is None:
+            self._graph = self._planner.language_graph()
+        if not self._graph.codes:
+            raise RuntimeError("无法获取支持的语言列表")
+        if source_lang == 'auto':
+            source_lang = self._planner.detect_language(text)
+            if source_lang is None:
+                source_lang = 'en'
+                logging.warning(f"语言检测失败，使用默认语言: {source_lang}")
+        rng = random.Random(seed)
+        return plan_route(source_lang, loops, target_lang, self._graph, rng), rng
+
+    def _pick_worker(self, pairs):
+        with self._lock:
+            least = min(range(self.workers), key=lambda i: self._outstanding[i])
+            # 在不比最空闲进程忙太多的进程中，选已加载语言对最多的；
+            # 每个排队的任务抵消一个已加载的语言对，避免仅因共同的最后一跳就都排到同一个进程
+            candidates = [i for i in range(self.workers)
+                          if self._outstanding[i] <= self._outstanding[least] + self.affinity_slack]
+            worker = max(candidates, key=lambda i: (len(self._loaded[i] & pairs) - self._outstanding[i],
+                                                    -self._outstanding[i]))
+            self._loaded[worker] |= pairs
+            self._outstanding[worker] += 1
+            return worker
+
+    def _release(self, worker):
+        with self._lock:
+            self._outstanding[worker] -= 1
+
+    def submit(self, text, loops=40, source_lang='auto', target_lang='zh-Hans', seed=None):
+        """提交一条翻译链，返回结果为 (最终文本, all_steps) 的 Future"""
+        route, rng = self.plan(text, loops, source_lang, target_lang, seed)
+        worker = self._pick_worker(set(route))
+        future = self._executors[worker].submit(
+            _run_chain, text, loops, source_lang, target_lang, route, rng, self.trans_options
+        )
+        future.add_done_callback(lambda _: self._release(worker))
+        return future
+
+    def trans_many(self, texts, loops=40, source_lang='auto', target_lang='zh-Hans', item_callback=None,
+                   seed=None):
+        """执行一批翻译链，结果按输入顺序返回；单条失败不影响其他条目"""
+        texts = list(texts)
+        results = [None] * len(texts)
+        futures = {}
+        for index, text in enumerate(texts):
+            try:
+                future = self.submit(text, loops, source_lang, target_lang, None if seed is None else seed + index)
+            except Exception as e:
+                # 规划路线失败（例如无法获取语言列表）
+                self._fail(results, texts, index, e, item_callback)
+                continue
+            futures[future] = index
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                self._fail(results, texts, index, e, item_callback)
+                continue
+            if item_callback:
+                item_callback(index, *results[index])
+        return results
+
+    @staticmethod
+    def _fail(results, texts, index, error, item_callback):
+        logging.error(f"第{index}条文本翻译失败: {str(error)}")
+        results[index] = (texts[index], TranslationHistory([("错误", str(error))]))
+        if item_callback:
+            item_callback(index, *results[index])
@@ -0,0 +1,166 @@
+import csv
+import json
+import os
+
+REPORT_FORMATS = ("markdown", "jsonl", "csv")
+
+
+class ReportWriter:
+    """逐轮写出翻译报告：start() 写入原文，每完成一轮调用 write_step()，最后 finish()
+
+    每次写入后立即flush，报告只占用常量内存，进程中途崩溃时已完成的轮次仍保留在文件中。
+    """
+
+    extension = ".txt"
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8", newline="")
+
+    def start(self, original_text):
+        raise NotImplementedError
+
+    def write_step(self, step, action, text, metrics=None):
+        raise NotImplementedError
+
+    def finish(self, final_result, candidates=None, stop_reason=None):
+        """写入结尾部分；candidates 为 trans_fanout() 返回的 [(差异度, 文本, 历史), ...]"""
+        raise NotImplementedError
+
+    def _flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class MarkdownReportWriter(ReportWriter):
+    """Markdown报告，翻译过程为一张逐行追加的表格"""
+
+    extension = ".md"
+
+    @staticmethod
+    def _cell(text):
+        # 处理换行符和表格分隔符
+        return text.replace("\n", "\\n").replace("|", "\\|")
+
+    def start(self, original_text):
+        self._file.write("# 多轮翻译报告\n\n")
+        self._file.write(f"**原始文本**:\n```\n{original_text}\n```\n\n")
+        self._file.write("## 翻译过程\n| 步骤 | 操作 | 耗时 | 结果 |\n|------|------|------|------|\n")
+        self._file.write(f"| 0 | 原始文本 | - | {self._cell(original_text)} |\n")
+        self._flush()
+
+    def write_step(self, step, action, text, metrics=None):
+        timing = "-"
+        if metrics:
+            timing = f"{metrics['round_ms']:.0f}ms"
+            if metrics.get("cache_hit"):
+                timing += " (缓存)"
+        self._file.write(f"| {step} | {action} | {timing} | {self._cell(text)} |\n")
+        self._flush()
+
+    def finish(self, final_result, candidates=None, stop_reason=None):
+        if candidates:
+            self._file.write("\n## 候选结果\n| 排名 | 差异度 | 最终文本 |\n|------|------|------|\n")
+            for rank, (score, candidate, _) in enumerate(candidates, 1):
+                self._file.write(f"| {rank} | {score:.3f} | {self._cell(candidate)} |\n")
+        if stop_reason == "cancelled":
+            self._file.write("\n*翻译被停止，以上为已完成的轮次*\n")
+        elif stop_reason == "converged":
+            self._file.write("\n*结果已收敛，提前结束*\n")
+        self._file.write(f"\n**最终文本**:\n```\n{final_result}\n```")
+        self._flush()
+
+
+class JSONLinesReportWriter(ReportWriter):
+    """每个步骤一行JSON：header、step、candidate、final"""
+
+    extension = ".jsonl"
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._flush()
+
+    def start(self, original_text):
+        self._write({"type": "header", "text": original_text})
+
+    def write_step(self, step, action, text, metrics=None):
+        record = {"type": "step", "step": step, "action": action, "text": text}
+        if metrics is not None:
+            record["metrics"] = metrics
+        self._write(record)
+
+    def finish(self, final_result, candidates=None, stop_reason=None):
+        for rank, (score, candidate, _) in enumerate(candidates or (), 1):
+            self._write({"type": "candidate", "rank": rank, "score": score, "text": candidate})
+        self._write({"type": "final", "text": final_result, "stop_reason": stop_reason})
+
+
+class CSVReportWriter(ReportWriter):
+    """每轮一行的CSV，便于在表格软件中按耗时等列排序；候选结果不写入"""
+
+    extension = ".csv"
+    columns = ("step", "action", "round_ms", "cache_hit", "failed", "text")
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._writer = csv.writer(self._file)
+
+    def start(self, original_text):
+        self._writer.writerow(self.columns)
+        self._writer.writerow((0, "原始文本", "", "", "", original_text))
+        self._flush()
+
+    def write_step(self, step, action, text, metrics=None):
+        metrics = metrics or {}
+        round_ms = metrics.get("round_ms")
+        self._writer.writerow((step, action, "" if round_ms is None else f"{round_ms:.1f}",
+                               int(bool(metrics.get("cache_hit"))), int(bool(metrics.get("failed"))), text))
+        self._flush()
+
+    def finish(self, final_result, candidates=None, stop_reason=None):
+        self._flush()
+
+
+_WRITERS = {"markdown": MarkdownReportWriter, "jsonl": JSONLinesReportWriter, "csv": CSVReportWriter}
+
+
+def report_format_for(path):
+    """按文件扩展名推断报告格式：.jsonl 为JSON行，.csv 为CSV，其他为Markdown"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".json"):
+        return "jsonl"
+    if extension == ".csv":
+        return "csv"
+    return "markdown"
+
+
+def create_report_writer(path, report_format=None):
+    """创建报告输出，未指定格式时按扩展名选择"""
+    return _WRITERS[report_format or report_format_for(path)](path)
+
+
+def report_extension(report_format):
+    return _WRITERS[report_format].extension
+
+
+def write_report(path, all_steps, final_result, candidates=None, report_format=None):
+    """把已完成的翻译历史写成报告（流式写入，不在内存中拼接）"""
+    metrics = getattr(all_steps, "metrics", [])
+    with create_report_writer(path, report_format) as writer:
+        writer.start(all_steps[0][1])
+        # 第0步是原始文本，之后每一步对应一轮的指标
+        for step, (action, text) in enumerate(all_steps[1:], 1):
+            writer.write_step(step, action, text, metrics[step - 1] if step <= len(metrics) else None)
+        writer.finish(final_result, candidates, getattr(all_steps, "stop_reason", None))
@@ -0,0 +1,609 @@
+import asyncio
+import collections
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+DEFAULT_BASE_URL = "http://127.0.0.1:5000"
+
+
+class TranslationError(Exception):
+    """翻译请求最终失败（重试用尽、服务返回错误或断路器打开）"""
+
+
+class CircuitOpenError(TranslationError):
+    """断路器处于打开状态，请求未发送"""
+
+
+class TranslationCancelled(TranslationError):
+    """翻译已被取消"""
+
+
+class CancellationToken:
+    """从其他线程取消翻译：trans() 在每轮之间检查，HTTP请求在每次尝试前和重试等待期间检查
+
+    已经发出的单个请求无法中断，会等它返回或超时。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback):
+        """取消时在调用 cancel() 的线程中执行 callback()（已取消时立即执行），返回移除该回调的函数"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def wait(self, timeout):
+        """等待至多 timeout 秒，期间被取消时立即返回True"""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TranslationCancelled("翻译已取消")
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """合并相同键的并发调用：同一时刻只有第一个调用者真正执行，其余调用者等待并共用它的结果或异常"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        # 实际执行的调用数和被合并（省下）的调用数
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, func, *args, cancel_token=None):
+        """返回 (结果, 是否共用了其他调用者的结果)
+
+        等待期间 cancel_token 被取消时抛出 TranslationCancelled，正在执行的调用不受影响。
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            if cancel_token is None:
+                flight.done.wait()
+            else:
+                while not flight.done.wait(0.05):
+                    cancel_token.raise_if_cancelled()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = func(*args)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def stats(self):
+        with self._lock:
+            return {"executed": self.executed, "shared": self.shared}
+
+class RetryPolicy:
+    """对429/5xx响应和超时、连接错误按带抖动的指数退避重试"""
+
+    def __init__(self, retries=3, backoff=0.5, max_backoff=10.0, max_retry_after=60.0,
+                 retry_statuses=(429, 500, 502, 503, 504)):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # 服务端 Retry-After 的上限，避免一个异常响应让翻译挂起太久
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = frozenset(retry_statuses)
+
+    def delay(self, attempt, retry_after=None):
+        """第 attempt 次重试（从0开始）前的等待秒数，优先使用服务端给出的 Retry-After"""
+        if retry_after:
+            try:
+                seconds = float(retry_after)
+            except ValueError:
+                try:
+                    seconds = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    seconds = None
+            if seconds is not None:
+                return min(max(seconds, 0.0), self.max_retry_after)
+        # full jitter：在 [0, backoff * 2^attempt] 内均匀取值，避免多条链同时重试
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后断开，冷却期内请求直接失败；冷却结束后只放行一个试探请求"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                # 放行一个试探请求；试探请求迟迟没有结果时，下一个冷却期后再放行一个
+                self.state = "half-open"
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logging.error(f"连续失败{self._failures}次，断路器打开，{self.reset_timeout:.0f}秒内不再发送请求")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(base_url=DEFAULT_BASE_URL):
+    """获取指定服务地址共享的断路器"""
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(base_url)
+        if breaker is None:
+            breaker = _circuit_breakers[base_url] = CircuitBreaker()
+        return breaker
+
+
+class AdaptiveLimiter:
+    """按实测延迟调整同时发往一个服务的请求数（AIMD）
+
+    延迟保持在无负载基线的 tolerance 倍（再加 headroom 秒）以内时，每个请求把上限增加 1/上限（约每轮往返加1）；
+    延迟超过该范围、出现429/5xx或超时时，上限乘以 backoff，每个往返时间内最多下调一次。
+    基线按请求类别分别记录（见 latency_class()），很快的 /detect 不会让正常的长文本翻译被当成过载。
+    超出上限的请求在本地排队，而不是在服务端排队直到超时。
+    """
+
+    def __init__(self, initial_limit=8, min_limit=1, max_limit=64, tolerance=2.0, headroom=0.02, backoff=0.75):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        # 本地服务的延迟只有几毫秒，抖动很容易超过基线的倍数，留出固定余量
+        self.headroom = headroom
+        self.backoff = backoff
+        self.limit = float(initial_limit)
+        self.inflight = 0
+        # 每类请求无负载时的延迟（秒）：取观测到的最小值，并缓慢上浮以适应服务本身变慢
+        self.baselines = {}
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        # 等待名额的异步调用方 (事件循环, future)，按先来先得的顺序分配
+        self._async_waiters = collections.deque()
+
+    def acquire(self, cancel_token=None):
+        """等待空闲名额；cancel_token 被取消时抛出 TranslationCancelled"""
+        with self._cond:
+            # 有异步调用方在排队时让它们先取得名额
+            while self.inflight >= int(self.limit) or self._async_waiters:
+                if cancel_token is None:
+                    self._cond.wait()
+                else:
+                    cancel_token.raise_if_cancelled()
+                    self._cond.wait(0.05)
+            self.inflight += 1
+
+    async def acquire_async(self, cancel_token=None):
+        """acquire() 的异步版本：在事件循环中等待名额，不阻塞线程也不轮询
+
+        名额由 release() 按排队顺序直接交给等待方；cancel_token 被取消时抛出 TranslationCancelled。
+        """
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self.inflight < int(self.limit) and not self._async_waiters:
+                self.inflight += 1
+                return
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._async_waiters.append(waiter)
+        remove_callback = None
+        if cancel_token is not None:
+            remove_callback = cancel_token.add_callback(
+                lambda: loop.call_soon_threadsafe(self._cancel_waiter, future))
+        try:
+            await future
+        except BaseException:
+            # 名额已经交给本调用方、随后才被取消时归还名额
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release()
+            raise
+        finally:
+            if remove_callback is not None:
+                remove_callback()
+            with self._cond:
+                if waiter in self._async_waiters:
+                    self._async_waiters.remove(waiter)
+                    self._cond.notify_all()
+
+    @staticmethod
+    def _cancel_waiter(future):
+        if not future.done():
+            future.set_exception(TranslationCancelled("翻译已取消"))
+
+    def _grant(self, future):
+        # 在等待方的事件循环中执行；等待方已被取消时把名额还回去
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def _wake_async_waiters(self):
+        # 调用方持有 self._cond；把空出的名额依次交给排队的异步调用方
+        while self._async_waiters and self.inflight < int(self.limit):
+            loop, future = self._async_waiters.popleft()
+            if future.done():
+                continue
+            self.inflight += 1
+            try:
+                loop.call_soon_threadsafe(self._grant, future)
+            except RuntimeError:
+                # 事件循环已关闭
+                self.inflight -= 1
+
+    def release(self, latency=None, overloaded=False, key=None):
+        """请求结束；latency 为请求耗时（秒），overloaded 表示服务繁忙（429/5xx、超时），
+        key 为请求类别（latency_class() 的返回值），同类请求的延迟才互相比较
+        """
+        with self._cond:
+            self.inflight -= 1
+            # 很快返回的错误响应不代表服务的正常延迟，不参与基线
+            if latency is not None and not overloaded:
+                baseline = self.baselines.get(key)
+                if baseline is None or latency < baseline:
+                    baseline = latency
+                overloaded = latency > baseline * self.tolerance + self.headroom
+                # 基线只随未排队的请求（或上限已降到最低时）缓慢上浮，排队造成的延迟不会被当成常态
+                if not overloaded or int(self.limit) <= self.min_limit:
+                    baseline += (latency - baseline) * 0.005
+                self.baselines[key] = baseline
+            if overloaded:
+                now = time.monotonic()
+                # 同一批排队请求的延迟都会偏高，每个往返时间只下调一次
+                if now - self._last_decrease >= (latency or 0.0):
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif latency is not None and self.inflight + 1 >= int(self.limit):
+                # 只有名额基本用满时才继续加，空闲时上限不会无限增长
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._wake_async_waiters()
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"limit": int(self.limit), "inflight": self.inflight, "waiting": len(self._async_waiters),
+                    "baselines_ms": {f"{path}:{size}": baseline * 1000
+                                     for (path, size), baseline in self.baselines.items()}}
+
+
+def latency_class(path, request_bytes):
+    """AdaptiveLimiter 比较延迟时使用的请求类别：请求路径加请求体大小的数量级（按2的幂分档）
+
+    翻译耗时随文本长度增长，同一档内的请求体大小相差不到一倍，延迟可以直接比较。
+    """
+    return path, max(int(request_bytes), 1).bit_length()
+
+
+_adaptive_limiters = {}
+_adaptive_limiters_lock = threading.Lock()
+
+
+def get_adaptive_limiter(base_url=DEFAULT_BASE_URL):
+    """获取指定服务地址共享的并发限制器，同一进程内所有翻译器共用"""
+    with _adaptive_limiters_lock:
+        limiter = _adaptive_limiters.get(base_url)
+        if limiter is None:
+            limiter = _adaptive_limiters[base_url] = AdaptiveLimiter()
+        return limiter
+
+
+class Endpoint:
+    """一个LibreTranslate服务实例及其负载状态"""
+
+    def __init__(self, url, breaker=None, limiter=None):
+        self.url = url
+        self.breaker = breaker if breaker is not None else get_circuit_breaker(url)
+        self.limiter = limiter if limiter is not None else get_adaptive_limiter(url)
+        # 正在进行的请求数
+        self.outstanding = 0
+        # 请求耗时的指数移动平均（秒），尚未测量时为None
+        self.latency = None
+        self.healthy = True
+
+
+ENDPOINT_STRATEGIES = ("least-outstanding", "latency")
+
+
+class EndpointPool:
+    """在多个LibreTranslate服务实例之间分派请求
+
+    least-outstanding 选择在途请求最少的实例，latency 按平均耗时乘以（在途请求数+1）选择。
+    后台线程定期请求各实例的 /languages 做健康检查，连接失败的实例也会立即移出轮换，
+    直到下一次健康检查通过。
+    """
+
+    def __init__(self, urls, strategy="least-outstanding", health_interval=10.0, health_timeout=3.0):
+        if not urls:
+            raise ValueError("至少需要一个服务地址")
+        if strategy not in ENDPOINT_STRATEGIES:
+            raise ValueError(f"未知的分派策略: {strategy}")
+        self.endpoints = [Endpoint(url.rstrip("/")) for url in urls]
+        self.strategy = strategy
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self._next = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if health_interval:
+            self._thread = threading.Thread(target=self._health_loop, daemon=True)
+            self._thread.start()
+
+    @property
+    def urls(self):
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def _load(self, endpoint):
+        if self.strategy == "latency":
+            return (endpoint.latency or 0.0) * (endpoint.outstanding + 1)
+        return endpoint.outstanding
+
+    def acquire(self):
+        """选择一个实例并计入在途请求；所有实例的断路器都打开时抛出 CircuitOpenError"""
+        with self._lock:
+            # 全部不健康时仍在所有实例中选择，健康检查可能只是暂时失败
+            candidates = [endpoint for endpoint in self.endpoints if endpoint.healthy] or list(self.endpoints)
+            # 轮换起点，负载相同的实例依次分到请求
+            self._next = (self._next + 1) % len(candidates)
+            candidates = candidates[self._next:] + candidates[:self._next]
+            for endpoint in sorted(candidates, key=self._load):
+                if endpoint.breaker.allow():
+                    endpoint.outstanding += 1
+                    return endpoint
+        raise CircuitOpenError("所有翻译服务暂时不可用（断路器已打开）")
+
+    def release(self, endpoint, elapsed=None, failed=False):
+        """请求结束；failed 表示连接失败，该实例移出轮换直到健康检查通过"""
+        with self._lock:
+            endpoint.outstanding -= 1
+            if elapsed is not None:
+                endpoint.latency = elapsed if endpoint.latency is None else 0.8 * endpoint.latency + 0.2 * elapsed
+            if failed and endpoint.healthy:
+                endpoint.healthy = False
+                logging.warning(f"翻译服务 {endpoint.url} 连接失败，暂时移出轮换")
+
+    def check_health(self):
+        """请求每个实例的 /languages，更新健康状态"""
+        for endpoint in self.endpoints:
+            try:
+                healthy = requests.get(f"{endpoint.url}/languages", timeout=self.health_timeout).status_code == 200
+            except requests.RequestException:
+                healthy = False
+            with self._lock:
+                if healthy != endpoint.healthy:
+                    logging.info(f"翻译服务 {endpoint.url} {'恢复' if healthy else '不可用'}")
+                endpoint.healthy = healthy
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    def catalog_url(self):
+        """用于获取语言目录的实例地址（各实例的语言应当一致）"""
+        for endpoint in self.endpoints:
+            if endpoint.healthy:
+                return endpoint.url
+        return self.endpoints[0].url
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+_default_endpoint_pool = None
+_endpoints_configured = False
+_endpoints_lock = threading.Lock()
+
+
+def configure_endpoints(urls, strategy="least-outstanding", health_interval=10.0):
+    """配置默认服务地址对应的一组LibreTranslate实例，之后不指定服务地址的翻译都在它们之间分派
+
+    传入空列表恢复为只使用 DEFAULT_BASE_URL。也可以通过环境变量
+    LIBRETRANSLATE_URLS（逗号分隔）和 LIBRETRANSLATE_STRATEGY 配置。
+    """
+    global _default_endpoint_pool, _endpoints_configured
+    with _endpoints_lock:
+        if _default_endpoint_pool is not None:
+            _default_endpoint_pool.close()
+        _default_endpoint_pool = EndpointPool(urls, strategy, health_interval) if urls else None
+        _endpoints_configured = True
+        return _default_endpoint_pool
+
+
+def get_default_endpoint_pool():
+    """获取默认的服务实例池，未配置多个实例时返回None"""
+    global _default_endpoint_pool, _endpoints_configured
+    with _endpoints_lock:
+        if not _endpoints_configured:
+            urls = [url.strip() for url in os.environ.get("LIBRETRANSLATE_URLS", "").split(",") if url.strip()]
+            if urls:
+                strategy = os.environ.get("LIBRETRANSLATE_STRATEGY", "least-outstanding")
+                _default_endpoint_pool = EndpointPool(urls, strategy)
+            _endpoints_configured = True
+        return _default_endpoint_pool
+
+
+def resolve_catalog_url(base_url=DEFAULT_BASE_URL):
+    """默认服务地址配置了实例池时，返回池中一个健康实例的地址"""
+    if base_url == DEFAULT_BASE_URL:
+        pool = get_default_endpoint_pool()
+        if pool is not None:
+            return pool.catalog_url()
+    return base_url
+
+
+class RequestAttempts:
+    """一个HTTP请求的各次尝试：选择实例、断路器、并发限制器、重试间隔和HTTP记录
+
+    同步的 HTTPBackend 和异步的 AsyncLibreTranslator 共用，调用方只负责发送请求和等待：
+
+        attempts = RequestAttempts(path, retry, endpoint, endpoints, record)
+        while True:
+            endpoint = attempts.start(cancel_token)   # 异步调用方用 await attempts.start_async(cancel_token)
+            发送到 endpoint.url：网络异常时调用 attempts.network_error(...)，其他异常时调用 attempts.abandon()；
+            收到响应时调用 attempts.response(...)，返回True表示不需要重试
+            delay = attempts.next_delay()             # 重试用尽时抛出 TranslationError
+            等待 delay 秒
+
+    endpoint 为单个服务地址的 Endpoint，endpoints 不为None时改为每次尝试在实例池中重新选择，
+    重试可以落到其他实例上。record(状态码, 请求字节数, 响应字节数, 是否重试) 记录每次尝试，
+    网络异常以异常类名作为状态码。
+    """
+
+    def __init__(self, path, retry, endpoint, endpoints=None, record=None):
+        self.path = path
+        self.retry = retry
+        self.endpoints = endpoints
+        self._default = endpoint
+        self._record = record
+        self.attempt = 0
+        self.endpoint = None
+        self.error = None
+        self._retry_after = None
+        self._started = None
+
+    def _choose(self, cancel_token):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        if self.endpoints is not None:
+            self.endpoint = self.endpoints.acquire()
+        elif self._default.breaker.allow():
+            self.endpoint = self._default
+        else:
+            raise CircuitOpenError(f"{self._default.url} 暂时不可用（断路器已打开）")
+        return self.endpoint
+
+    def _release_endpoint(self, elapsed=None, failed=False):
+        if self.endpoints is not None:
+            self.endpoints.release(self.endpoint, elapsed, failed)
+
+    def start(self, cancel_token=None):
+        """选择实例并等待并发限制器的名额，返回本次尝试使用的 Endpoint"""
+        endpoint = self._choose(cancel_token)
+        try:
+            endpoint.limiter.acquire(cancel_token)
+        except BaseException:
+            self._release_endpoint()
+            raise
+        self._started = time.perf_counter()
+        return endpoint
+
+    async def start_async(self, cancel_token=None):
+        """start() 的异步版本，在事件循环中等待限制器的名额"""
+        endpoint = self._choose(cancel_token)
+        try:
+            await endpoint.limiter.acquire_async(cancel_token)
+        except BaseException:
+            self._release_endpoint()
+            raise
+        self._started = time.perf_counter()
+        return endpoint
+
+    def abandon(self):
+        """发送过程中出现不重试的异常（如被取消），归还名额"""
+        self.endpoint.limiter.release()
+        self._release_endpoint()
+
+    def network_error(self, error, timeout=False, connection=False):
+        """超时或连接错误；connection 表示连接失败，该实例移出轮换直到健康检查通过"""
+        self.endpoint.limiter.release(overloaded=timeout)
+        self._release_endpoint(failed=connection)
+        if self._record is not None:
+            self._record(type(error).__name__, 0, 0, self.attempt > 0)
+        self.endpoint.breaker.record_failure()
+        self.error = str(error) or type(error).__name__
+        self._retry_after = None
+
+    def response(self, status, request_bytes, content, retry_after=None):
+        """收到响应；不需要重试（成功或不可重试的错误）时返回True"""
+        elapsed = time.perf_counter() - self._started
+        busy = status in self.retry.retry_statuses
+        self.endpoint.limiter.release(elapsed, overloaded=busy, key=latency_class(self.path, request_bytes))
+        self._release_endpoint(elapsed)
+        if self._record is not None:
+            self._record(status, request_bytes, len(content), self.attempt > 0)
+        if not busy:
+            self.endpoint.breaker.record_success()
+            return True
+        # 429只说明服务繁忙，不计入断路器
+        if status != 429:
+            self.endpoint.breaker.record_failure()
+        self.error = f"{status} - {content[:200].decode('utf-8', errors='replace')}"
+        self._retry_after = retry_after
+        return False
+
+    def next_delay(self):
+        """下一次重试前的等待秒数；重试用尽时抛出 TranslationError"""
+        if self.attempt >= self.retry.retries:
+            raise TranslationError(f"请求{self.path}失败: {self.error}")
+        delay = self.retry.delay(self.attempt, self._retry_after)
+        self.attempt += 1
+        logging.warning(f"请求{self.path}失败 ({self.error})，{delay:.1f}秒后第{self.attempt}次重试")
+        return delay
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_server import MockLibreTranslateServer  # noqa: E402
+from resilience import configure_endpoints  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    """进程内的模拟LibreTranslate服务，测试之间互不共享"""
+    with MockLibreTranslateServer(seed=1) as mock:
+        yield mock
+
+
+@pytest.fixture
+def default_server(server):
+    """让不指定服务地址的调用（trans()、命令行）都发往模拟服务"""
+    configure_endpoints([server.url], health_interval=0)
+    yield server
+    configure_endpoints([])
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from async_translate import AsyncLibreTranslator, trans_async_result
+from mock_server import MockLibreTranslateServer
+from resilience import (CancellationToken, RetryPolicy, TranslationCancelled, TranslationError,
+                        get_circuit_breaker)
+from translate_core import HTTPBackend, create_session, trans
+
+
+def test_async_matches_sync_for_same_seed(server):
+    text = "The quick brown fox jumps over the lazy dog."
+    result, steps = trans(text, 6, use_cache=False, seed=7, backend=HTTPBackend(server.url, create_session(2)))
+    async_result, async_steps = asyncio.run(
+        trans_async_result(text, 6, use_cache=False, seed=7, base_url=server.url))
+    assert async_result == result
+    assert async_steps.route == steps.route
+    assert list(async_steps) == list(steps)
+
+
+def test_coalesced_follower_is_not_cancelled_by_leader_token():
+    token = CancellationToken()
+    retry = RetryPolicy(retries=50, backoff=0.02, max_backoff=0.02)
+
+    async def main(server):
+        leader = AsyncLibreTranslator(server.url, retry=retry, cancel_token=token)
+        follower = AsyncLibreTranslator(server.url, retry=retry)
+        try:
+            leader_task = asyncio.ensure_future(leader.translate("Hello.", "en", "fr"))
+            await asyncio.sleep(0.01)
+            follower_task = asyncio.ensure_future(follower.translate("Hello.", "en", "fr"))
+            await asyncio.sleep(0.05)
+            # 发出请求的一方在重试等待中被取消，等待它结果的另一方应自己重新发送
+            token.cancel()
+            server.error_rate = 0.0
+            with pytest.raises(TranslationCancelled):
+                await leader_task
+            result = await asyncio.wait_for(follower_task, 5)
+        finally:
+            await leader.close()
+            await follower.close()
+        return result, follower.call_counts
+
+    with MockLibreTranslateServer(error_rate=1.0) as server:
+        get_circuit_breaker(server.url).failure_threshold = 1000
+        result, counts = asyncio.run(main(server))
+    assert result
+    assert counts["translate"] == 1
+    assert counts["coalesced"] == 0
+
+
+def test_async_chunked_rounds_use_batch_requests(server):
+    text = " ".join(f"Sentence number {i} is distinct." for i in range(200))
+    options = dict(use_cache=False, seed=5, chunk_mode="sentence", chunk_threshold=100, chunk_workers=4)
+
+    server.reset_counts()
+    result, _ = trans(text, 3, backend=HTTPBackend(server.url, create_session(4)), **options)
+    sync_requests = server.counts["/translate"]
+
+    server.reset_counts()
+    async_result, _ = asyncio.run(trans_async_result(text, 3, base_url=server.url, **options))
+    assert async_result == result
+    # 每轮分成 chunk_workers 组，每组50句按 max_batch_size=32 分成两个批量请求，而不是每个句子一个请求
+    assert server.counts["/translate"] == sync_requests
+    assert server.counts["/translate"] == 3 * 4 * 2
+
+
+def test_async_retries_share_the_sync_retry_rules():
+    retry = RetryPolicy(2, backoff=0.001, max_backoff=0.001)
+
+    async def main(server):
+        async with AsyncLibreTranslator(server.url, retry=retry) as translator:
+            translator.begin_round()
+            with pytest.raises(TranslationError):
+                await translator.translate("Hello.", "en", "fr")
+            return translator.end_round()
+
+    with MockLibreTranslateServer(error_rate=1.0) as server:
+        metrics = asyncio.run(main(server))
+        assert server.counts["/translate"] == 3
+    assert metrics["status_codes"] == [500, 500, 500]
+    assert metrics["retries"] == 2
+
+
+def test_async_batch_limit_rejection_splits_batches():
+    texts = [f"Sentence {i}." for i in range(10)]
+
+    async def main(server):
+        async with AsyncLibreTranslator(server.url) as translator:
+            results = await translator.translate_batch(texts, "en", "fr")
+            return results, translator.supports_batch, translator.batch_limit
+
+    with MockLibreTranslateServer(batch_limit=3) as server:
+        results, supports_batch, batch_limit = asyncio.run(main(server))
+        assert server.counts["/translate"] == 5
+    assert len(results) == 10 and all(results)
+    assert supports_batch and batch_limit == 3
@@ -0,0 +1,78 @@
+import pytest
+
+from mock_server import MockLibreTranslateServer, fake_translate
+from translate_core import (HTTPBackend, LibreTranslator, TranslationBackend, TranslationError, batch_limit_from_error,
+                            create_session)
+
+
+def _translator(url, **options):
+    return LibreTranslator(backend=HTTPBackend(url, create_session(1)), **options)
+
+
+def test_batch_matches_single_translations_and_dedupes(server):
+    texts = ["One.", "Two.", "One.", "  ", "Three."]
+    results = _translator(server.url).translate_batch(texts, "en", "fr")
+    assert results == [fake_translate("One.", "fr"), fake_translate("Two.", "fr"), fake_translate("One.", "fr"),
+                       "  ", fake_translate("Three.", "fr")]
+    assert server.counts["/translate"] == 1
+
+
+@pytest.mark.parametrize("error, size, expected", [
+    ("Invalid request: request (10) exceeds batch limit (3)", 10, 3),
+    ("Invalid request: request (10) exceeds text limit (3)", 10, 3),
+    # 字符数上限：请求大小不是片段数，每次减半
+    ("Invalid request: request (5000) exceeds text limit (2000)", 10, 5),
+    ("Invalid request: request (10) exceeds batch limit", 10, 5),
+    ("xx is not supported", 10, None),
+])
+def test_batch_limit_from_error(error, size, expected):
+    assert batch_limit_from_error(400, error, size) == expected
+
+
+def test_batch_limit_rejection_splits_instead_of_disabling_batches():
+    texts = [f"Sentence {i}." for i in range(10)]
+    with MockLibreTranslateServer(batch_limit=3) as server:
+        translator = _translator(server.url)
+        results = translator.translate_batch(texts, "en", "fr")
+        assert results == [fake_translate(text, "fr") for text in texts]
+        assert translator.backend.supports_batch
+        assert translator.backend.batch_limit == 3
+        # 被拒绝的一次加上拆分后的4个批量请求
+        assert server.counts["/translate"] == 5
+
+        server.reset_counts()
+        translator.translate_batch([f"Other {i}." for i in range(10)], "en", "fr")
+        assert server.counts["/translate"] == 4
+
+
+def test_unsupported_pair_does_not_disable_batches(server):
+    translator = _translator(server.url)
+    with pytest.raises(TranslationError):
+        translator.translate_batch(["One.", "Two."], "en", "xx")
+    assert translator.backend.supports_batch
+    translator.translate_batch(["One.", "Two."], "en", "fr")
+    assert translator.backend.supports_batch
+
+
+class ArrayRejectingBackend(TranslationBackend):
+    supports_batch = True
+
+    def __init__(self):
+        self.array_calls = 0
+
+    def translate(self, text, source_lang, target_lang):
+        return fake_translate(text, target_lang)
+
+    def translate_array(self, texts, source_lang, target_lang):
+        self.array_calls += 1
+        return None
+
+
+def test_rejected_arrays_fall_back_and_disable_batches():
+    backend = ArrayRejectingBackend()
+    translator = LibreTranslator(backend=backend)
+    for _ in range(2):
+        assert translator.translate_batch(["One.", "Two."], "en", "fr") == [fake_translate("One.", "fr"),
+                                                                             fake_translate("Two.", "fr")]
+    assert not backend.supports_batch
+    assert backend.array_calls == 1
@@ -0,0 +1,10 @@
+from benchmark import long_text
+from translate_core import split_text_segments
+
+
+def test_long_workload_sentences_are_distinct():
+    pieces, segment_indexes = split_text_segments(long_text(200))
+    segments = [pieces[i] for i in segment_indexes]
+    # 相同的句子会被批量翻译去重，长文本负载就测不到分块翻译的开销
+    assert len(segments) == 400
+    assert len(set(segments)) == len(segments)
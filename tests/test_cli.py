@@ -0,0 +1,51 @@
+import json
+
+import cli
+from resilience import configure_endpoints
+from mock_server import MockLibreTranslateServer
+
+
+def _run(tmp_path, requests, *extra):
+    source = tmp_path / "requests.jsonl"
+    source.write_text("".join(line + "\n" for line in requests), encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+    code = cli.main([str(source), "-o", str(output), "--no-cache", "--loops", "3", *extra])
+    records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    return code, {str(record["id"]): record for record in records}
+
+
+def test_cli_writes_success_records(default_server, tmp_path):
+    code, records = _run(tmp_path, [
+        json.dumps({"id": "a", "text": "Hello world.", "seed": 1}),
+        json.dumps({"id": "b", "text": "Good morning.", "loops": 2, "target": "fr"}),
+    ])
+    assert code == 0
+    assert set(records) == {"a", "b"}
+    assert len(records["a"]["route"]) == 3
+    assert records["a"]["route"][-1].endswith("→zh-Hans")
+    assert records["b"]["route"][-1].endswith("→fr")
+    assert records["a"]["failed_rounds"] == []
+    assert "error" not in records["a"]
+
+
+def test_cli_reports_invalid_lines(default_server, tmp_path):
+    code, records = _run(tmp_path, [
+        json.dumps({"id": "ok", "text": "Hello."}),
+        "{not json",
+    ])
+    assert code == 1
+    assert "result" in records["ok"]
+    errors = [record for record in records.values() if "error" in record]
+    assert len(errors) == 1
+
+
+def test_cli_emits_error_record_when_every_round_fails(tmp_path):
+    with MockLibreTranslateServer(error_rate=1.0) as server:
+        configure_endpoints([server.url], health_interval=0)
+        try:
+            code, records = _run(tmp_path, [json.dumps({"id": "x", "text": "Hello.", "source": "en"})])
+        finally:
+            configure_endpoints([])
+    assert code == 1
+    assert "result" not in records["x"]
+    assert records["x"]["error"]
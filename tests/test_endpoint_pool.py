@@ -0,0 +1,94 @@
+import pytest
+
+from mock_server import MockLibreTranslateServer
+from resilience import (CircuitBreaker, CircuitOpenError, EndpointPool, RetryPolicy, configure_endpoints,
+                        get_default_endpoint_pool)
+from translate_core import DEFAULT_BASE_URL, HTTPBackend, create_session, trans
+
+FAST_RETRY = dict(backoff=0.001, max_backoff=0.001)
+
+
+@pytest.fixture
+def servers():
+    with MockLibreTranslateServer(seed=1) as first, MockLibreTranslateServer(seed=2) as second:
+        yield first, second
+
+
+def _stopped_url():
+    with MockLibreTranslateServer() as stopped:
+        return stopped.url
+
+
+def test_least_outstanding_picks_idle_endpoint(servers):
+    pool = EndpointPool([server.url for server in servers], health_interval=None)
+    first = pool.acquire()
+    second = pool.acquire()
+    # 第一个实例有在途请求时选择另一个
+    assert {first.url, second.url} == set(pool.urls)
+
+    pool.release(first, elapsed=0.01)
+    assert pool.acquire() is first
+    assert first.latency == 0.01
+
+
+def test_backend_spreads_requests_across_endpoints(servers):
+    pool = EndpointPool([server.url for server in servers], health_interval=None)
+    backend = HTTPBackend(servers[0].url, create_session(2), endpoints=pool)
+    for i in range(10):
+        backend.translate(f"Sentence {i}.", "en", "fr")
+    # 负载相同时轮换起点，两个实例都分到请求
+    assert servers[0].counts["/translate"] == servers[1].counts["/translate"] == 5
+    assert all(endpoint.outstanding == 0 for endpoint in pool.endpoints)
+
+
+def test_connection_failure_removes_endpoint_until_healthy(server):
+    dead_url = _stopped_url()
+    pool = EndpointPool([dead_url, server.url], health_interval=None, health_timeout=0.5)
+    backend = HTTPBackend(server.url, create_session(2), retry=RetryPolicy(3, **FAST_RETRY), endpoints=pool)
+    for i in range(4):
+        assert backend.translate(f"Sentence {i}.", "en", "fr")
+
+    dead = pool.endpoints[0]
+    assert dead.healthy is False
+    # 移出轮换后不再尝试连接失败的实例
+    assert server.counts["/translate"] == 4
+    assert pool.catalog_url() == server.url
+
+    pool.check_health()
+    assert dead.healthy is False
+    assert pool.endpoints[1].healthy is True
+
+
+def test_all_breakers_open_raises(servers):
+    pool = EndpointPool([server.url for server in servers], health_interval=None)
+    for endpoint in pool.endpoints:
+        endpoint.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        endpoint.breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        pool.acquire()
+
+    pool.endpoints[1].breaker.record_success()
+    assert pool.acquire() is pool.endpoints[1]
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        EndpointPool(["http://127.0.0.1:1"], strategy="random")
+    with pytest.raises(ValueError):
+        EndpointPool([])
+
+
+def test_configure_endpoints_routes_default_url(servers):
+    pool = configure_endpoints([server.url for server in servers], health_interval=0)
+    try:
+        assert get_default_endpoint_pool() is pool
+        # 不指定服务地址的后端和 trans() 都在配置的实例之间分派
+        assert HTTPBackend().endpoints is pool
+        trans("One sentence. Another sentence.", 4, seed=3, use_cache=False)
+        assert all(server.counts["/translate"] > 0 for server in servers)
+        # 指定了其他地址的后端不受影响
+        assert HTTPBackend(servers[0].url).endpoints is None
+    finally:
+        configure_endpoints([])
+    assert get_default_endpoint_pool() is None
+    assert HTTPBackend(DEFAULT_BASE_URL).endpoints is None
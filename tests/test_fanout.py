@@ -0,0 +1,41 @@
+import pytest
+
+from fanout import divergence_scores, trans_fanout
+from translate_core import HTTPBackend, create_session
+
+
+def test_divergence_scores_rank_by_difference():
+    scores = divergence_scores("the cat sat on the mat", [
+        "the cat sat on the mat",
+        "The  cat sat ON the mat",
+        "a dog slept under a rug",
+        "",
+    ])
+    assert scores[0] == pytest.approx(0.0)
+    # 大小写和空白不影响差异度
+    assert scores[1] == pytest.approx(0.0)
+    assert scores[2] > 0.5
+    # 几乎被翻译成空白的结果不会排在前面
+    assert scores[3] == 0.0
+
+
+def test_fanout_ranks_candidates_and_counts_each_chain(server):
+    progress = []
+    candidates = trans_fanout("Hello world. This is a fan-out test.", loops=4, chains=4, use_cache=False,
+                              backend=HTTPBackend(server.url, create_session(4)), seed=1,
+                              progress_callback=lambda index, current, *_: progress.append((index, current)))
+    assert len(candidates) == 4
+    scores = [score for score, _, _ in candidates]
+    assert scores == sorted(scores, reverse=True)
+    assert sorted(progress) == [(index, current) for index in range(4) for current in range(1, 5)]
+
+    for _, text, history in candidates:
+        assert history[-1] == (history.actions()[-1], text)
+        assert history.route[-1][1] == "zh-Hans"
+        assert [metrics["round"] for metrics in history.metrics] == [1, 2, 3, 4]
+        # 每轮要么自己发出请求，要么与其他链合并
+        assert history.call_counts["translate"] + history.call_counts["coalesced"] == 4
+
+    # 各链的请求数加上参考译文的一次请求就是服务收到的全部翻译请求
+    chain_calls = sum(history.call_counts["translate"] for _, _, history in candidates)
+    assert server.counts["/translate"] == chain_calls + 1
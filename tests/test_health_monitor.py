@@ -0,0 +1,40 @@
+import threading
+
+from mock_server import MockLibreTranslateServer
+from translate_core import ServerHealthMonitor, get_language_catalog
+
+
+def test_monitor_reports_languages_and_only_notifies_changes(server):
+    changes = []
+    monitor = ServerHealthMonitor(server.url, on_change=changes.append)
+    assert monitor.status()["healthy"] is None
+
+    status = monitor.check()
+    assert status["healthy"] is True
+    assert "en" in status["languages"]
+    # 探测时顺便刷新了共享的语言目录
+    assert get_language_catalog(server.url).codes() == status["languages"]
+
+    monitor.check()
+    assert len(changes) == 1
+    assert monitor.status()["healthy"] is True
+
+
+def test_monitor_reports_unreachable_server():
+    with MockLibreTranslateServer() as stopped:
+        url = stopped.url
+    status = ServerHealthMonitor(url, timeout=0.5).check()
+    assert status["healthy"] is False
+    assert status["error"]
+    assert status["languages"] == []
+
+
+def test_monitor_checks_in_background(server):
+    checked = threading.Event()
+    monitor = ServerHealthMonitor(server.url, interval=60, on_change=lambda status: checked.set()).start()
+    try:
+        # 不在调用方线程中等待网络请求，结果由后台线程推送
+        assert checked.wait(5)
+        assert monitor.status()["healthy"] is True
+    finally:
+        monitor.stop()
@@ -0,0 +1,90 @@
+import queue
+import time
+
+import pytest
+
+from job_service import JobClient, JobServer, JobService
+from translate_core import CancellationToken, trans
+
+
+def wait_for(job, *statuses, timeout=10):
+    deadline = time.monotonic() + timeout
+    while job.status not in statuses:
+        assert time.monotonic() < deadline, f"任务停留在 {job.status}"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def service(default_server):
+    service = JobService(workers=1, max_queue=1)
+    yield service
+    service.close()
+
+
+def test_job_runs_like_trans(service):
+    job = service.submit("Hello world.", 3, seed=7)
+    wait_for(job, "done")
+    # 与直接调用 trans() 走同样的路线
+    expected, _ = trans("Hello world.", 3, seed=7)
+    assert job.result == expected
+    assert [name for name, _ in job.events] == ["progress"] * 3 + ["done"]
+
+
+def test_smaller_priority_runs_first(default_server):
+    default_server.latency = 0.05
+    service = JobService(workers=1, max_queue=10)
+    try:
+        blocker = service.submit("Blocking job.", 2)
+        wait_for(blocker, "running")
+        low = service.submit("Low priority.", 1, priority=5)
+        high = service.submit("High priority.", 1, priority=0)
+        wait_for(low, "done")
+        wait_for(high, "done")
+        assert high.started_at <= low.started_at
+    finally:
+        service.close()
+
+
+def test_cancelled_queued_job_frees_its_slot(service, default_server):
+    default_server.latency = 0.05
+    blocker = service.submit("Blocking job.", 5)
+    wait_for(blocker, "running")
+    queued = service.submit("Queued job.", 1)
+    with pytest.raises(queue.Full):
+        service.submit("No room.", 1)
+
+    service.cancel(queued.id)
+    assert queued.status == "cancelled"
+    assert service.queue_size() == 0
+    # 取消的任务不再占用队列名额
+    replacement = service.submit("Replacement job.", 1)
+    service.cancel(blocker.id)
+    wait_for(replacement, "done")
+
+
+def test_cancel_running_job_keeps_finished_rounds(service, default_server):
+    default_server.latency = 0.05
+    job = service.submit("Long running job.", 40)
+    with job.changed:
+        job.changed.wait_for(lambda: job.events, timeout=10)
+    service.cancel(job.id)
+    wait_for(job, "cancelled")
+    assert 0 < job.to_dict()["rounds_done"] < 40
+    assert job.all_steps.stop_reason == "cancelled"
+
+
+def test_client_round_trip_over_http(service):
+    server = JobServer(service, port=0).start()
+    try:
+        client = JobClient(server.url)
+        assert client.health()["workers"] == 1
+        calls = []
+        # 不接受 metrics 的旧式回调照旧可用
+        result, all_steps = client.trans("Hello world.", 3, lambda current, total, text, path: calls.append(current),
+                                         seed=7, cancel_token=CancellationToken())
+        expected, _ = trans("Hello world.", 3, seed=7)
+        assert result == expected
+        assert calls == [1, 2, 3]
+        assert len(all_steps.metrics) == 3
+    finally:
+        server.stop()
@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import pytest
+
+from fanout import trans_fanout
+from metrics import JSONLogSink, PrometheusTextfileSink, create_metrics_sink
+from translate_core import compatible_progress_callback, trans, trans_many
+
+
+def _metrics(**values):
+    metrics = {"round": 1, "detect_calls": 1, "detect_ms": 5.0, "translate_calls": 1, "translate_ms": 20.0,
+               "request_bytes": 100, "response_bytes": 200, "status_codes": [200, 200], "retries": 0,
+               "cache_hits": 0, "coalesced": 0, "round_ms": 30.0, "failed": False}
+    metrics.update(values)
+    return metrics
+
+
+def test_create_metrics_sink_by_extension(tmp_path):
+    with create_metrics_sink(str(tmp_path / "m.prom")) as sink:
+        assert isinstance(sink, PrometheusTextfileSink)
+    with create_metrics_sink(str(tmp_path / "m.jsonl")) as sink:
+        assert isinstance(sink, JSONLogSink)
+
+
+def test_json_log_sink_appends_one_line_per_round(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    with JSONLogSink(str(path)) as sink:
+        sink.record(_metrics())
+        sink.record(_metrics(round=2, failed=True))
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [record["round"] for record in records] == [1, 2]
+    assert "time" in records[0]
+
+
+def test_prometheus_sink_accumulates_counters_and_histogram(tmp_path):
+    path = tmp_path / "metrics.prom"
+    with PrometheusTextfileSink(str(path), write_interval=3600, buckets=(0.05, 1.0)) as sink:
+        sink.record(_metrics())
+        sink.record(_metrics(round_ms=500.0, failed=True, status_codes=[500, 200], retries=1))
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert "translator_rounds_total 2" in lines
+    assert "translator_failed_rounds_total 1" in lines
+    assert "translator_retries_total 1" in lines
+    assert 'translator_round_seconds_bucket{le="0.05"} 1' in lines
+    assert 'translator_round_seconds_bucket{le="1.0"} 2' in lines
+    assert 'translator_http_responses_total{status="200"} 3' in lines
+    assert 'translator_http_responses_total{status="500"} 1' in lines
+
+
+def test_trans_records_metrics_for_every_round(default_server, tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    received = []
+    with JSONLogSink(str(path)) as sink:
+        _, all_steps = trans("Hello world.", 3, lambda *args: received.append(args[-1]), use_cache=False,
+                             metrics_sink=sink)
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [record["round"] for record in records] == [1, 2, 3]
+    assert received == all_steps.metrics
+    assert sum(metrics["translate_calls"] for metrics in all_steps.metrics) == 3
+    assert all(metrics["status_codes"] for metrics in all_steps.metrics)
+
+
+@pytest.mark.parametrize("callback, expected", [
+    (lambda current, total, result, path: None, 4),
+    (lambda current, total, result, path, metrics: None, 5),
+    (lambda current, total, result, path, metrics=None: None, 5),
+    (lambda *args: None, 5),
+])
+def test_compatible_progress_callback(callback, expected):
+    # 接受指标参数的回调原样返回，旧回调调用时去掉指标
+    adapted = compatible_progress_callback(callback)
+    assert (adapted is callback) == (expected == 5)
+    adapted(1, 2, "text", [], {})
+
+
+def test_four_argument_progress_callbacks_still_work(default_server):
+    rounds = []
+
+    def old_callback(current, total, result, path):
+        rounds.append(current)
+
+    trans("Hello world.", 3, old_callback, use_cache=False)
+    assert rounds == [1, 2, 3]
+
+    chains = []
+    trans_many(["One.", "Two."], 2, lambda index, current, total, result, path: chains.append(index),
+               use_cache=False)
+    trans_fanout("Hello.", 2, chains=2, use_cache=False,
+                 progress_callback=lambda index, current, total, result, path: chains.append(index))
+    assert sorted(chains) == [0, 0, 0, 0, 1, 1, 1, 1]
+
+
+def test_four_argument_progress_callbacks_work_with_async(default_server):
+    pytest.importorskip("aiohttp")
+    from async_translate import trans_async_result
+
+    rounds = []
+    asyncio.run(trans_async_result("Hello world.", 2, lambda current, total, result, path: rounds.append(current),
+                                   use_cache=False, base_url=default_server.url))
+    assert rounds == [1, 2]
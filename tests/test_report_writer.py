@@ -0,0 +1,70 @@
+import csv
+import json
+
+import pytest
+
+from report_writer import create_report_writer, report_format_for, write_report
+from translate_core import TranslationHistory, trans
+
+
+def _history():
+    history = TranslationHistory([("原始文本", "Hello | world"), ("en→fr", "Bonjour\nle monde"), ("fr→zh-Hans", "你好")])
+    history.metrics = [{"round_ms": 12.0, "cache_hit": False, "failed": False},
+                       {"round_ms": 3.0, "cache_hit": True, "failed": False}]
+    history.stop_reason = "converged"
+    return history
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("report.md", "markdown"), ("report.jsonl", "jsonl"), ("report.json", "jsonl"), ("report.CSV", "csv"),
+    ("report", "markdown"),
+])
+def test_report_format_follows_extension(path, expected):
+    assert report_format_for(path) == expected
+
+
+def test_markdown_report_escapes_table_cells(tmp_path):
+    path = tmp_path / "report.md"
+    write_report(str(path), _history(), "你好")
+    content = path.read_text(encoding="utf-8")
+    assert "| 1 | en→fr | 12ms | Bonjour\\nle monde |" in content
+    assert "| 2 | fr→zh-Hans | 3ms (缓存) | 你好 |" in content
+    assert "Hello \\| world" in content
+    assert "*结果已收敛，提前结束*" in content
+
+
+def test_jsonl_report_records(tmp_path):
+    path = tmp_path / "report.jsonl"
+    candidates = [(0.5, "你好", None)]
+    write_report(str(path), _history(), "你好", candidates=candidates)
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [record["type"] for record in records] == ["header", "step", "step", "candidate", "final"]
+    assert records[1]["metrics"]["round_ms"] == 12.0
+    assert records[-1] == {"type": "final", "text": "你好", "stop_reason": "converged"}
+
+
+def test_csv_report_rows(tmp_path):
+    path = tmp_path / "report.csv"
+    write_report(str(path), _history(), "你好")
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["step", "action", "round_ms", "cache_hit", "failed", "text"]
+    assert rows[2] == ["1", "en→fr", "12.0", "0", "0", "Bonjour\nle monde"]
+    assert rows[3][3] == "1"
+
+
+def test_trans_streams_report_each_round(default_server, tmp_path):
+    path = tmp_path / "chain.jsonl"
+    writer = create_report_writer(str(path))
+    lines = []
+
+    def progress(current, total, result, route, metrics):
+        # 每轮结束时该轮已经写入报告
+        lines.append(len(path.read_text(encoding="utf-8").splitlines()))
+
+    with writer:
+        final_text, all_steps = trans("Hello world.", 3, progress, use_cache=False, report_writer=writer)
+    assert lines == [2, 3, 4]
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [record["text"] for record in records[1:-1]] == [text for _, text in all_steps[1:]]
+    assert records[-1]["text"] == final_text
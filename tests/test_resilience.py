@@ -0,0 +1,225 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from mock_server import MockLibreTranslateServer
+from resilience import (AdaptiveLimiter, CancellationToken, CircuitBreaker, CircuitOpenError, RetryPolicy,
+                        SingleFlight, TranslationCancelled, TranslationError, latency_class)
+from translate_core import HTTPBackend, create_session
+
+FAST_RETRY = dict(backoff=0.001, max_backoff=0.001)
+
+
+def _backend(url, retries=3, breaker=None):
+    return HTTPBackend(url, create_session(4), retry=RetryPolicy(retries, **FAST_RETRY),
+                       breaker=breaker or CircuitBreaker())
+
+
+def test_retry_recovers_from_server_errors():
+    with MockLibreTranslateServer(seed=4, error_rate=0.5) as server:
+        backend = _backend(server.url, retries=20, breaker=CircuitBreaker(failure_threshold=100))
+        for _ in range(5):
+            assert backend.translate("Hello.", "en", "fr")
+        # 出错的请求被重试，最终全部成功
+        assert server.counts["/translate"] > 5
+
+
+def test_retry_gives_up_after_configured_attempts():
+    with MockLibreTranslateServer(error_rate=1.0) as server:
+        backend = _backend(server.url, retries=2)
+        with pytest.raises(TranslationError):
+            backend.translate("Hello.", "en", "fr")
+        assert server.counts["/translate"] == 3
+
+
+def test_client_errors_are_not_retried():
+    with MockLibreTranslateServer(error_rate=1.0, error_status=400) as server:
+        backend = _backend(server.url, retries=3)
+        with pytest.raises(TranslationError):
+            backend.translate("Hello.", "en", "fr")
+        assert server.counts["/translate"] == 1
+
+
+def test_retry_after_header_is_respected_and_capped():
+    policy = RetryPolicy(max_retry_after=5.0)
+    assert policy.delay(0, "2") == 2.0
+    assert policy.delay(0, "120") == 5.0
+    assert 0 <= RetryPolicy(backoff=0.1, max_backoff=0.2).delay(10) <= 0.2
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    # 冷却结束后只放行一个试探请求
+    assert breaker.allow()
+    assert breaker.state == "half-open"
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_open_breaker_fails_fast_without_requests():
+    with MockLibreTranslateServer(error_rate=1.0) as server:
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        backend = _backend(server.url, retries=5, breaker=breaker)
+        with pytest.raises(CircuitOpenError):
+            backend.translate("Hello.", "en", "fr")
+        sent = server.counts["/translate"]
+        assert sent == 2
+        with pytest.raises(CircuitOpenError):
+            backend.translate("Hello.", "en", "fr")
+        assert server.counts["/translate"] == sent
+
+
+def _run_concurrently(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def test_single_flight_shares_one_call():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def slow(value):
+        calls.append(value)
+        release.wait(5)
+        return value * 2
+
+    threads = _run_concurrently(4, lambda: results.append(flights.do("key", slow, 21)))
+    while flights.stats()["shared"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [21]
+    assert sorted(results) == [(42, False), (42, True), (42, True), (42, True)]
+    assert flights.stats() == {"executed": 1, "shared": 3}
+
+
+def test_single_flight_shares_errors_and_separates_keys():
+    flights = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        release.wait(5)
+        raise TranslationError("boom")
+
+    def call():
+        try:
+            flights.do("key", failing)
+        except TranslationError as e:
+            errors.append(str(e))
+
+    threads = _run_concurrently(3, call)
+    while flights.stats()["shared"] < 2:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert errors == ["boom"] * 3
+
+    assert flights.do("a", lambda: 1) == (1, False)
+    assert flights.do("b", lambda: 2) == (2, False)
+
+
+def test_single_flight_waiter_can_be_cancelled():
+    flights = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: flights.do("key", release.wait, 5))
+    leader.start()
+    while flights.stats()["executed"] < 1:
+        time.sleep(0.001)
+
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(TranslationCancelled):
+        flights.do("key", release.wait, 5, cancel_token=token)
+    release.set()
+    leader.join()
+
+
+def _request(limiter, path, request_bytes, latency):
+    limiter.acquire()
+    limiter.release(latency, key=latency_class(path, request_bytes))
+
+
+def test_limiter_keeps_separate_baselines_for_detect_and_translate():
+    limiter = AdaptiveLimiter(initial_limit=8)
+    # 串行、从不并发的请求：检测很快，长文本翻译较慢，但服务并未过载
+    for _ in range(50):
+        _request(limiter, "/detect", 60, 0.015)
+        _request(limiter, "/translate", 2000, 0.25)
+        _request(limiter, "/translate", 80, 0.03)
+    assert limiter.stats()["limit"] == 8
+
+
+def test_limiter_backs_off_when_latency_rises():
+    limiter = AdaptiveLimiter(initial_limit=8, headroom=0.0)
+    _request(limiter, "/translate", 2000, 0.25)
+    for _ in range(3):
+        _request(limiter, "/translate", 2000, 0.001)
+        limiter._last_decrease = 0.0
+        _request(limiter, "/translate", 2000, 0.01)
+    assert limiter.stats()["limit"] < 8
+
+
+def test_limiter_grants_async_waiters_in_order():
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+    order = []
+
+    async def waiter(name):
+        await limiter.acquire_async()
+        order.append(name)
+        await asyncio.sleep(0)
+        limiter.release()
+
+    async def main():
+        limiter.acquire()
+        tasks = [asyncio.ensure_future(waiter(name)) for name in "abc"]
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["waiting"] == 3
+        # 名额从另一个线程归还，等待方无需轮询即被唤醒
+        threading.Thread(target=limiter.release).start()
+        await asyncio.wait_for(asyncio.gather(*tasks), 1)
+
+    asyncio.run(main())
+    assert order == ["a", "b", "c"]
+    assert limiter.stats()["inflight"] == 0
+
+
+def test_limiter_async_wait_can_be_cancelled():
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+    token = CancellationToken()
+
+    async def main():
+        limiter.acquire()
+        task = asyncio.ensure_future(limiter.acquire_async(token))
+        await asyncio.sleep(0.01)
+        token.cancel()
+        with pytest.raises(TranslationCancelled):
+            await asyncio.wait_for(task, 1)
+
+    asyncio.run(main())
+    limiter.release()
+    assert limiter.stats()["inflight"] == 0
+    assert limiter.stats()["waiting"] == 0
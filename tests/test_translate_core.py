@@ -0,0 +1,179 @@
+import pickle
+import random
+import threading
+
+import pytest
+
+from mock_server import DEFAULT_LANGUAGES, MockLibreTranslateServer
+from resilience import CircuitBreaker, RetryPolicy
+from translate_core import (CHINESE_LANGS, HISTORY_COMPRESS_THRESHOLD, CancellationToken, HTTPBackend, LanguageGraph,
+                            TranslationHistory, plan_route, split_text_segments, trans, trans_many)
+
+
+@pytest.mark.parametrize("mode", ["sentence", "paragraph"])
+@pytest.mark.parametrize("text", [
+    "",
+    "   ",
+    "Hello world.",
+    "Hello world.  How are you?\n\nFine!",
+    "  Leading and trailing whitespace.  \n",
+    "第一句。第二句！第三句？\n最后一句",
+    "Line one\r\nLine two\n\n\nLine three…  Done",
+])
+def test_split_text_segments_round_trip(text, mode):
+    pieces, segment_indexes = split_text_segments(text, mode)
+    assert "".join(pieces) == text
+    for index in segment_indexes:
+        assert pieces[index] == pieces[index].strip() != ""
+    # 不需要翻译的片段只有空白
+    for index, piece in enumerate(pieces):
+        if index not in segment_indexes:
+            assert not piece.strip()
+
+
+def test_split_text_segments_sentence_boundaries():
+    pieces, segment_indexes = split_text_segments("One. Two! Three?", "sentence")
+    assert [pieces[i] for i in segment_indexes] == ["One.", "Two!", "Three?"]
+
+
+def test_history_behaves_like_a_list():
+    history = TranslationHistory([("原始文本", "a")])
+    history.append(("en→fr", "b"))
+    history.extend([("fr→de", "c"), ("de→en", "d")])
+    history.insert(1, ("x→y", "z"))
+    assert len(history) == 5
+    assert history[0] == ("原始文本", "a")
+    assert history[-1] == ("de→en", "d")
+    assert history[1:3] == [("x→y", "z"), ("en→fr", "b")]
+    del history[1]
+    history[1] = ("en→fr (失败)", "a")
+    assert list(history) == [("原始文本", "a"), ("en→fr (失败)", "a"), ("fr→de", "c"), ("de→en", "d")]
+    assert history.actions() == ["原始文本", "en→fr (失败)", "fr→de", "de→en"]
+    history[:] = [("错误", "boom")]
+    assert list(history) == [("错误", "boom")]
+
+
+def test_history_compresses_long_texts():
+    long_text = "长文本" * HISTORY_COMPRESS_THRESHOLD
+    history = TranslationHistory([("原始文本", long_text), ("zh→en", long_text)])
+    assert history[0][1] == long_text
+    assert history[1] == ("zh→en", long_text)
+
+
+def test_history_pickle_keeps_steps_and_attributes():
+    history = TranslationHistory([("原始文本", "hello"), ("en→fr", "bonjour" * 500)])
+    history.route = [("en", "fr")]
+    history.call_counts = {"detect": 1, "translate": 1, "cache_hits": 0, "coalesced": 0}
+    history.metrics.append({"round": 1, "failed": False})
+    history.stop_reason = "converged"
+
+    restored = pickle.loads(pickle.dumps(history))
+    assert list(restored) == list(history)
+    assert restored.route == history.route
+    assert restored.call_counts == history.call_counts
+    assert restored.metrics == history.metrics
+    assert restored.stop_reason == "converged"
+
+
+def _graph():
+    codes = [code for code, _ in DEFAULT_LANGUAGES]
+    return LanguageGraph([{"code": code, "targets": [other for other in codes if other != code]}
+                          for code in codes])
+
+
+@pytest.mark.parametrize("seed", range(50))
+@pytest.mark.parametrize("source_lang", ["en", "fr", "zh-Hans"])
+def test_plan_route_chinese_target_rules(seed, source_lang):
+    loops = 6
+    route = plan_route(source_lang, loops, "zh-Hans", _graph(), random.Random(seed))
+    assert len(route) == loops
+    assert route[0][0] == source_lang
+    # 相邻两跳首尾相接，且没有原地翻译
+    for (_, to_lang), (from_lang, _) in zip(route, route[1:]):
+        assert to_lang == from_lang
+    assert all(source != target for source, target in route)
+    # 中间轮次不经过中文，倒数第二轮到英文，最后一轮到目标语言
+    assert all(target not in CHINESE_LANGS for _, target in route[:-2])
+    assert route[-2][1] == "en"
+    assert route[-1] == ("en", "zh-Hans")
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_plan_route_non_chinese_target(seed):
+    route = plan_route("en", 5, "fr", _graph(), random.Random(seed))
+    assert route[-1][1] == "fr"
+    assert all(target not in CHINESE_LANGS for _, target in route)
+    assert all(source != target for source, target in route)
+
+
+def test_penultimate_round_leaves_english_when_already_there():
+    graph = _graph()
+    target = graph.next_hop("en", 4, 6, "zh-Hans", random.Random(0))
+    assert target != "en" and target not in CHINESE_LANGS
+
+
+def test_plan_route_is_reproducible():
+    graph = _graph()
+    assert plan_route("en", 10, "zh-Hans", graph, random.Random(7)) == \
+        plan_route("en", 10, "zh-Hans", graph, random.Random(7))
+
+
+def test_checkpoint_resume_matches_uninterrupted_run(default_server, tmp_path):
+    text = "Hello world. This is a checkpoint test."
+    expected_text, expected_steps = trans(text, 6, seed=3, use_cache=False)
+
+    checkpoint = str(tmp_path / "chain.jsonl")
+    token = CancellationToken()
+
+    def stop_after_three(current, total, result, path, metrics):
+        if current == 3:
+            token.cancel()
+
+    _, partial = trans(text, 6, stop_after_three, seed=3, use_cache=False, checkpoint=checkpoint,
+                       cancel_token=token)
+    assert partial.stop_reason == "cancelled"
+    assert len(partial) - 1 == 3
+
+    default_server.reset_counts()
+    final_text, all_steps = trans(text, 6, seed=3, use_cache=False, checkpoint=checkpoint)
+    assert final_text == expected_text
+    assert list(all_steps) == list(expected_steps)
+    assert all_steps.route == expected_steps.route
+    # 续跑只执行剩下的三轮
+    assert default_server.counts.get("/translate", 0) == 3
+
+    # 已经完成的检查点不再发送请求
+    default_server.reset_counts()
+    again_text, _ = trans(text, 6, seed=3, use_cache=False, checkpoint=checkpoint)
+    assert again_text == expected_text
+    assert default_server.counts.get("/translate", 0) == 0
+
+
+def test_cancel_before_source_detection_returns_cleanly(default_server, tmp_path):
+    token = CancellationToken()
+    token.cancel()
+    default_server.reset_counts()
+    text, all_steps = trans("Hello world.", 5, use_cache=False, cancel_token=token,
+                            checkpoint=str(tmp_path / "chain.jsonl"), report_writer=str(tmp_path / "report.md"))
+    assert text == "Hello world."
+    assert all_steps.stop_reason == "cancelled"
+    assert list(all_steps) == [("原始文本", "Hello world.")]
+    assert default_server.counts.get("/detect", 0) == 0
+    # 一轮也没有开始，不留下检查点和报告
+    assert list(tmp_path.iterdir()) == []
+
+    results = trans_many(["One.", "Two."], 3, use_cache=False, cancel_token=token)
+    assert [steps.stop_reason for _, steps in results] == ["cancelled", "cancelled"]
+
+
+def test_cancel_during_source_detection_returns_cleanly():
+    token = CancellationToken()
+    with MockLibreTranslateServer(error_rate=1.0) as server:
+        # 检测请求一直失败，在重试等待期间取消
+        backend = HTTPBackend(server.url, retry=RetryPolicy(retries=50, backoff=0.05, max_backoff=0.05),
+                              breaker=CircuitBreaker(failure_threshold=100))
+        threading.Timer(0.1, token.cancel).start()
+        text, all_steps = trans("Hello world.", 5, use_cache=False, backend=backend, cancel_token=token)
+    assert text == "Hello world."
+    assert all_steps.stop_reason == "cancelled"
+    assert server.counts.get("/translate", 0) == 0
@@ -0,0 +1,44 @@
+from translate_core import HTTPBackend, LibreTranslator, create_session
+from translation_cache import TranslationCache, make_cache_key
+
+
+def test_cache_key_normalizes_text():
+    assert make_cache_key(" café\x00 ", "fr", "en") == make_cache_key("café", "fr", "en")
+    assert make_cache_key("Hello", "en", "fr") != make_cache_key("Hello", "en", "de")
+
+
+def test_cache_persists_to_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = TranslationCache(path, memory_size=1)
+    cache.put("Hello", "en", "fr", "Bonjour")
+    cache.put("Bye", "en", "fr", "Au revoir")
+    # 内存中只保留最近一条，较早的从SQLite读取
+    assert cache.get("Hello", "en", "fr") == "Bonjour"
+    assert cache.stats["disk_hits"] == 1
+    cache.close()
+
+    reopened = TranslationCache(path)
+    assert reopened.get("Bye", "en", "fr") == "Au revoir"
+    assert reopened.get("Bye", "en", "de") is None
+    assert reopened.hit_rate() == 0.5
+    reopened.close()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"), memory_size=1, max_entries=10)
+    for i in range(12):
+        cache.put(f"text {i}", "en", "fr", f"texte {i}")
+    assert cache.stats["evictions"] > 0
+    assert cache.get("text 0", "en", "fr") is None
+    assert cache.get("text 11", "en", "fr") == "texte 11"
+    cache.close()
+
+
+def test_translator_serves_repeated_translations_from_cache(server):
+    cache = TranslationCache(":memory:")
+    translator = LibreTranslator(cache=cache, backend=HTTPBackend(server.url, create_session(1)))
+    first = translator.translate("Hello world.", "en", "fr")
+    assert translator.translate("  Hello world.  ", "en", "fr") == first
+    assert translator.translate_batch(["Hello world.", "Good night."], "en", "fr")[0] == first
+    assert server.counts["/translate"] == 2
+    assert translator.call_counts["cache_hits"] == 2
@@ -2,53 +2,695 @@ import requests
 import logging
 import random
 import os
+import inspect
 import re
 import string
+import sys
+import threading
+import time
+import zlib
+from collections.abc import MutableSequence
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from difflib import SequenceMatcher
+from requests.adapters import HTTPAdapter
+from checkpoint import CheckpointJournal
+from report_writer import ReportWriter, create_report_writer, report_extension
+# 重试、断路器、并发限制和多实例分派在 resilience 中实现
+from resilience import (DEFAULT_BASE_URL, CancellationToken, Endpoint, RequestAttempts, RetryPolicy, SingleFlight,
+                        TranslationCancelled, TranslationError, get_circuit_breaker, get_default_endpoint_pool,
+                        resolve_catalog_url)
+from translation_cache import get_default_cache
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# 从LibreTranslate服务获取支持的语言列表
-def get_supported_languages(base_url="http://127.0.0.1:5000"):
-    try:
-        response = requests.get(f"{base_url}/languages", timeout=5)
-        if response.status_code == 200:
-            languages = [lang['code'] for lang in response.json()]
-            return languages
-        else:
-            logging.error(f"获取语言列表失败: {response.status_code}")
-            return []
-    except Exception as e:
-        logging.error(f"连接LibreTranslate服务失败: {str(e)}")
+
+class LanguageCatalog:
+    """LibreTranslate语言目录：首次使用时加载，过期后在后台线程刷新"""
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, ttl=600, retry_interval=5, timeout=5):
+        self.base_url = base_url
+        self.ttl = ttl
+        # 加载失败后，至少间隔这么久才重试，避免服务未启动时反复请求
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+
+        self._languages = []
+        self._loaded_at = None
+        self._failed_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # 同时发起的多次刷新只请求一次 /languages
+        self._refresh_flight = SingleFlight()
+
+    def refresh(self):
+        """立即从服务获取语言列表，成功返回True"""
+        ok, _ = self._refresh_flight.do("languages", self._refresh)
+        return ok
+
+    def _refresh(self):
+        try:
+            response = requests.get(f"{self.base_url}/languages", timeout=self.timeout)
+            if response.status_code != 200:
+                logging.error(f"获取语言列表失败: {response.status_code}")
+                ok = False
+            else:
+                languages = [
+                    {
+                        "code": lang["code"],
+                        "name": lang.get("name", lang["code"]),
+                        "targets": list(lang.get("targets", [])),
+                    }
+                    for lang in response.json()
+                ]
+                ok = True
+        except Exception as e:
+            logging.error(f"连接LibreTranslate服务失败: {str(e)}")
+            ok = False
+
+        with self._lock:
+            self._refreshing = False
+            if ok:
+                self._languages = languages
+                self._loaded_at = time.monotonic()
+                self._failed_at = None
+            else:
+                self._failed_at = time.monotonic()
+        return ok
+
+    def _refresh_in_background(self):
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._loaded_at is not None:
+                # 已有数据：过期时后台刷新，期间继续使用旧数据
+                recently_failed = self._failed_at is not None and now - self._failed_at < self.retry_interval
+                if now - self._loaded_at > self.ttl and not self._refreshing and not recently_failed:
+                    self._refreshing = True
+                    self._refresh_in_background()
+                return
+            if self._failed_at is not None and now - self._failed_at < self.retry_interval:
+                return
+
+        # 首次加载：只让一个线程发请求，其余线程等待结果
+        with self._load_lock:
+            with self._lock:
+                if self._loaded_at is not None:
+                    return
+                if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval:
+                    return
+            self.refresh()
+
+    def languages(self):
+        """返回语言列表，每项为 {"code", "name", "targets"}（调用方不应修改该列表）"""
+        self._ensure_loaded()
+        with self._lock:
+            # 刷新时整体替换列表对象，因此可以直接返回，语言对图也据此判断是否需要重建
+            return self._languages
+
+    def codes(self):
+        """返回支持的语言代码列表"""
+        return [lang["code"] for lang in self.languages()]
+
+    def targets(self, code):
+        """返回某个源语言可以翻译到的目标语言列表"""
+        for lang in self.languages():
+            if lang["code"] == code:
+                return list(lang["targets"])
         return []
 
-# 获取支持的语言列表
-COMMON_LANGUAGES = get_supported_languages()
+    def invalidate(self):
+        """使缓存失效，下次访问时重新加载"""
+        with self._lock:
+            self._loaded_at = None
+            self._failed_at = None
 
-class LibreTranslator:
-    def __init__(self, base_url="http://127.0.0.1:5000"):
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_language_catalog(base_url=DEFAULT_BASE_URL):
+    """获取某个服务地址共享的语言目录"""
+    with _catalogs_lock:
+        catalog = _catalogs.get(base_url)
+        if catalog is None:
+            catalog = LanguageCatalog(base_url)
+            _catalogs[base_url] = catalog
+        return catalog
+
+
+# 从LibreTranslate服务获取支持的语言列表（结果由语言目录缓存）
+def get_supported_languages(base_url=DEFAULT_BASE_URL):
+    return get_language_catalog(resolve_catalog_url(base_url)).codes()
+
+
+def __getattr__(name):
+    # 兼容旧代码：COMMON_LANGUAGES 不再在导入时请求服务，而是首次访问时从语言目录读取
+    if name == "COMMON_LANGUAGES":
+        return get_supported_languages()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# 语言检测策略：
+#   always    - 每轮都调用 /detect（旧行为）
+#   first     - 仅在第一轮检测，之后信任上一轮的目标语言
+#   heuristic - 仅当本地文字系统判断与上一轮目标语言不一致时才检测
+#   never     - 从不在循环中检测
+DETECT_POLICIES = ("always", "first", "heuristic", "never")
+
+# Unicode区段 -> 文字系统
+_SCRIPT_RANGES = [
+    (0x0370, 0x03FF, "greek"),
+    (0x0400, 0x052F, "cyrillic"),
+    (0x0530, 0x058F, "armenian"),
+    (0x0590, 0x05FF, "hebrew"),
+    (0x0600, 0x06FF, "arabic"),
+    (0x0750, 0x077F, "arabic"),
+    (0x0900, 0x097F, "devanagari"),
+    (0x0980, 0x09FF, "bengali"),
+    (0x0A00, 0x0A7F, "gurmukhi"),
+    (0x0A80, 0x0AFF, "gujarati"),
+    (0x0B80, 0x0BFF, "tamil"),
+    (0x0C00, 0x0C7F, "telugu"),
+    (0x0C80, 0x0CFF, "kannada"),
+    (0x0D00, 0x0D7F, "malayalam"),
+    (0x0E00, 0x0E7F, "thai"),
+    (0x10A0, 0x10FF, "georgian"),
+    (0x1100, 0x11FF, "hangul"),
+    (0x3040, 0x30FF, "kana"),
+    (0x3400, 0x4DBF, "han"),
+    (0x4E00, 0x9FFF, "han"),
+    (0xAC00, 0xD7AF, "hangul"),
+    (0xF900, 0xFAFF, "han"),
+]
+
+# 语言代码 -> 文字系统（未列出的语言视为拉丁字母）
+_LANGUAGE_SCRIPTS = {
+    "el": "greek",
+    "ru": "cyrillic", "uk": "cyrillic", "bg": "cyrillic", "sr": "cyrillic",
+    "mk": "cyrillic", "be": "cyrillic", "kk": "cyrillic", "ky": "cyrillic", "mn": "cyrillic",
+    "hy": "armenian",
+    "he": "hebrew", "yi": "hebrew",
+    "ar": "arabic", "fa": "arabic", "ur": "arabic", "ps": "arabic", "ug": "arabic",
+    "hi": "devanagari", "mr": "devanagari", "ne": "devanagari", "sa": "devanagari",
+    "bn": "bengali", "pa": "gurmukhi", "gu": "gujarati", "ta": "tamil", "te": "telugu",
+    "kn": "kannada", "ml": "malayalam", "th": "thai", "ka": "georgian",
+    "ko": "hangul",
+    "zh": "han", "zh-Hans": "han", "zh-Hant": "han", "zt": "han",
+}
+
+
+def guess_script(text):
+    """根据字符的Unicode区段粗略判断文本的主要文字系统"""
+    counts = {}
+    for ch in text:
+        code = ord(ch)
+        if code < 0x0370:
+            if ch.isalpha():
+                counts["latin"] = counts.get("latin", 0) + 1
+            continue
+        for start, end, script in _SCRIPT_RANGES:
+            if start <= code <= end:
+                counts[script] = counts.get(script, 0) + 1
+                break
+    if not counts:
+        return None
+    # 日文混合假名和汉字，只要出现足够的假名就视为日文
+    if counts.get("kana", 0) * 5 >= sum(counts.values()):
+        return "kana"
+    return max(counts, key=counts.get)
+
+
+def script_matches_language(text, lang):
+    """判断文本的文字系统是否与给定语言一致（无法判断时视为一致）"""
+    # 长文本只取开头部分判断即可
+    script = guess_script(text[:2000])
+    if script is None or lang is None:
+        return True
+    expected = "kana" if lang == "ja" else _LANGUAGE_SCRIPTS.get(lang, "latin")
+    if expected == "kana":
+        # 日文文本也可能几乎全是汉字
+        return script in ("kana", "han")
+    return script == expected
+
+
+# 分块翻译的切分规则：句末标点后的空白、中日文句末标点之后、换行
+_SENTENCE_BOUNDARY = re.compile(r'((?<=[.!?…])\s+|(?<=[。！？；])\s*|\s*\n\s*)')
+_PARAGRAPH_BOUNDARY = re.compile(r'(\s*\n\s*)')
+CHUNK_MODES = ("sentence", "paragraph")
+
+
+def split_text_segments(text, mode="sentence"):
+    """把文本切分为片段，返回 (pieces, segment_indexes)
+
+    pieces 依次拼接即为原文；segment_indexes 指出其中需要翻译的片段，
+    其余为原样保留的空白和换行。
+    """
+    boundary = _PARAGRAPH_BOUNDARY if mode == "paragraph" else _SENTENCE_BOUNDARY
+    pieces = []
+    segment_indexes = []
+    for i, part in enumerate(boundary.split(text)):
+        if not part:
+            continue
+        core = part.strip()
+        if i % 2 or not core:
+            # 分隔符和纯空白原样保留
+            pieces.append(part)
+            continue
+        start = part.index(core)
+        end = start + len(core)
+        if start:
+            pieces.append(part[:start])
+        segment_indexes.append(len(pieces))
+        pieces.append(core)
+        if end < len(part):
+            pieces.append(part[end:])
+    return pieces, segment_indexes
+
+
+def translate_chunked(translator, text, source_lang, target_lang, mode="sentence", workers=4):
+    """按句子或段落切分文本，同一语言对的各组片段并行批量翻译后按原样拼接"""
+    pieces, segment_indexes = split_text_segments(text, mode)
+    if len(segment_indexes) <= 1:
+        return translator.translate(text, source_lang, target_lang)
+
+    segments = [pieces[i] for i in segment_indexes]
+    # 平均分成若干连续的组，每组一次批量请求，各组并行发送
+    group_size = -(-len(segments) // workers)
+    groups = [segments[i:i + group_size] for i in range(0, len(segments), group_size)]
+    with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+        translated_groups = list(executor.map(
+            lambda group: translator.translate_batch(group, source_lang, target_lang), groups
+        ))
+
+    translated = [result for group in translated_groups for result in group]
+    for index, result in zip(segment_indexes, translated):
+        pieces[index] = result
+    return "".join(pieces)
+
+
+# 服务拒绝过大的批量请求时的错误信息，如 "request (40) exceeds batch limit (32)"
+_BATCH_LIMIT_ERROR = re.compile(r"request \((\d+)\) exceeds (?:batch|text) limit(?: \((\d+)\))?")
+
+
+def batch_limit_from_error(status, error_text, size):
+    """size 个片段的批量请求因超过服务上限被拒绝时，返回拆分后每批的片段数，其他错误返回None
+
+    错误信息给出的是片段数上限时直接使用；是字符数上限或没有给出上限时每次减半。
+    """
+    match = _BATCH_LIMIT_ERROR.search(error_text) if status == 400 else None
+    if match is None or size <= 1:
+        return None
+    limit = int(match.group(2)) if match.group(2) and int(match.group(1)) == size else size // 2
+    return min(max(limit, 1), size - 1)
+
+
+def pack_batches(texts, max_batch_size, max_batch_chars):
+    """按片段数和字符数上限把文本依次分组，每组为一次批量请求"""
+    batch = []
+    batch_chars = 0
+    for text in texts:
+        if batch and (len(batch) >= max_batch_size or batch_chars + len(text) > max_batch_chars):
+            yield batch
+            batch = []
+            batch_chars = 0
+        batch.append(text)
+        batch_chars += len(text)
+    if batch:
+        yield batch
+
+
+# 超过该字符数的步骤文本在 TranslationHistory 中压缩保存
+HISTORY_COMPRESS_THRESHOLD = 1024
+
+
+class TranslationHistory(MutableSequence):
+    """翻译步骤列表，元素为 (操作, 文本)，并附带本次翻译的HTTP调用计数
+
+    与列表的用法相同，但内部紧凑保存：操作名和路线中的语言代码被驻留（intern），
+    较长的文本用zlib压缩，与上一步相同的文本（失败或收敛的轮次）共用同一份数据；
+    只有访问某一步时才解压该步的文本。
+    """
+
+    def __init__(self, steps=()):
+        self._actions = []
+        # 每步的文本：短文本为str，长文本为压缩后的bytes
+        self._texts = []
+        # 最近一次解压的 (压缩数据, 文本)，重复访问同一步时不必再解压
+        self._decoded = (None, None)
+        self.extend(steps)
+        self.call_counts = {"detect": 0, "translate": 0, "cache_hits": 0, "coalesced": 0}
+        # 预先规划的翻译路线 [(源语言, 目标语言), ...]
+        self.route = []
+        # 每轮的耗时和HTTP指标，与第1轮起的各个步骤一一对应
+        self.metrics = []
+        # 提前结束的原因："cancelled"（被取消）、"converged"（文本不再变化），跑完全部轮次时为None
+        self.stop_reason = None
+
+    @property
+    def route(self):
+        return self._route
+
+    @route.setter
+    def route(self, route):
+        # 保持与调用方同一个列表对象（trans 会在重新规划时原地修改路线）
+        for index, (source, target) in enumerate(route):
+            route[index] = (sys.intern(source), sys.intern(target))
+        self._route = route
+
+    def _encode(self, index, text):
+        # 与上一步文本相同时复用上一步的数据
+        if index > 0:
+            previous = self._texts[index - 1]
+            if previous is text or (isinstance(previous, str) and previous == text):
+                return previous
+            if isinstance(previous, bytes) and self._decoded[0] is previous and self._decoded[1] == text:
+                return previous
+        if len(text) < HISTORY_COMPRESS_THRESHOLD:
+            return text
+        data = zlib.compress(text.encode("utf-8"), 1)
+        self._decoded = (data, text)
+        return data
+
+    def _decode(self, data):
+        if isinstance(data, str):
+            return data
+        cached_data, text = self._decoded
+        if cached_data is not data:
+            text = zlib.decompress(data).decode("utf-8")
+            self._decoded = (data, text)
+        return text
+
+    def __len__(self):
+        return len(self._actions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [(action, self._decode(data))
+                    for action, data in zip(self._actions[index], self._texts[index])]
+        return self._actions[index], self._decode(self._texts[index])
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            steps = list(value)
+            self._actions[index] = [sys.intern(action) for action, _ in steps]
+            # 切片赋值可能改变前后步骤的关系，这里不做去重
+            self._texts[index] = [text if len(text) < HISTORY_COMPRESS_THRESHOLD
+                                  else zlib.compress(text.encode("utf-8"), 1) for _, text in steps]
+        else:
+            action, text = value
+            index = range(len(self))[index]
+            self._actions[index] = sys.intern(action)
+            self._texts[index] = self._encode(index, text)
+
+    def __delitem__(self, index):
+        del self._actions[index]
+        del self._texts[index]
+
+    def insert(self, index, value):
+        action, text = value
+        # 与 list.insert 相同，越界的位置插入到开头或末尾
+        index = min(max(index + len(self) if index < 0 else index, 0), len(self))
+        self._actions.insert(index, sys.intern(action))
+        self._texts.insert(index, self._encode(index, text))
+
+    def actions(self):
+        """所有步骤的操作名，不解压文本"""
+        return list(self._actions)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, TranslationHistory)):
+            return len(self) == len(other) and all(a == tuple(b) for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"TranslationHistory({list(self)!r})"
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_decoded"] = (None, None)
+        return state
+
+
+def new_round_metrics():
+    """一轮翻译的指标：检测/翻译的调用次数和累计耗时、请求/响应字节数、状态码和缓存命中"""
+    return {
+        "detect_calls": 0,
+        "detect_ms": 0.0,
+        "translate_calls": 0,
+        "translate_ms": 0.0,
+        "request_bytes": 0,
+        "response_bytes": 0,
+        "status_codes": [],
+        "retries": 0,
+        "cache_hits": 0,
+        "coalesced": 0,
+    }
+
+
+# 当前线程正在进行的后端调用收集到的HTTP响应记录
+_http_records = threading.local()
+
+
+def _record_http(status, request_bytes, response_bytes, retry=False):
+    records = getattr(_http_records, "records", None)
+    if records is not None:
+        records.append((status, request_bytes, response_bytes, retry))
+
+
+# 未传入会话时共用的默认连接池大小
+DEFAULT_POOL_SIZE = 32
+
+
+def create_session(pool_size=10):
+    """创建带连接池的HTTP会话，可在多个翻译链之间共享
+
+    pool_size 应不小于同时发往同一服务的请求数，否则多出的连接用完即关，无法保持keep-alive。
+    重试由 HTTPBackend 处理，连接池本身不重试。
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Content-Type": "application/json",
+        "Accept": "application/json"
+    })
+    return session
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def get_default_session():
+    """获取进程内共享的HTTP会话，单独调用 trans() 时也能复用keep-alive连接"""
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = create_session(DEFAULT_POOL_SIZE)
+        return _default_session
+
+
+# 当前线程正在进行的后端调用所属翻译的取消令牌
+_cancel_tokens = threading.local()
+
+
+# 所有翻译器共用，不同翻译链、界面会话同时发出的相同请求只发送一次
+_backend_flights = SingleFlight()
+
+
+def get_single_flight_stats():
+    """进程内检测/翻译请求的合并统计：executed 为实际发出的调用数，shared 为被合并省下的调用数"""
+    return _backend_flights.stats()
+
+
+class ServerHealthMonitor:
+    """在后台线程中定期检查翻译服务是否可用并刷新语言目录
+
+    状态变化（可用性或语言列表改变）时在后台线程调用 on_change(status)，
+    界面等调用方通过 status() 读取最近一次的结果，不必在自己的线程里等待网络请求。
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, interval=15.0, retry_interval=3.0, timeout=3.0,
+                 on_change=None):
         self.base_url = base_url
-        self.session = requests.Session()
-        self.session.headers.update({
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        })
+        self.interval = interval
+        # 服务不可用时更频繁地检查，服务启动后能尽快发现
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.on_change = on_change
+        # healthy 为None表示尚未完成第一次检查
+        self._status = {"healthy": None, "languages": [], "url": base_url, "error": None, "checked_at": None}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
 
-    def detect_language(self, text):
-        """检测文本语言"""
-        if not text.strip():
-            return None
-            
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def check_now(self):
+        """让后台线程立即检查一次，不等待结果"""
+        self._wake.set()
+
+    def status(self):
+        """最近一次检查的结果：{"healthy", "languages", "url", "error", "checked_at"}"""
+        with self._lock:
+            return dict(self._status)
+
+    def check(self):
+        """检查一次并返回新状态（会阻塞，通常由后台线程调用）"""
+        # 配置了多个服务实例时检查其中一个健康的实例
+        url = resolve_catalog_url(self.base_url)
+        catalog = get_language_catalog(url)
+        languages = []
+        error = None
+        # /languages 既用于探测服务，也刷新共享的语言目录，trans() 不会再重复请求
+        if catalog.refresh():
+            languages = catalog.codes()
+            healthy = True
+        else:
+            # 语言列表获取失败时尝试其他端点，服务可能只是不提供 /languages
+            healthy = False
+            for endpoint in ("/translate", ""):
+                try:
+                    if requests.get(f"{url}{endpoint}", timeout=self.timeout).status_code == 200:
+                        healthy = True
+                        break
+                except requests.RequestException as e:
+                    error = str(e)
+            if not healthy and error is None:
+                error = "无法连接到LibreTranslate服务"
+
+        status = {"healthy": healthy, "languages": languages, "url": url, "error": error,
+                  "checked_at": time.time()}
+        with self._lock:
+            previous = self._status
+            self._status = status
+        changed = (previous["healthy"] != healthy or previous["languages"] != languages
+                   or previous["url"] != url)
+        if changed and self.on_change is not None:
+            try:
+                self.on_change(dict(status))
+            except Exception as e:
+                logging.error(f"服务状态回调出错: {str(e)}")
+        return status
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                healthy = self.check()["healthy"]
+            except Exception as e:
+                logging.error(f"检查翻译服务状态失败: {str(e)}")
+                healthy = False
+            self._wake.wait(self.interval if healthy else self.retry_interval)
+            self._wake.clear()
+
+
+class TranslationBackend:
+    """翻译后端接口，LibreTranslator 通过它完成实际的检测和翻译"""
+
+    name = "base"
+    # 是否支持一次翻译多个片段
+    supports_batch = False
+
+    def languages(self):
+        """返回语言列表，每项为 {"code", "name", "targets"}"""
+        raise NotImplementedError
+
+    def detect(self, text):
+        """检测文本语言，失败返回None"""
+        raise NotImplementedError
+
+    def translate(self, text, source_lang, target_lang):
+        """翻译一段已清理的文本，失败时抛出 TranslationError"""
+        raise NotImplementedError
+
+    def translate_array(self, texts, source_lang, target_lang):
+        """翻译多段文本，不支持批量请求时返回None，失败时抛出 TranslationError"""
+        return None
+
+    @property
+    def flight_key(self):
+        """合并并发请求时区分后端的键，键相同的后端对相同请求返回相同结果"""
+        return self
+
+
+class HTTPBackend(TranslationBackend):
+    """通过HTTP接口调用LibreTranslate服务"""
+
+    name = "libretranslate"
+    supports_batch = True
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, session=None, retry=None, breaker=None, endpoints=None,
+                 limiter=None):
+        self.base_url = base_url
+        # 传入共享会话时复用其连接池，否则使用进程内共享的默认会话
+        self.session = session if session is not None else get_default_session()
+        self.retry = retry if retry is not None else RetryPolicy()
+        # 同一服务地址的所有后端共用一个断路器
+        self.breaker = breaker if breaker is not None else get_circuit_breaker(base_url)
+        # 多个服务实例时按实例池分派请求，每个实例有各自的断路器
+        if endpoints is None and base_url == DEFAULT_BASE_URL:
+            endpoints = get_default_endpoint_pool()
+        self.endpoints = endpoints
+        # 同一服务地址的所有后端共用一个并发限制器
+        self._endpoint = Endpoint(base_url, self.breaker, limiter)
+        # 服务拒绝过大的q数组后记下它接受的片段数
+        self.batch_limit = None
+
+    @property
+    def flight_key(self):
+        # 同一服务地址（或同一实例池）的后端共用请求，不论各自的会话和重试设置
+        return self.endpoints if self.endpoints is not None else ("http", self.base_url)
+
+    def languages(self):
+        url = self.endpoints.catalog_url() if self.endpoints is not None else self.base_url
+        return get_language_catalog(url).languages()
+
+    def _post(self, path, payload, timeout):
+        """发送请求，对429/5xx和超时、连接错误按重试策略重试；重试用尽时抛出 TranslationError"""
+        cancel_token = getattr(_cancel_tokens, "token", None)
+        attempts = RequestAttempts(path, self.retry, self._endpoint, self.endpoints, _record_http)
+        while True:
+            endpoint = attempts.start(cancel_token)
+            try:
+                response = self.session.post(f"{endpoint.url}{path}", json=payload, timeout=timeout)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                attempts.network_error(e, timeout=isinstance(e, requests.Timeout),
+                                       connection=isinstance(e, requests.ConnectionError))
+            except Exception:
+                attempts.abandon()
+                raise
+            else:
+                if attempts.response(response.status_code, len(response.request.body or b""), response.content,
+                                     response.headers.get("Retry-After")):
+                    return response
+
+            delay = attempts.next_delay()
+            if cancel_token is not None:
+                if cancel_token.wait(delay):
+                    raise TranslationCancelled("翻译已取消")
+            else:
+                time.sleep(delay)
+
+    def detect(self, text):
         payload = {
             "q": text
         }
 
         try:
-            response = self.session.post(
-                f"{self.base_url}/detect",
-                json=payload,
-                timeout=10
-            )
+            response = self._post("/detect", payload, timeout=10)
             
             if response.status_code != 200:
                 logging.error(f"语言检测请求失败: {response.status_code} - {response.text}")
@@ -59,130 +701,767 @@ class LibreTranslator:
                 # 返回置信度最高的语言
                 return result[0]['language']
             return None
+        except TranslationCancelled:
+            raise
         except Exception as e:
             logging.error(f"语言检测失败: {str(e)}")
             return None
 
     def translate(self, text, source_lang, target_lang):
-        # 起点和终点相同跳过翻译
-        if source_lang == target_lang or not text.strip():
-            return text
+        payload = {
+            "q": text,
+            "source": source_lang,
+            "target": target_lang,
+            "format": "text"
+        }
 
-        # 清理文本
-        cleaned_text = text.replace("\x00", "").strip()
-        if not cleaned_text:
-            return text
+        try:
+            response = self._post("/translate", payload, timeout=30)
+            # 添加调试信息
+            if response.status_code != 200:
+                raise TranslationError(f"翻译请求失败: {response.status_code} - {response.text}")
+
+            translated = response.json().get("translatedText")
+        except TranslationError:
+            raise
+        except Exception as e:
+            raise TranslationError(f"翻译失败: {str(e)}") from e
+        if not isinstance(translated, str):
+            raise TranslationError("翻译结果格式错误")
+        return translated
 
+    def translate_array(self, texts, source_lang, target_lang):
+        # 已知服务的批量上限时先拆分，不再发送注定被拒绝的请求
+        if self.batch_limit is not None and len(texts) > self.batch_limit:
+            return self._translate_split(texts, self.batch_limit, source_lang, target_lang)
+
+        # 发送q为数组的请求
         payload = {
-            "q": cleaned_text,
+            "q": texts,
             "source": source_lang,
             "target": target_lang,
             "format": "text"
         }
 
         try:
-            response = self.session.post(
-                f"{self.base_url}/translate",
-                json=payload,
-                timeout=30
-            )
-            # 添加调试信息
+            response = self._post("/translate", payload, timeout=30)
             if response.status_code != 200:
-                logging.error(f"翻译请求失败: {response.status_code} - {response.text}")
-                return text
-                
-            result = response.json().get("translatedText", text)
-            return result
+                limit = batch_limit_from_error(response.status_code, response.text, len(texts))
+                if limit is not None:
+                    logging.warning(f"批量请求超过服务的上限，改为每批{limit}个片段: {response.text}")
+                    self.batch_limit = limit
+                    return self._translate_split(texts, limit, source_lang, target_lang)
+                # 被拒绝的原因也可能与q数组无关（如不支持的语言），是否停用批量请求由调用方逐条翻译后判断
+                logging.warning(f"批量翻译请求被拒绝，改为逐条翻译: {response.status_code} - {response.text}")
+                return None
+
+            translated = response.json().get("translatedText")
+            if not isinstance(translated, list) or len(translated) != len(texts):
+                logging.warning("批量翻译返回的结果数量不一致，改为逐条翻译")
+                self.supports_batch = False
+                return None
+            return translated
+        except TranslationError:
+            # 重试用尽或断路器打开时逐条翻译也不会成功
+            raise
         except Exception as e:
-            logging.error(f"翻译失败: {str(e)}")
+            logging.error(f"批量翻译失败: {str(e)}")
+            return None
+
+    def _translate_split(self, texts, limit, source_lang, target_lang):
+        # 按服务接受的片段数拆分批量请求，任何一部分被拒绝时返回None
+        results = []
+        for start in range(0, len(texts), limit):
+            part = texts[start:start + limit]
+            translated = (self.translate_array(part, source_lang, target_lang) if len(part) > 1
+                          else [self.translate(part[0], source_lang, target_lang)])
+            if translated is None:
+                return None
+            results.extend(translated)
+        return results
+
+
+BACKENDS = ("libretranslate", "argos")
+
+
+def create_backend(backend=None, base_url=DEFAULT_BASE_URL, session=None):
+    """根据名称创建翻译后端；传入后端实例时原样返回"""
+    if isinstance(backend, TranslationBackend):
+        return backend
+    if backend in (None, "libretranslate", "http"):
+        return HTTPBackend(base_url, session)
+    if backend == "argos":
+        # 进程内后端常驻已加载的模型，所有翻译器共用同一个实例
+        from argos_backend import get_argos_backend
+        return get_argos_backend()
+    raise ValueError(f"未知的翻译后端: {backend}")
+
+
+class LibreTranslator:
+    def __init__(self, base_url=DEFAULT_BASE_URL, cache=None, session=None,
+                 max_batch_size=32, max_batch_chars=5000, backend=None, cancel_token=None):
+        self.base_url = base_url
+        # 取消令牌（CancellationToken），后端的重试等待期间也会检查
+        self.cancel_token = cancel_token
+        # 实际执行检测和翻译的后端，默认通过HTTP调用LibreTranslate服务
+        self.backend = create_backend(backend, base_url, session)
+        # 批量翻译时单个请求的最大片段数和最大字符数
+        self.max_batch_size = max_batch_size
+        self.max_batch_chars = max_batch_chars
+        # 翻译缓存（TranslationCache实例），为None时不使用缓存
+        self.cache = cache
+        # 实际发给后端的调用计数；coalesced 为与其他翻译同时发出、合并后省下的调用数
+        self.call_counts = {"detect": 0, "translate": 0, "cache_hits": 0, "coalesced": 0}
+        self._counts_lock = threading.Lock()
+        # 当前轮次的指标，begin_round() 之后开始收集
+        self._round_metrics = None
+
+    @property
+    def session(self):
+        return getattr(self.backend, "session", None)
+
+    def _count(self, name):
+        # 分块翻译时多个线程共用同一个翻译器
+        with self._counts_lock:
+            self.call_counts[name] += 1
+            if name in ("cache_hits", "coalesced") and self._round_metrics is not None:
+                self._round_metrics[name] += 1
+
+    def begin_round(self):
+        """开始收集一轮的指标"""
+        with self._counts_lock:
+            self._round_metrics = new_round_metrics()
+
+    def end_round(self):
+        """结束收集并返回本轮指标"""
+        with self._counts_lock:
+            metrics, self._round_metrics = self._round_metrics, None
+        return metrics if metrics is not None else new_round_metrics()
+
+    def _call_backend(self, kind, method, *args):
+        # 计时并收集本次调用产生的HTTP记录
+        previous = getattr(_http_records, "records", None)
+        records = _http_records.records = []
+        previous_token = getattr(_cancel_tokens, "token", None)
+        _cancel_tokens.token = self.cancel_token
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            _http_records.records = previous
+            _cancel_tokens.token = previous_token
+            with self._counts_lock:
+                metrics = self._round_metrics
+                if metrics is not None:
+                    metrics[f"{kind}_calls"] += 1
+                    metrics[f"{kind}_ms"] += elapsed_ms
+                    for status, request_bytes, response_bytes, retry in records:
+                        metrics["retries"] += retry
+                        metrics["status_codes"].append(status)
+                        metrics["request_bytes"] += request_bytes
+                        metrics["response_bytes"] += response_bytes
+
+    def _execute(self, kind, method, *args):
+        self._count(kind)
+        return self._call_backend(kind, method, *args)
+
+    def _call_shared(self, kind, method, *args):
+        """调用后端，与正在进行的相同请求（同一后端、同样的参数）合并为一次"""
+        key = (self.backend.flight_key, method.__name__) + tuple(
+            tuple(arg) if isinstance(arg, list) else arg for arg in args)
+        while True:
+            try:
+                result, shared = _backend_flights.do(key, self._execute, kind, method, *args,
+                                                     cancel_token=self.cancel_token)
+            except TranslationCancelled:
+                if self.cancel_token is not None and self.cancel_token.cancelled:
+                    raise
+                # 被取消的是发出请求的另一个翻译，本翻译自己重新发起
+                continue
+            if shared:
+                self._count("coalesced")
+            return result
+
+    def supported_languages(self):
+        """返回后端支持的语言代码列表"""
+        return [lang["code"] for lang in self.backend.languages()]
+
+    def language_graph(self):
+        """返回后端支持的语言对图"""
+        return get_language_graph(self.backend.languages())
+
+    def detect_language(self, text):
+        """检测文本语言"""
+        if not text.strip():
+            return None
+
+        return self._call_shared("detect", self.backend.detect, text)
+
+    def translate(self, text, source_lang, target_lang):
+        # 起点和终点相同跳过翻译
+        if source_lang == target_lang or not text.strip():
             return text
 
-def trans(original_text, loops=40, progress_callback=None, source_lang='auto', target_lang='zh-Hans'):
-    libre_translator = LibreTranslator()
-    
-    # 获取当前支持的语言列表
-    available_languages = get_supported_languages()
-    if not available_languages:
-        logging.error("无法获取支持的语言列表")
-        return original_text, [("错误", "无法获取支持的语言列表")]
+        # 清理文本
+        cleaned_text = text.replace("\x00", "").strip()
+        if not cleaned_text:
+            return text
 
-    # 如果源语言是 'auto'，则检测语言
-    if source_lang == 'auto':
-        detected_lang = libre_translator.detect_language(original_text)
-        if detected_lang is None:
-            # 如果检测失败，使用默认语言
-            detected_lang = 'en'
-            logging.warning(f"语言检测失败，使用默认语言: {detected_lang}")
-        source_lang = detected_lang
+        # 优先查询缓存
+        if self.cache is not None:
+            cached = self.cache.get(cleaned_text, source_lang, target_lang)
+            if cached is not None:
+                self._count("cache_hits")
+                return cached
 
-    # 记录所有翻译步骤
-    all_steps = [("原始文本", original_text)]
-    current_text = original_text
-    previous_lang = source_lang
+        result = self._call_shared("translate", self.backend.translate, cleaned_text, source_lang, target_lang)
+        if result is None:
+            raise TranslationError(f"翻译失败: {source_lang}→{target_lang}")
 
-    # 检查最终目标是否为中文
-    final_target_is_chinese = target_lang in ['zh', 'zh-Hans', 'zh-Hant']
+        # 仅缓存成功的翻译结果
+        if self.cache is not None:
+            self.cache.put(cleaned_text, source_lang, target_lang, result)
+        return result
 
-    # 执行多轮翻译
-    for round_idx in range(loops):
-        # 检测当前文本的语言
-        detected_lang = libre_translator.detect_language(current_text)
-        if detected_lang is None:
-            # 如果检测失败，使用上一轮的目标语言
-            detected_lang = previous_lang
-            logging.warning(f"语言检测失败，使用上一轮语言: {detected_lang}")
+    def translate_batch(self, texts, source_lang, target_lang):
+        """批量翻译：把多个片段放进一个请求的q数组，结果按输入顺序返回"""
+        results = list(texts)
+        if source_lang == target_lang:
+            return results
+
+        # 清理文本、查询缓存，并合并重复片段
+        pending = {}
+        for index, text in enumerate(results):
+            cleaned_text = text.replace("\x00", "").strip()
+            if not cleaned_text:
+                continue
+            if self.cache is not None:
+                cached = self.cache.get(cleaned_text, source_lang, target_lang)
+                if cached is not None:
+                    self._count("cache_hits")
+                    results[index] = cached
+                    continue
+            pending.setdefault(cleaned_text, []).append(index)
+
+        for batch in pack_batches(list(pending), self.max_batch_size, self.max_batch_chars):
+            translated = None
+            if len(batch) > 1 and self.backend.supports_batch:
+                translated = self._call_shared("translate", self.backend.translate_array,
+                                               batch, source_lang, target_lang)
+                if translated is not None and self.cache is not None:
+                    for text, result in zip(batch, translated):
+                        self.cache.put(text, source_lang, target_lang, result)
+            if translated is None:
+                # 单个片段或后端拒绝批量请求时逐条翻译
+                rejected = len(batch) > 1 and self.backend.supports_batch
+                translated = [self.translate(text, source_lang, target_lang) for text in batch]
+                if rejected:
+                    # 逐条翻译都成功，被拒绝的只是q数组本身，之后不再发送批量请求
+                    logging.warning("服务不接受批量请求，之后改为逐条翻译")
+                    self.backend.supports_batch = False
+            for cleaned_text, result in zip(batch, translated):
+                for index in pending[cleaned_text]:
+                    results[index] = result
+
+        return results
+
+
+def needs_detection(detect_policy, round_idx, source_detected, current_text, previous_lang):
+    """按检测策略判断本轮是否需要调用 /detect"""
+    if detect_policy == 'always':
+        return True
+    if detect_policy == 'first':
+        return round_idx == 0 and not source_detected
+    if detect_policy == 'heuristic':
+        return not script_matches_language(current_text, previous_lang)
+    return False
+
+
+CHINESE_LANGS = ('zh', 'zh-Hans', 'zh-Hant')
+
+
+class LanguageGraph:
+    """由 /languages 的 targets 字段构成的语言对图"""
+
+    def __init__(self, languages):
+        self.codes = [lang["code"] for lang in languages]
+        self.non_chinese = [code for code in self.codes if not code.startswith('zh')]
+        self._targets = {lang["code"]: set(lang.get("targets", ())) for lang in languages}
+        # 旧版服务不返回targets时视为任意两种语言都可以互译
+        self._complete = not any(self._targets.values())
+
+    def supports(self, source_lang, target_lang):
+        """判断服务是否支持该语言对（未知的源语言视为支持）"""
+        if self._complete or source_lang not in self._targets:
+            return True
+        return target_lang in self._targets[source_lang]
+
+    def next_hop(self, current_lang, round_idx, loops, target_lang, rng):
+        """按轮次规则选择下一跳的目标语言"""
+        # 检查最终目标是否为中文
+        final_target_is_chinese = target_lang in CHINESE_LANGS
 
-        # 确定目标语言
         if round_idx == loops - 1:
             # 最后一轮，使用指定的目标语言
-            to_lang = target_lang
-            
-            # 检查最后一轮的目标语言是否与检测语言相同
-            if detected_lang == to_lang:
-                # 如果相同，选择一个新的目标语言
-                other_langs = [lang for lang in available_languages if lang != detected_lang]
-                if other_langs:
-                    to_lang = random.choice(other_langs)
-                    logging.warning(f"最后一轮检测语言和目标语言相同，已自动更改为: {to_lang}")
-                else:
-                    # 如果没有其他语言可用，使用英语作为默认
-                    to_lang = 'en'
-                    logging.warning("最后一轮检测语言和目标语言相同，且无其他语言可用，使用英语作为目标语言")
-                    
-        elif round_idx == loops - 2 and final_target_is_chinese:
+            if current_lang != target_lang:
+                return target_lang
+            # 如果当前语言和目标语言相同，选择一个新的目标语言
+            other_langs = [lang for lang in self.codes
+                           if lang != current_lang and self.supports(current_lang, lang)]
+            if other_langs:
+                to_lang = rng.choice(other_langs)
+                logging.warning(f"最后一轮检测语言和目标语言相同，已自动更改为: {to_lang}")
+                return to_lang
+            # 如果没有其他语言可用，使用英语作为默认
+            logging.warning("最后一轮检测语言和目标语言相同，且无其他语言可用，使用英语作为目标语言")
+            return 'en'
+
+        if round_idx == loops - 2 and final_target_is_chinese:
             # 如果最终目标是中文，倒数第二轮必须是英文
-            to_lang = 'en'
+            if current_lang != 'en':
+                return 'en'
+            # 已经是英文（重新规划或上一跳失败后）时不能原地翻译，改用一种能回到英文、
+            # 也能翻译到最终目标的非中文语言
+            other_langs = [lang for lang in self.non_chinese
+                           if lang != 'en' and self.supports('en', lang)]
+            reachable = [lang for lang in other_langs
+                         if self.supports(lang, 'en') and self.supports(lang, target_lang)]
+            other_langs = reachable or other_langs
+            return rng.choice(other_langs) if other_langs else 'en'
+
+        # 中间轮次，绝对不允许使用中文；如果是中文，强制转换为英文
+        if current_lang in CHINESE_LANGS:
+            return 'en'
+
+        # 随机选择非当前语言、非中文且服务支持的语言
+        other_langs = [lang for lang in self.non_chinese
+                       if lang != current_lang and self.supports(current_lang, lang)]
+
+        # 向前看一跳：下一跳已经确定时，只选能翻译到它的语言，并避免与它相同
+        if round_idx == loops - 3 and final_target_is_chinese:
+            forced_next = 'en'
+        elif round_idx == loops - 2:
+            forced_next = target_lang
         else:
-            # 中间轮次，绝对不允许使用中文
-            # 从可用语言中排除所有中文变体
-            non_chinese_langs = [lang for lang in available_languages 
-                               if not lang.startswith('zh')]
-            
-            # 如果是中文，强制转换为英文
-            if detected_lang in ['zh', 'zh-Hans', 'zh-Hant']:
-                to_lang = 'en'
-            else:
-                # 其他语言，随机选择非当前语言且非中文的语言
-                other_langs = [lang for lang in non_chinese_langs if lang != detected_lang]
-                to_lang = random.choice(other_langs) if other_langs else 'en'
+            forced_next = None
+        if forced_next is not None:
+            reachable = [lang for lang in other_langs
+                         if lang != forced_next and self.supports(lang, forced_next)]
+            other_langs = reachable or other_langs
+
+        return rng.choice(other_langs) if other_langs else 'en'
+
+
+_graph_cache = (None, None)
+_graph_cache_lock = threading.Lock()
+
+
+def get_language_graph(languages):
+    """根据语言列表构建语言对图；同一个列表对象只构建一次"""
+    global _graph_cache
+    with _graph_cache_lock:
+        cached_languages, graph = _graph_cache
+        if cached_languages is not languages:
+            graph = LanguageGraph(languages)
+            _graph_cache = (languages, graph)
+        return graph
+
+
+def plan_route(source_lang, loops, target_lang, graph, rng=None, start_round=0):
+    """在翻译开始前规划完整路线，返回第 start_round 轮起的 [(源语言, 目标语言), ...]"""
+    rng = rng or random
+    route = []
+    current_lang = source_lang
+    for round_idx in range(start_round, loops):
+        to_lang = graph.next_hop(current_lang, round_idx, loops, target_lang, rng)
+        route.append((current_lang, to_lang))
+        current_lang = to_lang
+    return route
+
+
+def translation_rounds(translator, graph, original_text, loops=40, source_lang='auto', target_lang='zh-Hans',
+                       detect_policy='heuristic', chunk_mode=None, chunk_threshold=1000, chunk_workers=4, rng=None,
+                       metrics_sink=None, checkpoint=None, cancel_token=None, early_stop=None, early_stop_rounds=2,
+                       report_writer=None, route=None, all_steps=None):
+    """多轮翻译的轮次逻辑，不直接发出请求，同步的 trans() 和异步的 trans_async() 共用
+
+    生成器依次产出需要调用方执行的操作，返回值为 (最终文本, all_steps)：
+      ("detect", 文本)                                -> 送回检测到的语言或None
+      ("translate", 文本, 源语言, 目标语言)            -> 送回译文，失败时把 TranslationError 抛入生成器
+      ("translate_chunked", 文本, 源语言, 目标语言, 分块模式, 并行数) -> 同上，按 translate_chunked() 分块翻译
+      ("round", 当前轮次, 总轮次, 当前文本, 语言路径, 指标) -> 一轮结束，送回None
+    translator 只用于按轮收集指标（begin_round/end_round）和调用计数；各参数的含义见 trans()。
+    """
+    if rng is None:
+        rng = random.Random()
+
+    # 源语言检测计入第1轮的指标
+    translator.begin_round()
+    round_started = time.perf_counter()
+
+    journal = None
+    resumed = None
+    if checkpoint is not None:
+        journal = checkpoint if isinstance(checkpoint, CheckpointJournal) else CheckpointJournal(checkpoint)
+        resumed = journal.load(original_text, loops, target_lang)
+
+    if all_steps is None:
+        all_steps = TranslationHistory()
+    all_steps.append(("原始文本", original_text))
+    if resumed is not None:
+        # 从检查点恢复路线、随机数状态和已完成的轮次，不再重复检测源语言
+        source_lang = resumed.source_lang
+        source_detected = resumed.source_detected
+        route = resumed.route
+        rng.setstate(resumed.random_state())
+        current_text = original_text
+        previous_lang = source_lang
+        for action, text, lang, metrics in resumed.steps:
+            all_steps.append((action, text))
+            if metrics is not None:
+                all_steps.metrics.append(metrics)
+            current_text = text
+            previous_lang = lang
+        start_round = resumed.rounds_done
+        if resumed.done:
+            # 链已经结束（包括提前结束），不再执行剩余轮次
+            start_round = loops
+            all_steps.stop_reason = resumed.stop_reason
+            journal = None
+        else:
+            journal.resume()
+    else:
+        # 如果源语言是 'auto'，则检测语言
+        source_detected = source_lang == 'auto'
+        if route is not None:
+            route = list(route)
+            source_lang = route[0][0] if route else source_lang
+        elif source_lang == 'auto':
+            try:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                detected_lang = yield ("detect", original_text)
+            except TranslationCancelled:
+                # 检测源语言时就被取消：一轮也没有开始，不写检查点和报告
+                all_steps.stop_reason = "cancelled"
+                detected_lang = None
+            if detected_lang is None and all_steps.stop_reason is None:
+                # 如果检测失败，使用默认语言
+                detected_lang = 'en'
+                logging.warning(f"语言检测失败，使用默认语言: {detected_lang}")
+            source_lang = detected_lang
+
+        current_text = original_text
+        previous_lang = source_lang
+        start_round = 0
+        if all_steps.stop_reason == "cancelled":
+            route = []
+            journal = None
+            start_round = loops
+        else:
+            # 翻译开始前规划完整路线，传入seed或rng时路线可复现
+            if route is None:
+                route = plan_route(source_lang, loops, target_lang, graph, rng)
+            if journal is not None:
+                journal.start(original_text, loops, source_lang, target_lang, source_detected, route,
+                              rng.getstate())
+
+    # 记录所有翻译步骤
+    all_steps.route = route
+    # 各轮的源语言，随每轮追加，不必每次从 all_steps 重建
+    lang_path = [action.split('→')[0] for action in all_steps.actions()[1:]]
+
+    report = None
+    if report_writer is not None and all_steps.stop_reason != "cancelled":
+        report = report_writer if isinstance(report_writer, ReportWriter) else create_report_writer(report_writer)
+        report.start(original_text)
+        # 从检查点恢复的轮次也写入报告
+        for step, (action, text) in enumerate(all_steps[1:], 1):
+            report.write_step(step, action, text,
+                              all_steps.metrics[step - 1] if step <= len(all_steps.metrics) else None)
+    # 结果与上一轮几乎相同的连续轮数
+    stable_rounds = 0
+
+    # 执行多轮翻译
+    for round_idx in range(start_round, loops):
+        if cancel_token is not None and cancel_token.cancelled:
+            all_steps.stop_reason = "cancelled"
+            break
+
+        try:
+            detect = needs_detection(detect_policy, round_idx, source_detected, current_text, previous_lang)
+            detected_lang = (yield ("detect", current_text)) if detect else None
+        except TranslationCancelled:
+            all_steps.stop_reason = "cancelled"
+            break
+
+        # 按检测策略决定是否检测当前文本的语言
+        if detect:
+            if detected_lang is None:
+                # 如果检测失败，使用上一轮的目标语言
+                detected_lang = previous_lang
+                logging.warning(f"语言检测失败，使用上一轮语言: {detected_lang}")
+        else:
+            # 信任上一轮的目标语言
+            detected_lang = previous_lang
+
+        # 按规划的路线确定目标语言；检测结果与路线不符时从本轮起重新规划
+        replanned = detected_lang != route[round_idx][0]
+        if replanned:
+            route[round_idx:] = plan_route(detected_lang, loops, target_lang, graph, rng, start_round=round_idx)
+        to_lang = route[round_idx][1]
 
         # 使用LibreTranslate进行翻译
-        current_text = libre_translator.translate(current_text, detected_lang, to_lang)
+        error = None
+        previous_text = current_text
+        try:
+            if chunk_mode and len(current_text) > chunk_threshold:
+                # 长文本按句子/段落分块并行翻译，所有分块使用同一个语言对
+                current_text = yield ("translate_chunked", current_text, detected_lang, to_lang,
+                                      chunk_mode, chunk_workers)
+            else:
+                current_text = yield ("translate", current_text, detected_lang, to_lang)
+        except TranslationCancelled:
+            # 未完成的一轮不记录，检查点中也没有它，续跑时会重新执行
+            all_steps.stop_reason = "cancelled"
+            break
+        except TranslationError as e:
+            error = str(e)
+
+        if error is None:
+            action = f"{detected_lang}→{to_lang}"
+            all_steps.append((action, current_text))
+            previous_lang = to_lang  # 保存当前目标语言作为下一轮的源语言
+        else:
+            # 本轮失败：文本保持不变并标记为失败，下一轮从当前语言重新规划路线
+            logging.warning(f"第{round_idx + 1}轮翻译失败 ({detected_lang}→{to_lang}): {error}")
+            action = f"{detected_lang}→{to_lang} (失败)"
+            all_steps.append((action, current_text))
+            previous_lang = detected_lang
+
+        metrics = translator.end_round()
+        now = time.perf_counter()
+        metrics.update({
+            "round": round_idx + 1,
+            "source": detected_lang,
+            "target": to_lang,
+            "round_ms": (now - round_started) * 1000,
+            # 本轮的翻译完全由缓存提供
+            "cache_hit": metrics["cache_hits"] > 0 and metrics["translate_calls"] == 0,
+            "failed": error is not None,
+            "error": error,
+        })
+        all_steps.metrics.append(metrics)
+        lang_path.append(detected_lang)
+        if metrics_sink is not None:
+            metrics_sink.record(metrics)
+        if report is not None:
+            report.write_step(round_idx + 1, action, current_text, metrics)
+        if journal is not None:
+            journal.append_step(round_idx + 1, action, current_text, previous_lang, metrics,
+                                route[round_idx:] if replanned else None, rng.getstate() if replanned else None)
+        translator.begin_round()
+        round_started = now
+
+        # 实时报告进度：语言路径加上最后一轮的目标语言；传入副本，调用方可以保存它
+        yield ("round", round_idx + 1, loops, current_text, lang_path + [to_lang], metrics)
+
+        # 文本已经不再变化时，后面的轮次只是浪费服务端时间
+        if early_stop is not None and error is None and round_idx < loops - 1:
+            if not current_text.strip():
+                all_steps.stop_reason = "converged"
+            else:
+                matcher = SequenceMatcher(None, previous_text, current_text)
+                # quick_ratio 是 ratio 的上界，多数轮次不必计算完整的相似度
+                similar = matcher.quick_ratio() >= early_stop and matcher.ratio() >= early_stop
+                stable_rounds = stable_rounds + 1 if similar else 0
+                if stable_rounds >= early_stop_rounds:
+                    all_steps.stop_reason = "converged"
+            if all_steps.stop_reason == "converged":
+                logging.info(f"第{round_idx + 1}轮后文本不再变化，提前结束")
+                break
+
+    translator.end_round()
+    if journal is not None:
+        if all_steps.stop_reason == "cancelled":
+            # 保留未完成的检查点，之后可以继续
+            journal.close()
+        else:
+            journal.finish(all_steps.stop_reason)
+    if report is not None:
+        report.finish(current_text, stop_reason=all_steps.stop_reason)
+        if report is not report_writer:
+            report.close()
+    all_steps.call_counts = dict(translator.call_counts)
+    logging.info(f"HTTP调用: 检测{all_steps.call_counts['detect']}次, "
+                 f"翻译{all_steps.call_counts['translate']}次, "
+                 f"缓存命中{all_steps.call_counts['cache_hits']}次, "
+                 f"与其他翻译合并{all_steps.call_counts['coalesced']}次")
+    if translator.cache is not None:
+        logging.info(f"翻译缓存命中率: {translator.cache.hit_rate():.1%}")
+
+    return current_text, all_steps
+
+
+def compatible_progress_callback(progress_callback, positional=4):
+    """让只接受 positional 个位置参数的旧 progress_callback 继续可用：调用时去掉最后的指标参数
+
+    trans() 的旧回调为 (current, total, result, path)，多链接口的旧回调为 (index, current, total, result, path)。
+    """
+    if progress_callback is None:
+        return None
+    try:
+        parameters = inspect.signature(progress_callback).parameters.values()
+    except (TypeError, ValueError):
+        return progress_callback
+    count = 0
+    for parameter in parameters:
+        if parameter.kind == parameter.VAR_POSITIONAL:
+            return progress_callback
+        if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD):
+            count += 1
+    if count > positional:
+        return progress_callback
+    return lambda *args: progress_callback(*args[:-1])
+
+
+def trans(original_text, loops=40, progress_callback=None, source_lang='auto', target_lang='zh-Hans',
+          use_cache=True, detect_policy='heuristic', session=None,
+          chunk_mode=None, chunk_threshold=1000, chunk_workers=4, backend=None, seed=None, rng=None,
+          metrics_sink=None, checkpoint=None, cancel_token=None, early_stop=None, early_stop_rounds=2,
+          report_writer=None, route=None):
+    """多轮随机翻译，返回 (最终文本, all_steps)
 
-        all_steps.append((f"{detected_lang}→{to_lang}", current_text))
-        previous_lang = to_lang  # 保存当前目标语言作为下一轮的源语言
+    progress_callback(current, total, result, path, metrics) 在每轮结束时调用，
+    metrics 为本轮的耗时和HTTP指标（见 new_round_metrics），同时保存在 all_steps.metrics 中
+    （只接受前四个参数的回调照旧调用，不传入指标），
+    传入 metrics_sink 时还会调用 metrics_sink.record(metrics)。
+    checkpoint 为检查点日志路径（或 CheckpointJournal）时，每完成一轮都写入日志；
+    日志已存在且原文、轮数、目标语言一致时，从最后完成的一轮继续。
+    cancel_token（CancellationToken）被取消时在本轮结束后停止，返回已完成的结果。
+    early_stop 为0~1之间的相似度阈值：连续 early_stop_rounds 轮的结果与上一轮的相似度都不低于它，
+    或文本变为空白时提前结束（此时文本不一定是目标语言）。提前结束的原因记录在 all_steps.stop_reason。
+    report_writer 为报告路径（按扩展名选择Markdown/JSON行/CSV）或 ReportWriter 时，每完成一轮追加到报告；
+    传入路径时由 trans() 负责关闭，传入 ReportWriter 时由调用方关闭。
+    route 为调用方预先规划好的 loops 跳路线（见 plan_route），此时以第一跳的源语言为源语言，不再检测和规划；
+    之后检测结果与路线不符时仍用 rng 重新规划。
+    """
+    if detect_policy not in DETECT_POLICIES:
+        raise ValueError(f"未知的语言检测策略: {detect_policy}")
+    if chunk_mode is not None and chunk_mode not in CHUNK_MODES:
+        raise ValueError(f"未知的分块模式: {chunk_mode}")
+    if route is not None and len(route) != loops:
+        raise ValueError(f"路线长度({len(route)})与轮数({loops})不一致")
 
-        # 实时回调进度
+    libre_translator = LibreTranslator(cache=get_default_cache() if use_cache else None, session=session,
+                                       backend=backend, cancel_token=cancel_token)
+    
+    # 获取当前支持的语言对图
+    graph = libre_translator.language_graph()
+    if not graph.codes:
+        logging.error("无法获取支持的语言列表")
+        return original_text, TranslationHistory([("错误", "无法获取支持的语言列表")])
+
+    if rng is None:
+        rng = random.Random(seed)
+    progress_callback = compatible_progress_callback(progress_callback)
+    rounds = translation_rounds(libre_translator, graph, original_text, loops, source_lang, target_lang,
+                                detect_policy, chunk_mode, chunk_threshold, chunk_workers, rng, metrics_sink,
+                                checkpoint, cancel_token, early_stop, early_stop_rounds, report_writer, route)
+    try:
+        request = next(rounds)
+        while True:
+            if request[0] == "round":
+                if progress_callback:
+                    progress_callback(*request[1:])
+                request = rounds.send(None)
+                continue
+            try:
+                if request[0] == "detect":
+                    result = libre_translator.detect_language(request[1])
+                elif request[0] == "translate_chunked":
+                    result = translate_chunked(libre_translator, *request[1:])
+                else:
+                    result = libre_translator.translate(*request[1:])
+            except TranslationError as e:
+                request = rounds.throw(e)
+            else:
+                request = rounds.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+def trans_many(texts, loops=40, progress_callback=None, source_lang='auto', target_lang='zh-Hans',
+               use_cache=True, detect_policy='heuristic', max_workers=4, item_callback=None,
+               chunk_mode=None, chunk_threshold=1000, chunk_workers=4, backend=None, executor='thread',
+               seed=None, metrics_sink=None, checkpoint_dir=None, cancel_token=None, early_stop=None,
+               report_dir=None, report_format="markdown"):
+    """并发执行多条独立的翻译链，结果按输入顺序返回 [(最终文本, all_steps), ...]
+
+    progress_callback(index, current, total, result, path, metrics) 报告每条链的进度（不接受 metrics 的回调照旧调用），
+    item_callback(index, final_text, all_steps) 在每条链结束时调用。
+    单条链出错不影响其他条目，出错的条目返回 (原文, [("错误", 错误信息)])。
+    executor='process' 时在 max_workers 个常驻进程中执行（适合CPU密集的本地模型后端），
+    此时不支持 progress_callback、metrics_sink、checkpoint_dir 和 cancel_token。传入整数 seed 时第 i 条链使用 seed + i 作为随机种子。
+    传入 checkpoint_dir 时第 i 条链的检查点写入其中的 chain-i.jsonl，重新运行同一批文本时从检查点继续。
+    cancel_token 被取消后，运行中的链在本轮结束后停止，尚未开始的链不再执行；early_stop 见 trans()。
+    传入 report_dir 时第 i 条链的报告逐轮写入其中的 chain-i.md（report_format 为 jsonl/csv 时扩展名相应改变）。
+    """
+    if executor == 'process':
+        from process_pool import ChainProcessPool
         if progress_callback:
-            # 构建语言路径
-            lang_path = [step[0].split('→')[0] for step in all_steps[1:]]
-            lang_path.append(to_lang)  # 添加最后一轮的目标语言
-            
-            progress_callback(
-                round_idx + 1,
-                loops,
-                current_text,
-                lang_path
-            )
-
-    return current_text, all_steps
\ No newline at end of file
+            logging.warning("进程池模式不支持逐轮进度回调")
+        if metrics_sink is not None:
+            logging.warning("进程池模式不支持指标输出，各轮指标仍保存在 all_steps.metrics 中")
+        if checkpoint_dir is not None:
+            logging.warning("进程池模式不支持检查点")
+        if cancel_token is not None:
+            logging.warning("进程池模式不支持取消")
+        if report_dir is not None:
+            logging.warning("进程池模式不支持逐轮报告")
+        with ChainProcessPool(max_workers, backend=backend or "argos", use_cache=use_cache,
+                              detect_policy=detect_policy, chunk_mode=chunk_mode,
+                              chunk_threshold=chunk_threshold, chunk_workers=chunk_workers,
+                              early_stop=early_stop) as pool:
+            return pool.trans_many(texts, loops, source_lang, target_lang, item_callback=item_callback, seed=seed)
+    if executor != 'thread':
+        raise ValueError(f"未知的执行方式: {executor}")
+
+    texts = list(texts)
+    results = [None] * len(texts)
+    progress_callback = compatible_progress_callback(progress_callback, 5)
+    # 所有链共享一个会话，连接池大小与同时在途的请求数一致以复用keep-alive连接
+    session = create_session(max_workers * (chunk_workers if chunk_mode else 1))
+
+    def run_chain(index, text):
+        callback = None
+        if progress_callback:
+            def callback(current, total, result, path, metrics):
+                progress_callback(index, current, total, result, path, metrics)
+        try:
+            return trans(text, loops, callback, source_lang, target_lang,
+                         use_cache=use_cache, detect_policy=detect_policy, session=session,
+                         chunk_mode=chunk_mode, chunk_threshold=chunk_threshold, chunk_workers=chunk_workers,
+                         backend=backend, seed=None if seed is None else seed + index,
+                         metrics_sink=metrics_sink,
+                         checkpoint=None if checkpoint_dir is None else os.path.join(checkpoint_dir,
+                                                                                    f"chain-{index}.jsonl"),
+                         cancel_token=cancel_token, early_stop=early_stop,
+                         report_writer=None if report_dir is None else os.path.join(
+                             report_dir, f"chain-{index}{report_extension(report_format)}"))
+        except Exception as e:
+            logging.error(f"第{index}条文本翻译失败: {str(e)}")
+            return text, TranslationHistory([("错误", str(e))])
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(run_chain, index, text): index for index, text in enumerate(texts)}
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                if item_callback:
+                    item_callback(index, *results[index])
+    finally:
+        session.close()
+
+    return results
\ No newline at end of file
@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# 默认缓存文件位置（与报告目录一样放在当前工作目录下）
+DEFAULT_CACHE_PATH = os.path.join(os.getcwd(), "cache", "translations.sqlite3")
+
+
+def normalize_text(text):
+    """规范化文本，用于生成缓存键"""
+    return unicodedata.normalize("NFC", text.replace("\x00", "")).strip()
+
+
+def make_cache_key(text, source_lang, target_lang):
+    """根据规范化文本和语言对生成内容寻址的缓存键"""
+    raw = f"{source_lang}\x1f{target_lang}\x1f{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """两级翻译缓存：内存LRU + SQLite持久化存储"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, memory_size=2048, max_entries=200000):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.enabled = True
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        self._conn = None
+        self._disk_count = 0
+        try:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON translations(last_used)")
+            self._conn.commit()
+            self._disk_count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        except Exception as e:
+            # 磁盘缓存不可用时退化为纯内存缓存
+            logging.error(f"打开翻译缓存失败，仅使用内存缓存: {str(e)}")
+            self._conn = None
+
+    def get(self, text, source_lang, target_lang):
+        """查询缓存，未命中返回None"""
+        if not self.enabled:
+            return None
+        key = make_cache_key(text, source_lang, target_lang)
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self._memory[key]
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT result FROM translations WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        self._conn.execute(
+                            "UPDATE translations SET last_used = ? WHERE key = ?", (time.time(), key)
+                        )
+                        self._conn.commit()
+                        self._remember(key, row[0])
+                        self.stats["disk_hits"] += 1
+                        return row[0]
+                except Exception as e:
+                    logging.error(f"读取翻译缓存失败: {str(e)}")
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, text, source_lang, target_lang, result):
+        """写入缓存"""
+        if not self.enabled:
+            return
+        key = make_cache_key(text, source_lang, target_lang)
+
+        with self._lock:
+            self._remember(key, result)
+            self.stats["writes"] += 1
+            if self._conn is None:
+                return
+            try:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO translations (key, result, last_used) VALUES (?, ?, ?)",
+                    (key, result, time.time())
+                )
+                if cursor.rowcount > 0:
+                    self._disk_count += 1
+                else:
+                    self._conn.execute(
+                        "UPDATE translations SET result = ?, last_used = ? WHERE key = ?",
+                        (result, time.time(), key)
+                    )
+                if self._disk_count > self.max_entries:
+                    self._evict_disk()
+                self._conn.commit()
+            except Exception as e:
+                logging.error(f"写入翻译缓存失败: {str(e)}")
+
+    def _remember(self, key, result):
+        # 调用方需持有锁
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        # 一次淘汰约10%最久未使用的条目，避免每次写入都触发淘汰
+        excess = self._disk_count - self.max_entries
+        batch = max(excess, self.max_entries // 10, 1)
+        cursor = self._conn.execute(
+            "DELETE FROM translations WHERE key IN "
+            "(SELECT key FROM translations ORDER BY last_used ASC LIMIT ?)",
+            (batch,)
+        )
+        self._disk_count -= cursor.rowcount
+        self.stats["evictions"] += cursor.rowcount
+
+    def hit_rate(self):
+        """返回缓存命中率"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM translations")
+                self._conn.commit()
+                self._disk_count = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """获取进程内共享的默认翻译缓存"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = TranslationCache()
+        return _default_cache